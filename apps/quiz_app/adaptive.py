@@ -0,0 +1,235 @@
+"""
+Adaptive Quizzes
+================
+
+One-question-at-a-time quizzes whose difficulty follows the student's
+running accuracy: two correct answers in a row move up a level, a wrong
+answer moves down one.
+
+Questions come from the sampler's in-memory id pools (see sampling.py).
+Each level's pool is walked in a pseudo-random order given by an affine
+permutation ``(a * position + b) mod n`` derived from the quiz seed, so
+picking the next question is O(1) and needs no list of asked questions.
+The whole quiz state is a short list of integers (see AdaptiveQuiz.pack),
+kept in the session by the chatbot and in a signed token by the API.
+API tokens expire after ``QUIZ_TOKEN_MAX_AGE`` seconds and are single-use:
+each carries a step nonce stored as an AdaptiveStep row, deleted once the
+answer has been graded, so an earlier token cannot be replayed to answer a
+question again after its correct answer has been revealed. Rows live in the
+database so that every worker sees them. Grading a step reads the answer
+key cache.
+"""
+
+import random
+import secrets
+from datetime import timedelta
+from math import gcd
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .answer_keys import answer_keys
+from .models import AdaptiveStep, Question
+from .quiz_tokens import DEFAULT_MAX_AGE
+from .sampling import sampler
+
+LEVELS = [level for level, _ in Question.LEVEL_CHOICES]
+POINTS = {'easy': 1, 'medium': 2, 'hard': 3}
+# Consecutive correct answers needed to move up a level
+STREAK_TO_LEVEL_UP = 2
+
+TOKEN_SALT = 'quiz_app.adaptive'
+
+
+class AdaptiveQuizError(ValueError):
+    """An adaptive quiz step cannot be served"""
+
+
+def permuted_index(seed, level_index, position, n):
+    """Position-th index of a seeded permutation of range(n)"""
+    mixed = (seed ^ ((level_index + 1) * 0x9E3779B1)) & 0xFFFFFFFF
+    a = 1 + mixed % (n - 1) if n > 1 else 1
+    while gcd(a, n) != 1:
+        a += 1
+    b = (mixed >> 16) % n
+    return (a * position + b) % n
+
+
+def token_max_age():
+    return getattr(settings, 'QUIZ_TOKEN_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def purge_expired_steps():
+    """Delete the steps of tokens that can no longer be answered"""
+    cutoff = timezone.now() - timedelta(seconds=token_max_age())
+    return AdaptiveStep.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+class AdaptiveQuiz:
+    """State of one adaptive quiz"""
+
+    FIELDS = (
+        'subject_id', 'seed', 'num_questions', 'level_index', 'asked', 'correct',
+        'points', 'streak', 'question_id',
+    )
+
+    def __init__(self, subject_id, seed, num_questions, level_index, asked=0, correct=0,
+                 points=0, streak=0, question_id=0, positions=None):
+        self.subject_id = subject_id
+        self.seed = seed
+        self.num_questions = num_questions
+        self.level_index = level_index
+        self.asked = asked
+        self.correct = correct
+        self.points = points
+        self.streak = streak
+        # Current question, 0 once the quiz is finished
+        self.question_id = question_id
+        # Next position in each level's permutation
+        self.positions = list(positions or [0] * len(LEVELS))
+        # Nonce of the token this state was loaded from
+        self.step = None
+
+    @property
+    def level(self):
+        return LEVELS[self.level_index]
+
+    @property
+    def finished(self):
+        return not self.question_id
+
+    def pack(self):
+        """State as a flat list of ints"""
+        return [getattr(self, field) for field in self.FIELDS] + self.positions
+
+    @classmethod
+    def unpack(cls, values):
+        try:
+            values = [int(value) for value in values]
+            fields = dict(zip(cls.FIELDS, values))
+            positions = values[len(cls.FIELDS):]
+        except (TypeError, ValueError):
+            raise AdaptiveQuizError('Invalid adaptive quiz state')
+        if len(fields) != len(cls.FIELDS) or len(positions) != len(LEVELS):
+            raise AdaptiveQuizError('Invalid adaptive quiz state')
+        if not 0 <= fields['level_index'] < len(LEVELS):
+            raise AdaptiveQuizError('Invalid adaptive quiz state')
+        return cls(positions=positions, **fields)
+
+    def dumps(self):
+        """Signed, single-use token of the state, for stateless clients"""
+        nonce = secrets.token_urlsafe(12)
+        # A finished quiz cannot be answered, so its token needs no step
+        if not self.finished:
+            AdaptiveStep.objects.create(nonce=nonce)
+        return signing.dumps({'s': self.pack(), 'n': nonce}, salt=TOKEN_SALT, compress=True)
+
+    @classmethod
+    def loads(cls, token):
+        """State of a token from dumps(); see consume_step()"""
+        try:
+            payload = signing.loads(token, salt=TOKEN_SALT, max_age=token_max_age())
+            state, nonce = payload['s'], payload['n']
+        except signing.SignatureExpired:
+            raise AdaptiveQuizError('Adaptive quiz token has expired')
+        except (signing.BadSignature, TypeError, KeyError):
+            raise AdaptiveQuizError('Invalid adaptive quiz token')
+        quiz = cls.unpack(state)
+        quiz.step = nonce
+        return quiz
+
+    def consume_step(self):
+        """
+        Mark the loaded token as answered; call after answer() has succeeded.
+
+        The DELETE reports whether the row existed, so of concurrent requests
+        with the same token only one wins.
+        """
+        if not AdaptiveStep.objects.filter(nonce=self.step).delete()[0]:
+            raise AdaptiveQuizError('This adaptive quiz step was already answered')
+
+    def _draw(self, level_index):
+        """Next unasked question id of a level, or None if the level is used up"""
+        pool = sampler.get_pool(self.subject_id, LEVELS[level_index])
+        position = self.positions[level_index]
+        if position >= len(pool):
+            return None
+        self.positions[level_index] += 1
+        return pool[permuted_index(self.seed, level_index, position, len(pool))]
+
+    def advance(self, prefer_harder=False):
+        """Pick the next question at the current level, or the nearest level with questions left"""
+        self.question_id = 0
+        if self.asked >= self.num_questions:
+            return None
+        direction = -1 if prefer_harder else 1
+        by_distance = sorted(range(len(LEVELS)), key=lambda i: (abs(i - self.level_index), direction * i))
+        for level_index in by_distance:
+            question_id = self._draw(level_index)
+            if question_id is not None:
+                self.level_index = level_index
+                self.question_id = question_id
+                return question_id
+        return None
+
+    def answer(self, selected_answer):
+        """
+        Grade the current question and move on to the next one.
+
+        Returns {question_id, selected_answer, correct_answer, is_correct,
+        explanation, level}.
+        """
+        if self.finished:
+            raise AdaptiveQuizError('This adaptive quiz is already finished')
+        key = answer_keys.lookup_many([self.question_id]).get(self.question_id)
+        if key is None:
+            raise AdaptiveQuizError(f'Question {self.question_id} no longer exists')
+        correct_answer, explanation, _ = key
+
+        level = self.level
+        is_correct = selected_answer == correct_answer
+        self.asked += 1
+        if is_correct:
+            self.correct += 1
+            self.points += POINTS[level]
+            self.streak += 1
+            if self.streak >= STREAK_TO_LEVEL_UP and self.level_index < len(LEVELS) - 1:
+                self.level_index += 1
+                self.streak = 0
+        else:
+            self.streak = 0
+            self.level_index = max(0, self.level_index - 1)
+
+        result = {
+            'question_id': self.question_id,
+            'selected_answer': selected_answer,
+            'correct_answer': correct_answer,
+            'is_correct': is_correct,
+            'explanation': explanation if explanation else None,
+            'level': level,
+        }
+        self.advance(prefer_harder=is_correct)
+        return result
+
+    def progress(self):
+        return {
+            'asked': self.asked,
+            'correct': self.correct,
+            'points': self.points,
+            'level': self.level,
+            'num_questions': self.num_questions,
+            'finished': self.finished,
+        }
+
+
+def start_quiz(subject_id, level='medium', num_questions=10, seed=None):
+    """Return a new AdaptiveQuiz with its first question picked"""
+    if level not in LEVELS:
+        raise AdaptiveQuizError(f'Invalid level: {level}')
+    if seed is None:
+        seed = random.getrandbits(31)
+    quiz = AdaptiveQuiz(subject_id, seed, num_questions, LEVELS.index(level))
+    if quiz.advance() is None:
+        raise AdaptiveQuizError('No questions available for this subject')
+    return quiz
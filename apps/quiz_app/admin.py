@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Subject, Question
+from django.db.models import Q, Sum
+from .models import Subject, Question, QuestionAnalytics, QuizAttempt, AttemptAnswer
+from .search import search_filter
 
 
 @admin.register(Subject)
@@ -9,16 +11,28 @@ class SubjectAdmin(admin.ModelAdmin):
     search_fields = ['code', 'name', 'description']
     ordering = ['code']
     
+    def get_queryset(self, request):
+        # Read precomputed counts instead of counting questions per row
+        queryset = super().get_queryset(request)
+        return queryset.annotate(_total_questions=Sum('question_stats__question_count'))
+    
     def total_questions(self, obj):
-        return obj.total_questions()
+        return obj._total_questions or 0
     total_questions.short_description = 'Total Questions'
+    total_questions.admin_order_field = '_total_questions'
 
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     """Admin interface for Question model"""
-    list_display = ['subject', 'question_preview', 'level', 'correct_answer', 'created_at']
+    list_display = [
+        'subject', 'question_preview', 'level', 'correct_answer',
+        'attempt_count', 'p_value', 'discrimination', 'created_at'
+    ]
     list_filter = ['subject', 'level', 'correct_answer']
+    # Analytics columns read the precomputed QuestionAnalytics row
+    list_select_related = ['subject', 'analytics']
+    # Searched through the full-text index, see get_search_results()
     search_fields = ['question_text', 'subject__code', 'subject__name']
     ordering = ['subject', 'level', '-created_at']
     
@@ -35,11 +49,44 @@ class QuestionAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        """Match question text and options with the search index instead of LIKE scans"""
+        if not search_term.strip():
+            return queryset, False
+        subjects = Subject.objects.filter(Q(code__icontains=search_term) | Q(name__icontains=search_term))
+        return queryset.filter(search_filter(search_term) | Q(subject__in=subjects)), False
+    
     def question_preview(self, obj):
         """Show first 80 characters of question"""
         return obj.question_text[:80] + '...' if len(obj.question_text) > 80 else obj.question_text
     question_preview.short_description = 'Question'
     
+    def _analytics(self, obj):
+        try:
+            return obj.analytics
+        except QuestionAnalytics.DoesNotExist:
+            return None
+    
+    def attempt_count(self, obj):
+        analytics = self._analytics(obj)
+        return analytics.attempt_count if analytics else 0
+    attempt_count.short_description = 'Attempts'
+    attempt_count.admin_order_field = 'analytics__attempt_count'
+    
+    def p_value(self, obj):
+        """Share of correct answers"""
+        analytics = self._analytics(obj)
+        p_value = analytics.p_value if analytics else None
+        return f'{p_value:.2f}' if p_value is not None else '-'
+    p_value.short_description = 'P-value'
+    
+    def discrimination(self, obj):
+        """Point-biserial correlation with the attempt score"""
+        analytics = self._analytics(obj)
+        discrimination = analytics.discrimination if analytics else None
+        return f'{discrimination:.2f}' if discrimination is not None else '-'
+    discrimination.short_description = 'Discrimination'
+    
     def save_model(self, request, obj, form, change):
         """Validate correct answer before saving"""
         if obj.correct_answer not in ['A', 'B', 'C', 'D']:
@@ -47,6 +94,29 @@ class QuestionAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+class AttemptAnswerInline(admin.TabularInline):
+    model = AttemptAnswer
+    extra = 0
+    can_delete = False
+    fields = ['question', 'selected_answer', 'is_correct']
+    readonly_fields = fields
+    raw_id_fields = ['question']
+
+
+@admin.register(QuizAttempt)
+class QuizAttemptAdmin(admin.ModelAdmin):
+    """Read-only history of graded quiz submissions"""
+    list_display = ['submitted_at', 'subject', 'level', 'source', 'correct_count', 'total_questions', 'percentage']
+    list_filter = ['source', 'level', 'subject']
+    date_hierarchy = 'submitted_at'
+    list_select_related = ['subject']
+    readonly_fields = ['subject', 'level', 'source', 'total_questions', 'correct_count', 'percentage', 'submitted_at']
+    inlines = [AttemptAnswerInline]
+
+    def has_add_permission(self, request):
+        return False
+
+
 # Customize admin site header
 admin.site.site_header = 'Quiz System Administration'
 admin.site.site_title = 'Quiz Admin'
@@ -0,0 +1,139 @@
+"""
+Question Analytics
+==================
+
+Maintenance of the QuestionAnalytics table: per-question answer counts and
+score sums, added in batches by the attempt writer (see attempts.py) as
+attempts are recorded, and rebuilt from AttemptAnswer on demand. Reading
+a question's difficulty (p-value), discrimination and option distribution
+is a single-row lookup.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import AttemptAnswer, QuestionAnalytics
+
+OPTION_FIELDS = {
+    'A': 'option_a_count',
+    'B': 'option_b_count',
+    'C': 'option_c_count',
+    'D': 'option_d_count',
+}
+COUNT_FIELDS = (
+    'attempt_count', 'correct_count', *OPTION_FIELDS.values(), 'unanswered_count',
+    'score_sum', 'score_squares_sum', 'correct_score_sum',
+)
+
+# Questions are only flagged once they have this many attempts
+MIN_ATTEMPTS = 20
+
+
+def attempt_deltas(attempts):
+    """Return {question_id: {field: delta}} for record_attempt() payloads"""
+    deltas = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS, 0))
+    for attempt in attempts:
+        score = attempt['percentage'] / 100
+        for question_id, selected_answer, is_correct in attempt['answers']:
+            delta = deltas[question_id]
+            delta['attempt_count'] += 1
+            delta['score_sum'] += score
+            delta['score_squares_sum'] += score * score
+            if is_correct:
+                delta['correct_count'] += 1
+                delta['correct_score_sum'] += score
+            delta[OPTION_FIELDS.get(selected_answer, 'unanswered_count')] += 1
+    return dict(deltas)
+
+
+def apply_analytics_deltas(deltas):
+    """Add {question_id: {field: delta}} to the stored aggregates"""
+    if not deltas:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        QuestionAnalytics.objects.bulk_create(
+            [QuestionAnalytics(question_id=question_id) for question_id in deltas],
+            ignore_conflicts=True
+        )
+        for question_id, delta in deltas.items():
+            QuestionAnalytics.objects.filter(question_id=question_id).update(
+                updated_at=now,
+                **{field: F(field) + value for field, value in delta.items() if value}
+            )
+
+
+def rebuild_question_analytics():
+    """Recompute all aggregates from recorded answers; returns rows written"""
+    score = F('attempt__percentage') / 100.0
+    correct = Q(is_correct=True)
+    rows = (
+        AttemptAnswer.objects.filter(question__isnull=False)
+        .order_by()
+        .values('question_id')
+        .annotate(
+            attempt_count=Count('id'),
+            correct_count=Count('id', filter=correct),
+            **{
+                field: Count('id', filter=Q(selected_answer=option))
+                for option, field in OPTION_FIELDS.items()
+            },
+            unanswered_count=Count('id', filter=~Q(selected_answer__in=list(OPTION_FIELDS))),
+            score_sum=Sum(score),
+            score_squares_sum=Sum(score * score),
+            correct_score_sum=Sum(score, filter=correct),
+        )
+    )
+    with transaction.atomic():
+        QuestionAnalytics.objects.all().delete()
+        created = QuestionAnalytics.objects.bulk_create([
+            QuestionAnalytics(**{key: value or 0 for key, value in row.items()})
+            for row in rows
+        ])
+    return len(created)
+
+
+def question_flags(analytics, correct_answer):
+    """Reasons to review a question, once it has MIN_ATTEMPTS attempts"""
+    if analytics.attempt_count < MIN_ATTEMPTS:
+        return []
+    flags = []
+    p_value = analytics.p_value
+    if p_value < 0.2:
+        flags.append('too_hard')
+    elif p_value > 0.95:
+        flags.append('too_easy')
+    discrimination = analytics.discrimination
+    if discrimination is not None and discrimination < 0.2:
+        flags.append('low_discrimination')
+    counts = analytics.option_counts()
+    distractors = {option: count for option, count in counts.items() if option != correct_answer}
+    if any(count > counts.get(correct_answer, 0) for count in distractors.values()):
+        flags.append('distractor_beats_key')
+    if any(count < 0.02 * analytics.attempt_count for count in distractors.values()):
+        flags.append('unused_distractor')
+    return flags
+
+
+def analytics_summary(analytics, correct_answer):
+    """JSON-ready statistics of one QuestionAnalytics row"""
+    attempts = analytics.attempt_count
+    counts = analytics.option_counts()
+    p_value = analytics.p_value
+    discrimination = analytics.discrimination
+    return {
+        'attempt_count': attempts,
+        'correct_count': analytics.correct_count,
+        'unanswered_count': analytics.unanswered_count,
+        'p_value': round(p_value, 4) if p_value is not None else None,
+        'discrimination': round(discrimination, 4) if discrimination is not None else None,
+        'option_counts': counts,
+        'option_shares': {
+            option: round(count / attempts, 4) if attempts else None
+            for option, count in counts.items()
+        },
+        'flags': question_flags(analytics, correct_answer),
+    }
@@ -0,0 +1,193 @@
+"""
+Answer Key Cache
+================
+
+In-process cache of everything grading needs (correct answer, explanation,
+question text), loaded lazily one subject at a time.
+
+Each subject is stored compactly: a sorted ``array`` of question ids, a
+``bytes`` string of correct answers and two lists of strings. Entries are
+rebuilt when the subject's version changes (see versioning.py) and the
+least recently used subjects are evicted once the cache grows past
+``QUIZ_ANSWER_KEY_CACHE_BYTES``. Grading against a warm cache costs no
+database queries. With a question bank snapshot (see snapshot.py), keys
+are read from the snapshot instead.
+"""
+
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Question
+from .snapshot import snapshots
+from .versioning import aget_subject_versions, get_subject_versions
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class SubjectAnswerKey:
+    """Answer key of one subject"""
+
+    __slots__ = ('subject_id', 'version', 'ids', 'answers', 'explanations', 'texts', 'nbytes')
+
+    def __init__(self, subject_id, version, rows):
+        self.subject_id = subject_id
+        self.version = version
+        self.ids = array('q')
+        answers = bytearray()
+        self.explanations = []
+        self.texts = []
+        for question_id, correct_answer, explanation, question_text in rows:
+            self.ids.append(question_id)
+            answers += correct_answer.encode('ascii')
+            self.explanations.append(explanation)
+            self.texts.append(question_text)
+        self.answers = bytes(answers)
+        self.nbytes = (
+            self.ids.itemsize * len(self.ids)
+            + len(self.answers)
+            + sum(sys.getsizeof(s) for s in self.explanations)
+            + sum(sys.getsizeof(s) for s in self.texts)
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, question_id):
+        """Return (correct_answer, explanation, question_text) or None"""
+        i = bisect_left(self.ids, question_id)
+        if i == len(self.ids) or self.ids[i] != question_id:
+            return None
+        return chr(self.answers[i]), self.explanations[i], self.texts[i]
+
+
+class AnswerKeyCache:
+    """LRU cache of per-subject answer keys with a memory budget"""
+
+    def __init__(self):
+        self._subjects = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, 'QUIZ_ANSWER_KEY_CACHE_BYTES', DEFAULT_CACHE_BYTES)
+
+    @property
+    def nbytes(self):
+        return sum(key.nbytes for key in self._subjects.values())
+
+    def _rows_query(self, subject_id):
+        return (
+            Question.objects.filter(subject_id=subject_id)
+            .order_by('id')
+            .values_list('id', 'correct_answer', 'explanation', 'question_text')
+        )
+
+    def _store(self, key):
+        with self._lock:
+            self._subjects[key.subject_id] = key
+            self._subjects.move_to_end(key.subject_id)
+            # Evict least recently used subjects, but always keep this one
+            while self.nbytes > self.max_bytes and len(self._subjects) > 1:
+                self._subjects.popitem(last=False)
+        return key
+
+    def _load(self, subject_id, version):
+        rows = self._rows_query(subject_id).iterator(chunk_size=2000)
+        return self._store(SubjectAnswerKey(subject_id, version, rows))
+
+    async def _aload(self, subject_id, version):
+        rows = [row async for row in self._rows_query(subject_id)]
+        return self._store(SubjectAnswerKey(subject_id, version, rows))
+
+    def _cached_keys(self):
+        with self._lock:
+            return list(self._subjects.values())
+
+    def _fresh_keys(self, keys, versions):
+        """The keys whose version is still current; stale ones are dropped"""
+        fresh = []
+        for key in keys:
+            if versions[key.subject_id] == key.version:
+                fresh.append(key)
+            else:
+                with self._lock:
+                    self._subjects.pop(key.subject_id, None)
+        return fresh
+
+    def _touch(self, subject_id):
+        with self._lock:
+            if subject_id in self._subjects:
+                self._subjects.move_to_end(subject_id)
+
+    def _lookup_cached(self, question_ids, keys, versions):
+        """Return (found, missing ids) using fresh cached subjects only"""
+        found = {}
+        missing = set(question_ids)
+        for key in self._fresh_keys(keys, versions):
+            if not missing:
+                break
+            hits = {question_id: key.get(question_id) for question_id in missing}
+            hits = {question_id: entry for question_id, entry in hits.items() if entry}
+            if hits:
+                found.update(hits)
+                missing.difference_update(hits)
+                self._touch(key.subject_id)
+        return found, missing
+
+    def _missing_subjects_query(self, missing):
+        return Question.objects.filter(id__in=missing).order_by().values_list('subject_id', flat=True)
+
+    def _lookup_loaded(self, key, found, missing):
+        for question_id in list(missing):
+            entry = key.get(question_id)
+            if entry:
+                found[question_id] = entry
+                missing.discard(question_id)
+
+    def lookup_many(self, question_ids):
+        """
+        Return {question_id: (correct_answer, explanation, question_text)}.
+
+        Unknown ids are left out of the result. Ids not covered by a cached
+        subject cost one query to find their subjects plus one query per
+        subject loaded.
+        """
+        snapshot = snapshots.get()
+        if snapshot is not None:
+            return snapshot.answer_keys(question_ids)
+        keys = self._cached_keys()
+        versions = get_subject_versions([key.subject_id for key in keys])
+        found, missing = self._lookup_cached(question_ids, keys, versions)
+        if missing:
+            subject_ids = set(self._missing_subjects_query(missing))
+            versions = get_subject_versions(subject_ids)
+            for subject_id in subject_ids:
+                self._lookup_loaded(self._load(subject_id, versions[subject_id]), found, missing)
+        return found
+
+    async def alookup_many(self, question_ids):
+        """Async lookup_many()"""
+        snapshot = await snapshots.aget()
+        if snapshot is not None:
+            return snapshot.answer_keys(question_ids)
+        keys = self._cached_keys()
+        versions = await aget_subject_versions([key.subject_id for key in keys])
+        found, missing = self._lookup_cached(question_ids, keys, versions)
+        if missing:
+            subject_ids = {subject_id async for subject_id in self._missing_subjects_query(missing)}
+            versions = await aget_subject_versions(subject_ids)
+            for subject_id in subject_ids:
+                self._lookup_loaded(await self._aload(subject_id, versions[subject_id]), found, missing)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._subjects.clear()
+
+
+answer_keys = AnswerKeyCache()
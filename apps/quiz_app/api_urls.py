@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import api_views
+from . import api_views, async_api_views
 
 app_name = 'quiz_api'
 
@@ -15,14 +15,26 @@ urlpatterns = [
     
     # Questions
     path('questions/', api_views.api_questions, name='questions'),
+    path('questions/search/', api_views.api_question_search, name='question_search'),
+    path('questions/<int:question_id>/stats/', api_views.api_question_stats, name='question_stats'),
     
     # Quiz operations
     path('quiz/generate/', api_views.api_generate_quiz, name='generate_quiz'),
+    path('quiz/generate/batch/', api_views.api_generate_quiz_batch, name='generate_quiz_batch'),
     path('quiz/submit/', api_views.api_submit_quiz, name='submit_quiz'),
+    path('quiz/submit/batch/', api_views.api_submit_quiz_batch, name='submit_quiz_batch'),
+    path('quiz/adaptive/start/', api_views.api_adaptive_start, name='adaptive_start'),
+    path('quiz/adaptive/answer/', api_views.api_adaptive_answer, name='adaptive_answer'),
     
     # Statistics
     path('stats/', api_views.api_quiz_stats, name='stats'),
     
     # Health check
     path('health/', api_views.api_health, name='health'),
+    
+    # ASGI-native versions of the hot endpoints
+    path('async/subjects/', async_api_views.async_api_subjects, name='async_subjects'),
+    path('async/quiz/generate/', async_api_views.async_api_generate_quiz, name='async_generate_quiz'),
+    path('async/quiz/submit/', async_api_views.async_api_submit_quiz, name='async_submit_quiz'),
+    path('async/health/', async_api_views.async_api_health, name='async_health'),
 ]
@@ -1,14 +1,32 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+import json
 import time
+from itertools import islice
 
-from .models import Subject, Question, get_random_questions, get_all_subjects, get_subject_levels
+from .models import Subject, Question, QuestionAnalytics, get_all_subjects, get_subject_levels
+from .adaptive import AdaptiveQuiz, AdaptiveQuizError, purge_expired_steps, start_quiz
+from .analytics import analytics_summary
+from .batches import MAX_SUBMISSIONS, QuizBatchError, generate_batch, grade_batch, parse_ndjson
+from .attempts import attempt_writer, record_attempt
+from .catalog import LEVELS, get_level_counts
+from .decks import build_seeded_deck, get_quiz_payload
+from .grading import QuestionNotFound, grade_answers
+from .listing import InvalidCursor, NDJSONRenderer, question_page, stream_questions
+from .quiz_tokens import InvalidQuizToken, issue_token, issued_answers, read_token
+from .fragments import question_fragments, questions_etag, render_with_questions
+from .sampling import sampler, seeded_question_ids
+from .search import search_questions
 from .serializers import (
-    SubjectSerializer, QuestionSerializer, QuizRequestSerializer,
+    SubjectSerializer, QuizRequestSerializer, QuizBatchRequestSerializer,
+    AdaptiveStartSerializer, AdaptiveAnswerSerializer, QuestionListSerializer, QuestionSearchSerializer,
     QuizSubmissionSerializer, QuizResultSerializer
 )
 
@@ -21,11 +39,11 @@ def api_subjects(request):
     
     GET /api/subjects/
     """
-    subjects = get_all_subjects()
-    serializer = SubjectSerializer(subjects, many=True)
+    subjects = list(get_all_subjects())
+    serializer = SubjectSerializer(subjects, many=True, context={'level_counts': get_level_counts()})
     return Response({
         'success': True,
-        'count': subjects.count(),
+        'count': len(subjects),
         'subjects': serializer.data
     })
 
@@ -54,31 +72,167 @@ def api_subject_detail(request, subject_code):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NDJSONRenderer])
 def api_questions(request):
     """
     Get questions with optional filtering
     
-    GET /api/questions/?subject_code=CSW351-AI&level=easy&limit=10
+    GET /api/questions/?subject_code=CSW351-AI&level=easy&limit=10&seed=42
+    GET /api/questions/?subject_code=CSW351-AI&page_size=100&cursor=...
+    GET /api/questions/?subject_code=CSW351-AI&format=ndjson
+    
+    With a seed, the same query returns the same questions while they are
+    unchanged, with an ETag; If-None-Match then gets a 304.
+    
+    With page_size or cursor, questions are listed in (subject, level, id)
+    order, one page at a time: pass each response's next_cursor to get the
+    next page. With format=ndjson, every matching question is streamed,
+    one per line (see listing.py).
     """
-    subject_code = request.GET.get('subject_code')
-    level = request.GET.get('level')
-    limit = int(request.GET.get('limit', 20))
+    serializer = QuestionListSerializer(data=request.GET)
+    
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    questions = Question.objects.all()
+    data = serializer.validated_data
+    subject_code = data.get('subject_code')
+    level = data.get('level')
+    limit = data['limit']
+    seed = data.get('seed')
     
+    subject_id = None
     if subject_code:
-        questions = questions.filter(subject__code=subject_code)
+        subject_id = Subject.objects.filter(code=subject_code).values_list('id', flat=True).first()
     
-    if level:
-        questions = questions.filter(level=level)
+    if data['format'] == 'ndjson' or 'cursor' in data or 'page_size' in data:
+        return _question_listing(data, subject_id)
     
-    questions = questions.order_by('?')[:limit]  # Random order
+    etag = None
+    if subject_code and subject_id is None:
+        question_ids = []
+    elif seed is None:
+        # Random order, drawn from the in-memory id index
+        question_ids = sampler.sample_ids(subject_id, level, limit)
+    else:
+        question_ids = seeded_question_ids(subject_id, level, limit, seed)
+        etag = questions_etag(question_ids, subject_code, level, limit, seed)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+    
+    # Joined from cached pre-rendered JSON instead of running the serializer
+    fragments = question_fragments(question_ids)
+    envelope = {
+        'success': True,
+        'count': len(fragments),
+        'token': issue_token(question_ids, subject_code, level),
+    }
+    response = HttpResponse(render_with_questions(envelope, fragments), content_type='application/json')
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def _question_listing(data, subject_id):
+    """Ordered page, or NDJSON stream, of the questions for api_questions"""
+    subject_code = data.get('subject_code')
+    level = data.get('level')
+    cursor = data.get('cursor') or None
+    unknown_subject = subject_code and subject_id is None
+    try:
+        if data['format'] == 'ndjson':
+            lines = iter(()) if unknown_subject else stream_questions(subject_id, level, cursor)
+            return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        if unknown_subject:
+            question_ids, next_cursor = [], None
+        else:
+            question_ids, next_cursor = question_page(subject_id, level, data.get('page_size', 100), cursor)
+    except InvalidCursor as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    fragments = question_fragments(question_ids)
+    envelope = {
+        'success': True,
+        'count': len(fragments),
+        'next_cursor': next_cursor,
+        'token': issue_token(question_ids, subject_code, level),
+    }
+    return HttpResponse(render_with_questions(envelope, fragments), content_type='application/json')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def api_question_search(request):
+    """
+    Full-text search over question text and options, best match first
+    
+    GET /api/questions/search/?q=neural net&subject_code=CSW351-AI&level=easy&page=1&page_size=20
+    
+    Every word must match; the last one also matches as a prefix.
+    """
+    serializer = QuestionSearchSerializer(data=request.GET)
+    
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    page, page_size = data['page'], data['page_size']
+    
+    subject_id = None
+    if data.get('subject_code'):
+        subject_id = Subject.objects.filter(code=data['subject_code']).values_list('id', flat=True).first()
+    
+    if data.get('subject_code') and subject_id is None:
+        total, question_ids = 0, []
+    else:
+        total, question_ids = search_questions(
+            data['q'], subject_id, data.get('level'), limit=page_size, offset=(page - 1) * page_size
+        )
+    
+    fragments = question_fragments(question_ids)
+    envelope = {
+        'success': True,
+        'query': data['q'],
+        'count': total,
+        'page': page,
+        'page_size': page_size,
+        'num_pages': (total + page_size - 1) // page_size,
+    }
+    return HttpResponse(render_with_questions(envelope, fragments), content_type='application/json')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def api_question_stats(request, question_id):
+    """
+    Get answer statistics of one question
+    
+    GET /api/questions/{id}/stats/
+    """
+    analytics = QuestionAnalytics.objects.select_related('question').filter(pk=question_id).first()
+    if analytics is None:
+        # No attempts recorded yet
+        question = Question.objects.filter(pk=question_id).only('id', 'correct_answer').first()
+        if question is None:
+            return Response({
+                'success': False,
+                'error': 'Question not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        analytics = QuestionAnalytics(question=question)
     
-    serializer = QuestionSerializer(questions, many=True)
     return Response({
         'success': True,
-        'count': len(questions),
-        'questions': serializer.data
+        'question_id': question_id,
+        'stats': analytics_summary(analytics, analytics.question.correct_answer)
     })
 
 
@@ -92,8 +246,13 @@ def api_generate_quiz(request):
     {
         "subject_code": "CSW351-AI",
         "level": "easy",
-        "num_questions": 10
+        "num_questions": 10,
+        "seed": 42
     }
+    
+    With a seed (optional), the same request always gets the same
+    questions while the question bank is unchanged, and the response has
+    an ETag.
     """
     serializer = QuizRequestSerializer(data=request.data)
     
@@ -109,32 +268,83 @@ def api_generate_quiz(request):
     num_questions = data['num_questions']
     
     try:
-        # Get random questions
-        questions = get_random_questions(subject_code, level, num_questions)
-        
-        if not questions:
-            return Response({
-                'success': False,
-                'error': f'No questions available for {subject_code} - {level} level'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        question_serializer = QuestionSerializer(questions, many=True)
-        
+        subject = Subject.objects.get(code=subject_code)
+    except Subject.DoesNotExist:
         return Response({
-            'success': True,
-            'quiz': {
-                'subject_code': subject_code,
-                'level': level,
-                'num_questions': len(questions),
-                'questions': question_serializer.data
-            }
-        })
-        
+            'success': False,
+            'error': 'Subject not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    seed = data.get('seed')
+    if seed is None:
+        # Pre-built deck from the pool, or sampled and serialized on the spot
+        quiz = get_quiz_payload(subject, level, num_questions)
+    else:
+        quiz = build_seeded_deck(subject, level, num_questions, seed)
+    
+    if quiz is None:
+        return Response({
+            'success': False,
+            'error': f'No questions available for {subject_code} - {level} level'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Answers stay on the server; the token records which questions were issued
+    question_ids = [question['id'] for question in quiz['questions']]
+    quiz['token'] = issue_token(question_ids, subject_code, level)
+    response = Response({
+        'success': True,
+        'quiz': quiz
+    })
+    if seed is not None:
+        response['ETag'] = questions_etag(question_ids, subject_code, level, num_questions, seed)
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def api_generate_quiz_batch(request):
+    """
+    Generate many distinct quizzes at once, streamed as NDJSON
+    
+    POST /api/quiz/generate/batch/
+    {
+        "subject_code": "CSW351-AI",
+        "level": "easy",
+        "num_questions": 10,
+        "count": 300,
+        "seed": 42
+    }
+    
+    Each line is one quiz, shaped like the "quiz" of /api/quiz/generate/
+    plus its "index" in the batch. The seed is optional.
+    """
+    serializer = QuizBatchRequestSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    try:
+        subject = Subject.objects.get(code=data['subject_code'])
     except Subject.DoesNotExist:
         return Response({
             'success': False,
             'error': 'Subject not found'
         }, status=status.HTTP_404_NOT_FOUND)
+    
+    # All quizzes are drawn up front; lines are rendered as the response is sent
+    try:
+        lines = generate_batch(subject, data['level'], data['num_questions'], data['count'], data.get('seed'))
+    except QuizBatchError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
 
 
 @api_view(['POST'])
@@ -145,11 +355,15 @@ def api_submit_quiz(request):
     
     POST /api/quiz/submit/
     {
+        "token": "<token from /api/quiz/generate/>",
         "answers": [
             {"question_id": 1, "selected_answer": "A"},
             {"question_id": 2, "selected_answer": "B"}
         ]
     }
+    
+    With a token, only issued questions may be answered and every issued
+    question is graded (unanswered ones as incorrect).
     """
     serializer = QuizSubmissionSerializer(data=request.data)
     
@@ -160,47 +374,31 @@ def api_submit_quiz(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     answers = serializer.validated_data['answers']
-    results = []
-    correct_count = 0
-    
-    # Process each answer
-    for answer_data in answers:
-        question_id = answer_data['question_id']
-        selected_answer = answer_data['selected_answer']
-        
+    pairs = [(answer['question_id'], answer['selected_answer']) for answer in answers]
+    
+    token = serializer.validated_data.get('token')
+    quiz = {}
+    if token:
         try:
-            question = Question.objects.get(id=question_id)
-            is_correct = selected_answer == question.correct_answer
-            
-            if is_correct:
-                correct_count += 1
-            
-            results.append({
-                'question_id': question_id,
-                'question_text': question.question_text,
-                'selected_answer': selected_answer,
-                'correct_answer': question.correct_answer,
-                'is_correct': is_correct,
-                'explanation': question.explanation if question.explanation else None
-            })
-            
-        except Question.DoesNotExist:
+            quiz = read_token(token)
+            pairs = issued_answers(quiz, pairs)
+        except InvalidQuizToken as e:
             return Response({
                 'success': False,
-                'error': f'Question with ID {question_id} not found'
-            }, status=status.HTTP_404_NOT_FOUND)
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
     
-    total_questions = len(results)
-    incorrect_count = total_questions - correct_count
-    percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
+    # Grade all answers against one bulk lookup
+    try:
+        result_data = grade_answers(pairs)
+    except QuestionNotFound as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_404_NOT_FOUND)
     
-    result_data = {
-        'total_questions': total_questions,
-        'correct_count': correct_count,
-        'incorrect_count': incorrect_count,
-        'percentage': round(percentage, 2),
-        'results': results
-    }
+    # Saved in the background, after the response
+    record_attempt(result_data, quiz.get('subject_code'), quiz.get('level'), source='api')
     
     return Response({
         'success': True,
@@ -208,6 +406,133 @@ def api_submit_quiz(request):
     })
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def api_submit_quiz_batch(request):
+    """
+    Grade many quiz submissions at once, results streamed as NDJSON
+    
+    POST /api/quiz/submit/batch/
+    [
+        {"token": "...", "answers": [{"question_id": 1, "selected_answer": "A"}]},
+        {"token": "...", "answers": [{"question_id": 7, "selected_answer": "C"}]}
+    ]
+    
+    The body is a JSON array of /api/quiz/submit/ bodies, or one body per
+    line with Content-Type: application/x-ndjson. Each result line has the
+    submission's "index" and either "quiz_result" or an error.
+    """
+    if request.content_type.startswith('application/x-ndjson'):
+        # Reading stops one line past the limit, however long the body is
+        submissions = list(islice(parse_ndjson(request.stream or []), MAX_SUBMISSIONS + 1))
+    else:
+        submissions = request.data
+        if not isinstance(submissions, list):
+            return Response({
+                'success': False,
+                'error': 'Expected a JSON array of submissions'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(submissions) > MAX_SUBMISSIONS:
+        return Response({
+            'success': False,
+            'error': f'At most {MAX_SUBMISSIONS} submissions can be graded at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # One answer key lookup for every question referenced by the batch
+    return StreamingHttpResponse(grade_batch(submissions), content_type='application/x-ndjson')
+
+
+def _adaptive_response(quiz, **extra):
+    """Body of an adaptive quiz step: progress, next question and new token"""
+    data = {
+        'success': True,
+        **extra,
+        'progress': quiz.progress(),
+        'token': quiz.dumps(),
+    }
+    if not quiz.finished:
+        fragments = question_fragments([quiz.question_id])
+        data['question'] = json.loads(fragments[0]) if fragments else None
+    return Response(data)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def api_adaptive_start(request):
+    """
+    Start an adaptive quiz
+    
+    POST /api/quiz/adaptive/start/
+    {
+        "subject_code": "CSW351-AI",
+        "level": "medium",
+        "num_questions": 10
+    }
+    """
+    serializer = AdaptiveStartSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    subject_id = Subject.objects.filter(code=data['subject_code']).values_list('id', flat=True).first()
+    if subject_id is None:
+        return Response({
+            'success': False,
+            'error': 'Subject not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        quiz = start_quiz(subject_id, data['level'], data['num_questions'])
+    except AdaptiveQuizError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    purge_expired_steps()
+    return _adaptive_response(quiz)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def api_adaptive_answer(request):
+    """
+    Answer the current question of an adaptive quiz and get the next one
+    
+    POST /api/quiz/adaptive/answer/
+    {
+        "token": "<token from the previous step>",
+        "selected_answer": "B"
+    }
+    """
+    serializer = AdaptiveAnswerSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    try:
+        quiz = AdaptiveQuiz.loads(data['token'])
+        result = quiz.answer(data['selected_answer'])
+        # Only a graded answer uses up the token
+        quiz.consume_step()
+    except AdaptiveQuizError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return _adaptive_response(quiz, result=result)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def api_quiz_stats(request):
@@ -216,35 +541,37 @@ def api_quiz_stats(request):
     
     GET /api/stats/
     """
-    total_subjects = Subject.objects.count()
-    total_questions = Question.objects.count()
+    subjects = list(Subject.objects.all())
+    level_counts = get_level_counts()
     
     # Questions by level
-    easy_count = Question.objects.filter(level='easy').count()
-    medium_count = Question.objects.filter(level='medium').count()
-    hard_count = Question.objects.filter(level='hard').count()
+    level_totals = {level: 0 for level in LEVELS}
+    for counts in level_counts.values():
+        for level, count in counts.items():
+            level_totals[level] = level_totals.get(level, 0) + count
     
     # Questions by subject
     subjects_stats = []
-    for subject in Subject.objects.all():
+    for subject in subjects:
+        counts = level_counts.get(subject.id, {})
         subjects_stats.append({
             'code': subject.code,
             'name': subject.name,
-            'total_questions': subject.total_questions(),
-            'easy': subject.questions_by_level('easy').count(),
-            'medium': subject.questions_by_level('medium').count(),
-            'hard': subject.questions_by_level('hard').count()
+            'total_questions': sum(counts.values()),
+            'easy': counts.get('easy', 0),
+            'medium': counts.get('medium', 0),
+            'hard': counts.get('hard', 0)
         })
     
     return Response({
         'success': True,
         'stats': {
-            'total_subjects': total_subjects,
-            'total_questions': total_questions,
+            'total_subjects': len(subjects),
+            'total_questions': sum(level_totals.values()),
             'questions_by_level': {
-                'easy': easy_count,
-                'medium': medium_count,
-                'hard': hard_count
+                'easy': level_totals['easy'],
+                'medium': level_totals['medium'],
+                'hard': level_totals['hard']
             },
             'subjects': subjects_stats
         }
@@ -267,10 +594,20 @@ def api_root(request):
             'subjects': '/api/subjects/',
             'subject_detail': '/api/subjects/{code}/',
             'questions': '/api/questions/',
+            'question_search': '/api/questions/search/',
+            'question_stats': '/api/questions/{id}/stats/',
             'generate_quiz': '/api/quiz/generate/',
+            'generate_quiz_batch': '/api/quiz/generate/batch/',
             'submit_quiz': '/api/quiz/submit/',
+            'submit_quiz_batch': '/api/quiz/submit/batch/',
+            'adaptive_start': '/api/quiz/adaptive/start/',
+            'adaptive_answer': '/api/quiz/adaptive/answer/',
             'stats': '/api/stats/',
-            'health': '/api/health/'
+            'health': '/api/health/',
+            'async_subjects': '/api/async/subjects/',
+            'async_generate_quiz': '/api/async/quiz/generate/',
+            'async_submit_quiz': '/api/async/quiz/submit/',
+            'async_health': '/api/async/health/'
         },
         'documentation': 'See API_DOCUMENTATION.md for detailed usage',
         'browsable_api': 'Visit /api/ in browser for interactive API browser'
@@ -289,5 +626,6 @@ def api_health(request):
         'success': True,
         'status': 'healthy',
         'timestamp': timezone.now().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'attempt_writer': attempt_writer.stats()
     })
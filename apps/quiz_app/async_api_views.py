@@ -0,0 +1,166 @@
+"""
+Async API Views
+===============
+
+ASGI-native versions of the subjects, generate, submit and health
+endpoints, served under /api/async/. They answer the same requests with
+the same bodies as their counterparts in api_views.py, but run on the
+event loop under an ASGI server (``uvicorn my_quiz_project.asgi:application``)
+instead of taking a thread pool hop per request: the ORM is used through
+its async API and warm caches (deck pools, answer keys) are read without
+leaving the loop.
+
+DRF's ``@api_view`` has no async support, so these are plain Django
+views; request bodies must be JSON and are validated with the same
+serializers.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .attempts import arecord_attempt, attempt_writer
+from .catalog import aget_level_counts
+from .decks import aget_quiz_payload, build_seeded_deck
+from .fragments import questions_etag
+from .grading import QuestionNotFound, agrade_answers
+from .models import Subject
+from .quiz_tokens import InvalidQuizToken, issue_token, issued_answers, read_token
+from .serializers import QuizRequestSerializer, QuizSubmissionSerializer, SubjectSerializer
+
+
+def _error(status, **body):
+    return JsonResponse({'success': False, **body}, status=status)
+
+
+def _json_body(request):
+    """Parsed JSON body, or None if it is not valid JSON"""
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+@require_GET
+async def async_api_subjects(request):
+    """
+    Get all subjects with their statistics
+
+    GET /api/async/subjects/
+    """
+    subjects = [subject async for subject in Subject.objects.all()]
+    level_counts = await aget_level_counts()
+    # Every subject gets an entry, so the serializer never queries
+    for subject in subjects:
+        level_counts.setdefault(subject.id, {})
+    serializer = SubjectSerializer(subjects, many=True, context={'level_counts': level_counts})
+    return JsonResponse({
+        'success': True,
+        'count': len(subjects),
+        'subjects': serializer.data
+    })
+
+
+@csrf_exempt
+@require_POST
+async def async_api_generate_quiz(request):
+    """
+    Generate a random quiz
+
+    POST /api/async/quiz/generate/ (see api_generate_quiz)
+    """
+    data = _json_body(request)
+    if data is None:
+        return _error(400, error='Request body must be JSON')
+    serializer = QuizRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return _error(400, errors=serializer.errors)
+
+    data = serializer.validated_data
+    subject_code = data['subject_code']
+    level = data['level']
+
+    try:
+        subject = await Subject.objects.aget(code=subject_code)
+    except Subject.DoesNotExist:
+        return _error(404, error='Subject not found')
+
+    seed = data.get('seed')
+    if seed is None:
+        quiz = await aget_quiz_payload(subject, level, data['num_questions'])
+    else:
+        quiz = await sync_to_async(build_seeded_deck)(subject, level, data['num_questions'], seed)
+    if quiz is None:
+        return _error(404, error=f'No questions available for {subject_code} - {level} level')
+
+    question_ids = [question['id'] for question in quiz['questions']]
+    quiz['token'] = issue_token(question_ids, subject_code, level)
+    response = JsonResponse({
+        'success': True,
+        'quiz': quiz
+    })
+    if seed is not None:
+        response['ETag'] = await sync_to_async(questions_etag)(
+            question_ids, subject_code, level, data['num_questions'], seed
+        )
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def async_api_submit_quiz(request):
+    """
+    Submit quiz answers and get results
+
+    POST /api/async/quiz/submit/ (see api_submit_quiz)
+    """
+    data = _json_body(request)
+    if data is None:
+        return _error(400, error='Request body must be JSON')
+    serializer = QuizSubmissionSerializer(data=data)
+    if not serializer.is_valid():
+        return _error(400, errors=serializer.errors)
+
+    answers = serializer.validated_data['answers']
+    pairs = [(answer['question_id'], answer['selected_answer']) for answer in answers]
+
+    token = serializer.validated_data.get('token')
+    quiz = {}
+    if token:
+        try:
+            quiz = read_token(token)
+            pairs = issued_answers(quiz, pairs)
+        except InvalidQuizToken as e:
+            return _error(400, error=str(e))
+
+    try:
+        result_data = await agrade_answers(pairs)
+    except QuestionNotFound as e:
+        return _error(404, error=str(e))
+
+    await arecord_attempt(result_data, quiz.get('subject_code'), quiz.get('level'), source='api')
+
+    return JsonResponse({
+        'success': True,
+        'quiz_result': result_data
+    })
+
+
+@require_GET
+async def async_api_health(request):
+    """
+    Health check endpoint
+
+    GET /api/async/health/
+    """
+    return JsonResponse({
+        'success': True,
+        'status': 'healthy',
+        'timestamp': timezone.now().isoformat(),
+        'version': '1.0.0',
+        'attempt_writer': attempt_writer.stats()
+    })
@@ -0,0 +1,249 @@
+"""
+Quiz Attempts
+=============
+
+Write-behind persistence of graded submissions.
+
+Submit views grade, call ``record_attempt()`` and respond; the attempt is
+put on a bounded in-memory queue and a background thread writes queued
+attempts with ``bulk_create`` once ``QUIZ_ATTEMPT_BATCH_SIZE`` attempts
+are waiting or every ``QUIZ_ATTEMPT_FLUSH_MS`` milliseconds, one
+transaction per batch together with the per-question analytics
+increments (see analytics.py). If a batch cannot be written, its attempts
+are retried one at a time so only the bad ones are lost. Pending attempts
+are flushed when the process exits.
+
+When the queue is full the submitting request writes its attempt itself
+(backpressure instead of dropping history); ``attempt_writer.stats()``
+reports queue depth and how often that happened. With
+``QUIZ_ATTEMPT_WRITE_BEHIND = False`` every attempt is written
+synchronously.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .analytics import apply_analytics_deltas, attempt_deltas
+from .models import AttemptAnswer, Question, QuizAttempt, Subject
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_MS = 200
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class AttemptWriter:
+    """Bounded queue of graded attempts drained by a background thread"""
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.metrics = {
+            'queued': 0,
+            'written': 0,
+            'batches': 0,
+            'sync_writes': 0,
+            'queue_full': 0,
+            'failed': 0,
+            'retried': 0,
+            'max_depth': 0,
+            'last_batch_ms': 0.0,
+        }
+
+    @property
+    def write_behind(self):
+        return getattr(settings, 'QUIZ_ATTEMPT_WRITE_BEHIND', True)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'QUIZ_ATTEMPT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'QUIZ_ATTEMPT_FLUSH_MS', DEFAULT_FLUSH_MS) / 1000
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(getattr(settings, 'QUIZ_ATTEMPT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+                atexit.register(self.shutdown)
+            self._stopping.clear()
+            self._worker = threading.Thread(target=self._run, name='quiz-attempt-writer', daemon=True)
+            self._worker.start()
+
+    def enqueue(self, attempt):
+        """Queue an attempt for the worker; False if write-behind is off or the queue is full"""
+        if not self.write_behind:
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(attempt)
+        except queue.Full:
+            self.metrics['queue_full'] += 1
+            return False
+        self.metrics['queued'] += 1
+        self.metrics['max_depth'] = max(self.metrics['max_depth'], self._queue.qsize())
+        return True
+
+    def record(self, attempt):
+        """Queue one attempt (see record_attempt()) for writing"""
+        if not self.enqueue(attempt):
+            # Backpressure: the request pays for its own write
+            self.metrics['sync_writes'] += 1
+            self.write([attempt])
+
+    def _take_batch(self, timeout):
+        """Wait up to timeout for the first attempt, then take what is queued"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                batch = self._take_batch(timeout=self.flush_interval)
+                if batch:
+                    self._write_logged(batch)
+        finally:
+            connections.close_all()
+
+    def _write_logged(self, batch):
+        try:
+            self.write(batch)
+            return
+        except Exception:
+            if len(batch) == 1:
+                self.metrics['failed'] += 1
+                logger.exception('Could not write a quiz attempt')
+                return
+            logger.exception('Could not write %d quiz attempts, retrying them one by one', len(batch))
+        # One bad attempt must not lose the rest of its batch
+        self.metrics['retried'] += len(batch)
+        for attempt in batch:
+            self._write_logged([attempt])
+
+    def write(self, attempts):
+        """Write attempts now, in one transaction"""
+        started = time.perf_counter()
+        codes = {attempt['subject_code'] for attempt in attempts if attempt['subject_code']}
+        subject_ids = dict(Subject.objects.filter(code__in=codes).values_list('code', 'id')) if codes else {}
+        # Questions may have been deleted since they were graded
+        question_ids = {question_id for attempt in attempts for question_id, _, _ in attempt['answers']}
+        known_ids = set(Question.objects.filter(id__in=question_ids).order_by().values_list('id', flat=True))
+
+        rows = [
+            QuizAttempt(
+                subject_id=subject_ids.get(attempt['subject_code']),
+                level=attempt['level'] or '',
+                source=attempt['source'],
+                total_questions=attempt['total_questions'],
+                correct_count=attempt['correct_count'],
+                percentage=attempt['percentage'],
+                submitted_at=attempt['submitted_at'],
+            )
+            for attempt in attempts
+        ]
+        with transaction.atomic():
+            QuizAttempt.objects.bulk_create(rows)
+            AttemptAnswer.objects.bulk_create([
+                AttemptAnswer(
+                    attempt=row,
+                    question_id=question_id if question_id in known_ids else None,
+                    selected_answer=selected_answer or '',
+                    is_correct=is_correct,
+                )
+                for row, attempt in zip(rows, attempts)
+                for question_id, selected_answer, is_correct in attempt['answers']
+            ], batch_size=1000)
+            deltas = attempt_deltas(attempts)
+            apply_analytics_deltas({
+                question_id: delta for question_id, delta in deltas.items() if question_id in known_ids
+            })
+
+        self.metrics['written'] += len(attempts)
+        self.metrics['batches'] += 1
+        self.metrics['last_batch_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        if self._queue is None:
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write_logged(batch)
+                batch = []
+        if batch:
+            self._write_logged(batch)
+
+    def shutdown(self, timeout=5):
+        """Stop the worker and flush what is left (registered with atexit)"""
+        self._stopping.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+        self.flush()
+
+    def stats(self):
+        return {**self.metrics, 'depth': self._queue.qsize() if self._queue is not None else 0}
+
+
+attempt_writer = AttemptWriter()
+
+
+def _attempt(graded, subject_code, level, source):
+    return {
+        'subject_code': subject_code,
+        'level': level,
+        'source': source,
+        'total_questions': graded['total_questions'],
+        'correct_count': graded['correct_count'],
+        'percentage': graded['percentage'],
+        'submitted_at': timezone.now(),
+        'answers': [
+            (result['question_id'], result['selected_answer'], result['is_correct'])
+            for result in graded['results']
+        ],
+    }
+
+
+def record_attempt(graded, subject_code=None, level=None, source='api'):
+    """Persist a grade_answers() result in the background"""
+    attempt_writer.record(_attempt(graded, subject_code, level, source))
+
+
+async def arecord_attempt(graded, subject_code=None, level=None, source='api'):
+    """Async record_attempt(); only a synchronous write leaves the event loop"""
+    attempt = _attempt(graded, subject_code, level, source)
+    if not attempt_writer.enqueue(attempt):
+        attempt_writer.metrics['sync_writes'] += 1
+        await sync_to_async(attempt_writer.write)([attempt])
@@ -0,0 +1,161 @@
+"""
+Quiz Batches
+============
+
+Provisioning many quizzes in one request, e.g. for an exam room.
+
+``generate_batch()`` draws ``count`` quizzes with distinct question sets
+from the sampler's id pool for a subject and level (see sampling.py),
+loads the pre-rendered fragments of all drawn questions with one lookup
+(see fragments.py) and returns an iterator of NDJSON lines, one quiz per
+line, each with its own quiz token. Passing a seed makes the drawn
+question sets reproducible.
+
+``grade_batch()`` grades many submissions, e.g. synced by an offline exam
+room: each is checked with QuizSubmissionSerializer's rules (see
+serializers.validate_submission) and its token, all are graded against a
+single answer key lookup of every referenced question (see
+answer_keys.py), and the results are returned as an iterator of NDJSON
+lines, one per submission, in order. Invalid submissions get an error
+line instead of failing the batch.
+"""
+
+import json
+import random
+from math import comb
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from .answer_keys import answer_keys
+from .attempts import record_attempt
+from .fragments import fragment_map, render_with_questions
+from .grading import QuestionNotFound, grade_with_keys
+from .quiz_tokens import InvalidQuizToken, issue_token, issued_answers, read_token
+from .sampling import sampler
+from .serializers import validate_submission
+
+renderer = JSONRenderer()
+
+# Most submissions graded in one request
+MAX_SUBMISSIONS = 5000
+
+
+class QuizBatchError(ValueError):
+    """A batch of quizzes cannot be provisioned"""
+
+
+def draw_quizzes(pool, num_questions, count, rng):
+    """Return count lists of num_questions ids from pool, no two with the same questions"""
+    num_questions = min(num_questions, len(pool))
+    if count > comb(len(pool), num_questions):
+        raise QuizBatchError(
+            f'Only {comb(len(pool), num_questions)} distinct quizzes of {num_questions} questions '
+            f'can be made from {len(pool)} questions'
+        )
+    quizzes = []
+    seen = set()
+    while len(quizzes) < count:
+        ids = [pool[i] for i in rng.sample(range(len(pool)), num_questions)]
+        key = frozenset(ids)
+        if key not in seen:
+            seen.add(key)
+            quizzes.append(ids)
+    return quizzes
+
+
+def generate_batch(subject, level, num_questions, count, seed=None):
+    """
+    Return an iterator of NDJSON lines (bytes), one quiz per line.
+
+    Raises QuizBatchError if the pool is empty or too small for count
+    distinct quizzes.
+    """
+    pool = sampler.get_pool(subject.id, level)
+    if not pool:
+        raise QuizBatchError(f'No questions available for {subject.code} - {level} level')
+    quizzes = draw_quizzes(pool, num_questions, count, random.Random(seed))
+    fragments = fragment_map({question_id for ids in quizzes for question_id in ids})
+    return _lines(subject.code, level, quizzes, fragments)
+
+
+def _lines(subject_code, level, quizzes, fragments):
+    for index, ids in enumerate(quizzes):
+        # Questions deleted since the pool was built are left out
+        ids = [question_id for question_id in ids if question_id in fragments]
+        envelope = {
+            'index': index,
+            'subject_code': subject_code,
+            'level': level,
+            'num_questions': len(ids),
+            'token': issue_token(ids, subject_code, level),
+        }
+        yield render_with_questions(envelope, [fragments[question_id] for question_id in ids]) + b'\n'
+
+
+def parse_ndjson(lines):
+    """Yield one parsed value per non-blank line, or the ValueError of an invalid line"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+
+def _prepare(data):
+    """Return {'answers', 'subject_code', 'level'} of one submission, or {'error'/'errors'}"""
+    if isinstance(data, ValueError):
+        return {'error': f'Invalid JSON: {data}'}
+    try:
+        validated = validate_submission(data)
+    except serializers.ValidationError as e:
+        return {'errors': e.detail}
+    answers = [(answer['question_id'], answer['selected_answer']) for answer in validated['answers']]
+    quiz = {}
+    if validated.get('token'):
+        try:
+            quiz = read_token(validated['token'])
+            answers = issued_answers(quiz, answers)
+        except InvalidQuizToken as e:
+            return {'error': str(e)}
+    return {'answers': answers, 'subject_code': quiz.get('subject_code'), 'level': quiz.get('level')}
+
+
+def grade_batch(submissions):
+    """
+    Grade submission dicts (or ValueErrors from parse_ndjson()) and return
+    an iterator of NDJSON result lines (bytes).
+
+    Graded submissions are recorded like single ones (see attempts.py)
+    before this returns, so a client that disconnects while the results
+    stream still has the whole batch recorded.
+    """
+    prepared = [_prepare(data) for data in submissions]
+    keys = answer_keys.lookup_many({
+        question_id for entry in prepared for question_id, _ in entry.get('answers', ())
+    })
+    graded = [_grade(entry, keys) for entry in prepared]
+    for entry in graded:
+        if 'quiz_result' in entry:
+            record_attempt(entry['quiz_result'], entry['subject_code'], entry['level'], source='api')
+    return _results(graded)
+
+
+def _grade(entry, keys):
+    """Return {'quiz_result', 'subject_code', 'level'} of a prepared submission, or its error"""
+    if 'answers' not in entry:
+        return entry
+    try:
+        result = grade_with_keys(entry['answers'], keys)
+    except QuestionNotFound as e:
+        return {'error': str(e)}
+    return {'quiz_result': result, 'subject_code': entry['subject_code'], 'level': entry['level']}
+
+
+def _results(graded):
+    for index, entry in enumerate(graded):
+        if 'quiz_result' in entry:
+            entry = {'quiz_result': entry['quiz_result']}
+        yield renderer.render({'index': index, 'success': 'quiz_result' in entry, **entry}) + b'\n'
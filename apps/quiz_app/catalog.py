@@ -0,0 +1,72 @@
+"""
+Subject Catalog
+===============
+
+Per-subject, per-level question counts for the subject listings, the
+difficulty pickers, the subjects API and the stats API.
+
+All counts are read from the precomputed QuestionStats table (see
+question_stats.py) with a single query, so the number of queries per
+request does not depend on the number of subjects and no request scans
+the Question table.
+"""
+
+from collections import defaultdict
+
+from .models import Question, QuestionStats
+
+LEVELS = [level for level, _ in Question.LEVEL_CHOICES]
+
+
+def _level_counts_query(subject_ids):
+    rows = QuestionStats.objects.filter(question_count__gt=0).order_by()
+    if subject_ids is not None:
+        rows = rows.filter(subject_id__in=subject_ids)
+    return rows.values_list('subject_id', 'level', 'question_count')
+
+
+def _group_counts(rows):
+    counts = defaultdict(dict)
+    for subject_id, level, count in rows:
+        counts[subject_id][level] = count
+    return dict(counts)
+
+
+def get_level_counts(subject_ids=None):
+    """Return {subject_id: {level: count}}, optionally for some subjects only"""
+    return _group_counts(_level_counts_query(subject_ids))
+
+
+async def aget_level_counts(subject_ids=None):
+    """Async get_level_counts()"""
+    return _group_counts([row async for row in _level_counts_query(subject_ids)])
+
+
+def levels_info(counts):
+    """Available levels of one subject, in difficulty order"""
+    return [
+        {
+            'level': level,
+            'display': level.title(),
+            'count': counts[level]
+        }
+        for level in LEVELS
+        if counts.get(level)
+    ]
+
+
+def build_catalog(subjects, level_counts=None):
+    """List of {'subject', 'levels', 'total_questions'} for the given subjects"""
+    subjects = list(subjects)
+    if level_counts is None:
+        level_counts = get_level_counts([subject.id for subject in subjects])
+
+    catalog = []
+    for subject in subjects:
+        counts = level_counts.get(subject.id, {})
+        catalog.append({
+            'subject': subject,
+            'levels': levels_info(counts),
+            'total_questions': sum(counts.values())
+        })
+    return catalog
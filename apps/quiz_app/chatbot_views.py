@@ -9,6 +9,8 @@ Simplified chatbot for subject and difficulty selection.
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from .models import Subject, Question, get_random_questions, get_all_subjects
+from .adaptive import AdaptiveQuiz, AdaptiveQuizError, start_quiz
+from .catalog import get_level_counts, levels_info
 
 
 def chatbot_home(request):
@@ -16,6 +18,7 @@ def chatbot_home(request):
     # Clear any existing session data
     request.session.pop('selected_subject', None)
     request.session.pop('selected_level', None)
+    request.session.pop('adaptive_quiz', None)
     
     context = {
         'title': 'Quiz Chatbot'
@@ -52,15 +55,7 @@ def chatbot_select_difficulty(request):
     request.session['selected_subject'] = subject_code
     
     # Count questions per level
-    levels_data = []
-    for level in ['easy', 'medium', 'hard']:
-        count = subject.questions_by_level(level).count()
-        if count > 0:
-            levels_data.append({
-                'level': level,
-                'display': level.title(),
-                'count': count
-            })
+    levels_data = levels_info(get_level_counts([subject.id]).get(subject.id, {}))
     
     context = {
         'subject': subject,
@@ -83,3 +78,46 @@ def chatbot_start_quiz(request):
     
     # Redirect to quiz
     return redirect('quiz:take_quiz', subject_code=subject_code, level=level)
+
+
+def chatbot_adaptive_quiz(request):
+    """
+    Adaptive quiz via chatbot, one question per request.
+    GET ?level= starts a quiz for the selected subject, POST answers the
+    current question. The quiz state is a few integers in the session.
+    """
+    subject_code = request.session.get('selected_subject')
+    if not subject_code:
+        return redirect('quiz:chatbot_select_subject')
+    subject = get_object_or_404(Subject, code=subject_code)
+    
+    result = None
+    try:
+        if request.method == 'POST' and 'adaptive_quiz' in request.session:
+            quiz = AdaptiveQuiz.unpack(request.session['adaptive_quiz'])
+            if quiz.subject_id != subject.id:
+                return redirect('quiz:chatbot_select_subject')
+            result = quiz.answer(request.POST.get('answer', ''))
+        else:
+            quiz = start_quiz(subject.id, request.GET.get('level', 'medium'))
+    except AdaptiveQuizError as e:
+        request.session.pop('adaptive_quiz', None)
+        return render(request, 'chatbot/error.html', {'error': str(e)})
+    
+    request.session['adaptive_quiz'] = quiz.pack()
+    
+    question = None
+    if not quiz.finished:
+        question = Question.objects.only(
+            'id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d'
+        ).filter(pk=quiz.question_id).first()
+    
+    context = {
+        'subject': subject,
+        'quiz': quiz,
+        'progress': quiz.progress(),
+        'question': question,
+        'result': result,
+        'title': f'Adaptive Quiz - {subject.name}'
+    }
+    return render(request, 'chatbot/adaptive_quiz.html', context)
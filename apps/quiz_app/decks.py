@@ -0,0 +1,219 @@
+"""
+Quiz Decks
+==========
+
+Pools of pre-shuffled, pre-serialized quiz payloads kept in Django's cache
+framework, so quiz generation at exam start is a cache pop instead of a
+sample + serialize.
+
+Each (subject, level, num_questions) pool is a ring of cache slots with a
+head and a tail counter. Pushing increments the tail and popping
+increments the head; both use the cache's atomic ``incr``. A pop only
+claims a slot when the tail is ahead of the head, and a claimed slot
+whose deck has not been written yet (a push between its ``incr`` and its
+``set``) is a miss: the caller builds a deck, and the late deck is never
+served but expires. Pool keys include the subject version (see
+versioning.py), so decks built from an outdated question bank are never
+served and simply expire.
+
+Pools are filled by the build_quiz_decks management command and refilled
+in a background thread when a pop leaves them below half full. Any cache
+backend works (locmem, file, database, memcached/redis); use a shared one
+so all worker processes draw from the same pools.
+
+Seeded quizzes (build_seeded_deck()) bypass the pools: the seed alone
+decides their questions.
+"""
+
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .fragments import question_fragments
+from .sampling import asample_questions, sample_questions, seeded_question_ids
+from .serializers import QuestionDeliverySerializer
+from .versioning import get_subject_version
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def pool_size():
+    return getattr(settings, 'QUIZ_DECK_POOL_SIZE', DEFAULT_POOL_SIZE)
+
+
+def deck_timeout():
+    return getattr(settings, 'QUIZ_DECK_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def _pool_key(subject_id, level, num_questions):
+    version = get_subject_version(subject_id)
+    return f'quiz:deck:{subject_id}:{level}:{num_questions}:v{version}'
+
+
+def _counter(key):
+    cache.add(key, 0, timeout=deck_timeout())
+    return cache.get(key, 0)
+
+
+def _incr(key):
+    cache.add(key, 0, timeout=deck_timeout())
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Counter expired between add() and incr()
+        cache.set(key, 1, timeout=deck_timeout())
+        return 1
+
+
+def _deck(subject, level, questions):
+    if not questions:
+        return None
+    return {
+        'subject_code': subject.code,
+        'level': level,
+        'num_questions': len(questions),
+        # Plain dicts: serializer data keeps a reference to its serializer
+        'questions': [dict(question) for question in QuestionDeliverySerializer(questions, many=True).data]
+    }
+
+
+def build_deck(subject, level, num_questions):
+    """Sample and serialize one quiz payload, or None if there are no questions"""
+    return _deck(subject, level, sample_questions(subject.id, level, num_questions))
+
+
+async def abuild_deck(subject, level, num_questions):
+    """Async build_deck()"""
+    return _deck(subject, level, await asample_questions(subject.id, level, num_questions))
+
+
+def available(subject, level, num_questions):
+    """Number of decks waiting in a pool"""
+    key = _pool_key(subject.id, level, num_questions)
+    return max(0, _counter(f'{key}:tail') - _counter(f'{key}:head'))
+
+
+def fill_pool(subject, level, num_questions, size=None):
+    """Top a pool up to ``size`` decks; returns the number of decks added"""
+    size = pool_size() if size is None else size
+    key = _pool_key(subject.id, level, num_questions)
+    added = 0
+    while available(subject, level, num_questions) < size:
+        deck = build_deck(subject, level, num_questions)
+        if deck is None:
+            break
+        slot = _incr(f'{key}:tail')
+        cache.set(f'{key}:{slot}', deck, timeout=deck_timeout())
+        added += 1
+    return added
+
+
+def build_seeded_deck(subject, level, num_questions, seed):
+    """Quiz payload whose questions depend only on the seed and the question pool"""
+    question_ids = seeded_question_ids(subject.id, level, num_questions, seed)
+    questions = [json.loads(fragment) for fragment in question_fragments(question_ids)]
+    if not questions:
+        return None
+    return {
+        'subject_code': subject.code,
+        'level': level,
+        'num_questions': len(questions),
+        'seed': seed,
+        'questions': questions
+    }
+
+
+def _refill_lock(subject, level, num_questions):
+    """Cache key held while a pool is refilled, or None if a refill is running"""
+    # One refill per pool at a time, across every process sharing the cache
+    lock_key = f'{_pool_key(subject.id, level, num_questions)}:refilling'
+    return lock_key if cache.add(lock_key, True, timeout=60) else None
+
+
+def _refill(subject, level, num_questions, lock_key):
+    try:
+        fill_pool(subject, level, num_questions)
+    finally:
+        cache.delete(lock_key)
+
+
+def _refill_thread(subject, level, num_questions, lock_key):
+    try:
+        _refill(subject, level, num_questions, lock_key)
+    finally:
+        connections.close_all()
+
+
+def _needs_refill(subject, level, num_questions):
+    return available(subject, level, num_questions) < pool_size() / 2
+
+
+def _async_refill():
+    return getattr(settings, 'QUIZ_DECK_ASYNC_REFILL', True)
+
+
+def _take(subject, level, num_questions):
+    key = _pool_key(subject.id, level, num_questions)
+    counters = cache.get_many([f'{key}:head', f'{key}:tail'])
+    if counters.get(f'{key}:tail', 0) <= counters.get(f'{key}:head', 0):
+        # Empty pool: claim nothing, so the next pushed deck is reachable
+        return None
+    slot = _incr(f'{key}:head')
+    # None if the deck of a pushed slot is not written yet; the head stays,
+    # as moving it could skip decks pushed since
+    deck = cache.get(f'{key}:{slot}')
+    if deck is not None:
+        cache.delete(f'{key}:{slot}')
+    return deck
+
+
+def _pop(subject, level, num_questions):
+    """Return (deck or None, refill lock key if this caller must refill the pool)"""
+    deck = _take(subject, level, num_questions)
+    lock_key = None
+    if _needs_refill(subject, level, num_questions):
+        lock_key = _refill_lock(subject, level, num_questions)
+    return deck, lock_key
+
+
+def _start_refill(subject, level, num_questions, lock_key):
+    threading.Thread(target=_refill_thread, args=(subject, level, num_questions, lock_key), daemon=True).start()
+
+
+def pop_deck(subject, level, num_questions):
+    """
+    Take one deck from a pool in O(1), or None if the pool is empty.
+
+    Schedules a background refill when the pool drops below half full.
+    """
+    deck, lock_key = _pop(subject, level, num_questions)
+    if lock_key and _async_refill():
+        _start_refill(subject, level, num_questions, lock_key)
+    elif lock_key:
+        _refill(subject, level, num_questions, lock_key)
+    return deck
+
+
+async def apop_deck(subject, level, num_questions):
+    """Async pop_deck(); the cache calls run in a worker thread, off the event loop"""
+    deck, lock_key = await sync_to_async(_pop)(subject, level, num_questions)
+    if lock_key and _async_refill():
+        _start_refill(subject, level, num_questions, lock_key)
+    elif lock_key:
+        await sync_to_async(_refill)(subject, level, num_questions, lock_key)
+    return deck
+
+
+def get_quiz_payload(subject, level, num_questions):
+    """Quiz payload from the deck pool, built on the spot if the pool is empty"""
+    return pop_deck(subject, level, num_questions) or build_deck(subject, level, num_questions)
+
+
+async def aget_quiz_payload(subject, level, num_questions):
+    """Async get_quiz_payload()"""
+    return await apop_deck(subject, level, num_questions) or await abuild_deck(subject, level, num_questions)
@@ -0,0 +1,262 @@
+"""
+Near-Duplicate Questions
+========================
+
+Finds paraphrased duplicates (e.g. the same question imported from two
+instructors' banks) without comparing every pair of questions.
+
+Each question is reduced to the word bigrams of its text and options
+(in any order), and to a MinHash signature of ``num_perm`` 32-bit values:
+the share of equal values in two signatures estimates the Jaccard
+similarity of their bigram sets. Signatures are cut into ``bands`` bands
+and questions that agree on a whole band land in the same bucket
+(locality-sensitive hashing). Only questions sharing a bucket are
+compared, against the first question of the bucket, and those at or
+above the threshold are joined into clusters with union-find, so a
+cluster may chain questions that are each similar to a neighbour but not
+to its first question. Merging (see plan_merges()) is therefore stricter
+than reporting: only members similar enough to the kept question, with
+the same subject, level and correct answer, are merged. Time and memory
+grow linearly with the number of questions: signatures live in one flat
+``array`` and each band is one pass over it.
+
+Signatures are computed in worker processes for large banks. By default
+only questions of the same subject are compared.
+"""
+
+import random
+import zlib
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.db import transaction
+from django.db.models import Sum
+
+from .analytics import COUNT_FIELDS, apply_analytics_deltas
+from .models import AttemptAnswer, Question, QuestionAnalytics
+from .search import tokenize
+
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_THRESHOLD = 0.6
+CHUNK_SIZE = 5000
+MASK = 0xFFFFFFFF
+
+
+def permutations(num_perm, seed=1):
+    """(a, b) pairs of the hash permutations h -> (a * h + b) mod 2**32, a odd"""
+    rng = random.Random(seed)
+    return [(rng.getrandbits(32) | 1, rng.getrandbits(32)) for _ in range(num_perm)]
+
+
+def _bigrams(words):
+    if len(words) < 2:
+        return set(words)
+    return {f'{first} {second}' for first, second in zip(words, words[1:])}
+
+
+def shingle_hashes(question_text, *options):
+    """32-bit hashes of the word bigrams of a question and its options"""
+    shingles = _bigrams(tokenize(question_text))
+    for option in options:
+        shingles |= _bigrams(tokenize(option))
+    return [zlib.crc32(shingle.encode()) for shingle in shingles]
+
+
+def signature(hashes, perms):
+    """MinHash signature of a set of shingle hashes"""
+    if not hashes:
+        return [MASK] * len(perms)
+    return [min([(a * h + b) & MASK for h in hashes]) for a, b in perms]
+
+
+def sign_rows(rows, num_perm=DEFAULT_NUM_PERM):
+    """
+    Return (ids, subject_ids, signatures) arrays for (id, subject_id,
+    question_text, option_a, ..., option_d) rows.
+
+    Runs in worker processes.
+    """
+    perms = permutations(num_perm)
+    ids, subject_ids, signatures = array('q'), array('q'), array('I')
+    for question_id, subject_id, question_text, *options in rows:
+        ids.append(question_id)
+        subject_ids.append(subject_id)
+        signatures.extend(signature(shingle_hashes(question_text, *options), perms))
+    return ids, subject_ids, signatures
+
+
+def sign_questions(rows, num_perm=DEFAULT_NUM_PERM, workers=1):
+    """Yield sign_rows() results for chunks of rows, in order"""
+    rows = iter(rows)
+    chunks = iter(lambda: list(islice(rows, CHUNK_SIZE)), [])
+    if workers <= 1:
+        for chunk in chunks:
+            yield sign_rows(chunk, num_perm)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending = deque(pool.submit(sign_rows, chunk, num_perm) for chunk in islice(chunks, workers * 2))
+        while pending:
+            result = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(sign_rows, chunk, num_perm))
+            yield result
+
+
+class DuplicateFinder:
+    """MinHash signatures of many questions, clustered with LSH banding"""
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, threshold=DEFAULT_THRESHOLD,
+                 across_subjects=False):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self.across_subjects = across_subjects
+        self.ids = array('q')
+        self.subject_ids = array('q')
+        self.signatures = array('I')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, subject_ids, signatures):
+        self.ids.extend(ids)
+        self.subject_ids.extend(subject_ids)
+        self.signatures.extend(signatures)
+
+    def similarity(self, i, j):
+        """Estimated Jaccard similarity of the i-th and j-th questions"""
+        k = self.num_perm
+        first = self.signatures[i * k:(i + 1) * k]
+        second = self.signatures[j * k:(j + 1) * k]
+        return sum(x == y for x, y in zip(first, second)) / k
+
+    def clusters(self):
+        """
+        Return clusters of near-duplicates as lists of (question_id,
+        similarity to the first question), lowest id first. Members are
+        linked through a chain of similar questions and may be less
+        similar than the threshold to the first one.
+        """
+        parent = list(range(len(self)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        k = self.num_perm
+        rows = k // self.bands
+        view = memoryview(self.signatures).cast('B')
+        width = rows * self.signatures.itemsize
+        for band in range(self.bands):
+            buckets = {}
+            for i in range(len(self)):
+                start = (i * k + band * rows) * self.signatures.itemsize
+                key = view[start:start + width].tobytes()
+                if not self.across_subjects:
+                    key = (self.subject_ids[i], key)
+                first = buckets.setdefault(key, i)
+                if first == i:
+                    continue
+                root, other = find(first), find(i)
+                if root != other and self.similarity(first, i) >= self.threshold:
+                    parent[other] = root
+
+        groups = defaultdict(list)
+        for i in range(len(self)):
+            groups[find(i)].append(i)
+        clusters = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=lambda i: self.ids[i])
+            clusters.append([(self.ids[i], round(self.similarity(members[0], i), 3)) for i in members])
+        clusters.sort(key=lambda cluster: cluster[0][0])
+        return clusters
+
+
+def question_rows(subject_ids=None):
+    questions = Question.objects.order_by()
+    if subject_ids is not None:
+        questions = questions.filter(subject_id__in=subject_ids)
+    return questions.values_list(
+        'id', 'subject_id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def find_duplicates(subject_ids=None, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+                    bands=DEFAULT_BANDS, across_subjects=False, workers=1):
+    """DuplicateFinder.clusters() of the bank, or of some subjects only"""
+    finder = DuplicateFinder(num_perm, bands, threshold, across_subjects)
+    for result in sign_questions(question_rows(subject_ids), num_perm, workers):
+        finder.add(*result)
+    return finder.clusters()
+
+
+def plan_merges(clusters, threshold=DEFAULT_THRESHOLD):
+    """
+    Decide which cluster members can be merged into the first question of
+    their cluster. Returns (merges, skipped): merges lists (keeper,
+    [duplicate ids]); skipped lists (question_id, keeper, reason) for
+    members that are only reported.
+    """
+    fields = {
+        question_id: (subject_id, level, correct_answer) for question_id, subject_id, level, correct_answer in
+        Question.objects.filter(id__in=[question_id for cluster in clusters for question_id, _ in cluster])
+        .order_by().values_list('id', 'subject_id', 'level', 'correct_answer')
+    }
+    merges, skipped = [], []
+    for cluster in clusters:
+        keeper = cluster[0][0]
+        if keeper not in fields:
+            continue
+        subject_id, level, correct_answer = fields[keeper]
+        duplicates = []
+        for question_id, similarity in cluster[1:]:
+            if question_id not in fields:
+                continue
+            if similarity < threshold:
+                skipped.append((question_id, keeper, f'similarity {similarity:.2f} is below {threshold:.2f}'))
+            elif fields[question_id][0] != subject_id:
+                skipped.append((question_id, keeper, 'it belongs to another subject'))
+            elif fields[question_id][1] != level:
+                skipped.append((question_id, keeper, f'level {fields[question_id][1]} differs from {level}'))
+            elif fields[question_id][2] != correct_answer:
+                skipped.append((
+                    question_id, keeper, f'correct answer {fields[question_id][2]} differs from {correct_answer}'
+                ))
+            else:
+                duplicates.append(question_id)
+        if duplicates:
+            merges.append((keeper, duplicates))
+    return merges, skipped
+
+
+def merge_duplicates(merges):
+    """
+    Delete the duplicates of plan_merges() merges, after moving their
+    recorded answers and analytics to their keeper. Returns the number of
+    questions deleted.
+    """
+    deleted = 0
+    with transaction.atomic():
+        for keeper, duplicates in merges:
+            AttemptAnswer.objects.filter(question_id__in=duplicates).update(question_id=keeper)
+            totals = (
+                QuestionAnalytics.objects.filter(question_id__in=duplicates)
+                .aggregate(**{field: Sum(field) for field in COUNT_FIELDS})
+            )
+            if totals['attempt_count']:
+                apply_analytics_deltas({keeper: {field: value or 0 for field, value in totals.items()}})
+            # Signals update QuestionStats, caches and the search index
+            Question.objects.filter(id__in=duplicates).delete()
+            deleted += len(duplicates)
+    return deleted
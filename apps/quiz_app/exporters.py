@@ -0,0 +1,349 @@
+"""
+Question Exporters
+==================
+
+Streaming export of the question bank, the counterpart of importers.py:
+
+    ordered rows (values_list + chunked iterator) -> format writer -> file
+
+Questions are read in (subject, level, id) order, the order of the
+``quiz_question_subj_level_idx`` index, as plain tuples from a chunked
+iterator (a server-side cursor on PostgreSQL), and subject codes come
+from a map loaded once instead of a join or a lazy load per row (a subject
+created during the export is looked up when its first row arrives).
+Memory use does not depend on the size of the bank.
+
+Formats:
+
+* ``csv``: the import CSV header, so files can be imported again with
+  ``import_questions``.
+* ``ndjson``: one JSON object per question, with its id.
+* ``columnar``: a compact binary format (see ColumnarWriter), read back
+  with read_columnar().
+
+Files can be gzip-compressed and split into one file per subject, named
+after the subject code; codes that give the same file name get their
+subject id appended.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from collections import Counter
+
+from .importers import REQUIRED_FIELDS
+from .models import Question, Subject
+
+FIELDS = REQUIRED_FIELDS + ('explanation',)
+TEXT_FIELDS = ('question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'explanation')
+LEVEL_CODES = [level for level, _ in Question.LEVEL_CHOICES]
+
+CHUNK_SIZE = 2000
+# Rows per row group of the columnar format
+ROW_GROUP_SIZE = 10000
+COLUMNAR_MAGIC = b'QBANKCOL2\n'
+# Unsigned array typecodes of integer columns, with their exclusive upper bound
+INT_TYPES = (('B', 1 << 8), ('H', 1 << 16), ('I', 1 << 32), ('Q', 1 << 64))
+
+
+class CSVWriter:
+    """Rows in the import CSV layout"""
+    extension = 'csv'
+
+    def __init__(self, f):
+        self.text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(FIELDS)
+
+    def write(self, question_id, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()
+
+
+class NDJSONWriter:
+    """One JSON object per line"""
+    extension = 'ndjson'
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, question_id, row):
+        data = dict(zip(FIELDS, row), id=question_id)
+        self.f.write(json.dumps(data, ensure_ascii=False).encode() + b'\n')
+
+    def close(self):
+        pass
+
+
+def _pack_ints(values):
+    """Typecode + little-endian bytes of integers, in the smallest array type that fits"""
+    largest = max(values, default=0)
+    typecode = next(code for code, limit in INT_TYPES if largest < limit)
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return typecode.encode() + packed.tobytes()
+
+
+def _unpack_ints(data):
+    values = array(chr(data[0]))
+    values.frombytes(data[1:])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class ColumnarWriter:
+    """
+    Compact binary column store.
+
+    After COLUMNAR_MAGIC comes a header (uint32 length + JSON with the
+    field names and the level dictionary), then row groups of up to
+    ROW_GROUP_SIZE rows: a uint32 row count followed by blocks, each a
+    uint32 byte length and its data. The first block is a JSON list of
+    the subject codes of the group, the dictionary of its subject column,
+    so subjects need not be known when the header is written; the others
+    are columns. Integer columns (ids, subject indexes, text lengths)
+    start with the typecode of the smallest unsigned array type holding
+    them; levels are one byte codes and answers one ASCII byte per row;
+    each text column is a column of UTF-8 byte lengths and one of the
+    concatenated text. Integers are little-endian.
+    """
+    extension = 'qcol'
+
+    def __init__(self, f):
+        self.f = f
+        self.levels = {level: index for index, level in enumerate(LEVEL_CODES)}
+        header = json.dumps({'fields': ['id', *FIELDS], 'levels': LEVEL_CODES}).encode()
+        f.write(COLUMNAR_MAGIC + struct.pack('<I', len(header)) + header)
+        self._reset()
+
+    def _reset(self):
+        self.ids = []
+        self.subjects = {}
+        self.subject_column = []
+        self.level_column = bytearray()
+        self.answers = bytearray()
+        self.texts = {field: [] for field in TEXT_FIELDS}
+
+    def write(self, question_id, row):
+        values = dict(zip(FIELDS, row))
+        self.ids.append(question_id)
+        self.subject_column.append(self.subjects.setdefault(values['subject_code'], len(self.subjects)))
+        self.level_column.append(self.levels[values['level']])
+        self.answers += values['correct_answer'].encode()
+        for field in TEXT_FIELDS:
+            self.texts[field].append(values[field].encode())
+        if len(self.ids) >= ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self.ids:
+            return
+        columns = [
+            json.dumps(list(self.subjects)).encode(),
+            _pack_ints(self.ids), _pack_ints(self.subject_column), self.level_column, self.answers,
+        ]
+        for field in TEXT_FIELDS:
+            columns.append(_pack_ints([len(text) for text in self.texts[field]]))
+            columns.append(b''.join(self.texts[field]))
+        self.f.write(struct.pack('<I', len(self.ids)))
+        for column in columns:
+            self.f.write(struct.pack('<I', len(column)))
+            self.f.write(column)
+        self._reset()
+
+    def close(self):
+        self._flush()
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError('Truncated columnar file')
+    return data
+
+
+def _read_block(f):
+    return _read_exactly(f, struct.unpack('<I', _read_exactly(f, 4))[0])
+
+
+def read_columnar(f):
+    """Yield {'id', *FIELDS} dicts from a columnar file object"""
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError('Not a columnar question file')
+    header = json.loads(_read_block(f))
+    while True:
+        count = f.read(4)
+        if not count:
+            return
+        count = struct.unpack('<I', count)[0]
+        subject_codes = json.loads(_read_block(f))
+        ids = _unpack_ints(_read_block(f))
+        subjects = _unpack_ints(_read_block(f))
+        levels = _read_block(f)
+        answers = _read_block(f).decode()
+        texts = {}
+        for field in TEXT_FIELDS:
+            lengths, data = _unpack_ints(_read_block(f)), _read_block(f)
+            values, offset = [], 0
+            for length in lengths:
+                values.append(data[offset:offset + length].decode())
+                offset += length
+            texts[field] = values
+        if not len(ids) == len(subjects) == len(levels) == len(answers) == count:
+            raise ValueError('Corrupt columnar file')
+        for i in range(count):
+            yield {
+                'id': ids[i],
+                'subject_code': subject_codes[subjects[i]],
+                'level': header['levels'][levels[i]],
+                'correct_answer': answers[i],
+                **{field: texts[field][i] for field in TEXT_FIELDS},
+            }
+
+
+WRITERS = {
+    'csv': CSVWriter,
+    'ndjson': NDJSONWriter,
+    'columnar': ColumnarWriter,
+}
+
+
+def export_rows(subject_ids=None, subject_codes=None):
+    """
+    Yield (id, FIELDS values) of questions in (subject, level, id) order.
+
+    subject_codes maps subject ids to codes (loaded if not given);
+    subjects missing from it are looked up and added as their rows arrive.
+    """
+    if subject_codes is None:
+        subject_codes = dict(Subject.objects.values_list('id', 'code'))
+    questions = Question.objects.order_by('subject_id', 'level', 'id')
+    if subject_ids is not None:
+        questions = questions.filter(subject_id__in=subject_ids)
+    rows = questions.values_list('id', 'subject_id', *FIELDS[1:]).iterator(chunk_size=CHUNK_SIZE)
+    for question_id, subject_id, *values in rows:
+        if subject_id not in subject_codes:
+            # Created since the map was loaded
+            subject_codes[subject_id] = Subject.objects.values_list('code', flat=True).get(id=subject_id)
+        yield question_id, (subject_codes[subject_id], *values)
+
+
+def open_output(path, compress_level=0):
+    """Binary file object for path, gzip-compressed if compress_level is 1-9"""
+    if compress_level:
+        return gzip.open(path, 'wb', compresslevel=compress_level)
+    return open(path, 'wb')
+
+
+def output_name(name, fmt, compress_level=0):
+    """File name for an export in fmt, e.g. questions.csv.gz"""
+    name = f'{name}.{WRITERS[fmt].extension}'
+    return name + '.gz' if compress_level else name
+
+
+def shard_name(subject_code):
+    """File-system safe name of a subject's shard"""
+    return re.sub(r'[^\w.-]', '_', subject_code)
+
+
+def shard_names(subject_codes):
+    """
+    {subject code: shard name} of subject_codes ({id: code}). Names that
+    several codes share, ignoring case, get the subject id appended.
+    """
+    names = {subject_id: shard_name(code) for subject_id, code in subject_codes.items()}
+    counts = Counter(name.casefold() for name in names.values())
+    return {
+        subject_codes[subject_id]: name if counts[name.casefold()] == 1 else f'{name}-{subject_id}'
+        for subject_id, name in names.items()
+    }
+
+
+class Export:
+    """Rows written to one file"""
+
+    def __init__(self, path, fmt, compress_level):
+        self.path = path
+        self.f = open_output(path, compress_level)
+        self.writer = WRITERS[fmt](self.f)
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.seconds = 0
+
+    def write(self, question_id, row):
+        self.writer.write(question_id, row)
+        self.rows += 1
+
+    def close(self):
+        self.writer.close()
+        self.f.close()
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0
+
+
+def export_questions(output, fmt='csv', subject_ids=None, shard=False, compress_level=0, on_close=None):
+    """
+    Export questions to the file ``output``, or with shard=True to one file
+    per subject in the directory ``output``. Returns the Export of every
+    file written; on_close is called with each one as it is finished.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown export format: {fmt}')
+    subject_codes = dict(Subject.objects.values_list('id', 'code'))
+    names = {}
+    if shard:
+        os.makedirs(output, exist_ok=True)
+
+    exports = []
+
+    def finish(export):
+        export.close()
+        if on_close:
+            on_close(export)
+
+    def start(subject_code):
+        path = output
+        if shard:
+            if subject_code not in names:
+                # First shard, or a subject created during the export
+                names.update(shard_names(subject_codes))
+            path = os.path.join(output, output_name(names[subject_code], fmt, compress_level))
+            if any(os.path.normcase(path) == os.path.normcase(export.path) for export in exports):
+                raise ValueError(f'Subject {subject_code} would overwrite {path}')
+        exports.append(Export(path, fmt, compress_level))
+        return exports[-1]
+
+    current = None
+    try:
+        for question_id, row in export_rows(subject_ids, subject_codes):
+            if current is None or (shard and row[0] != current_subject):
+                if current is not None:
+                    finish(current)
+                current_subject = row[0]
+                current = start(current_subject)
+            current.write(question_id, row)
+        if current is None and not shard:
+            # An empty export still gets a valid file
+            current = start(None)
+    except BaseException:
+        if current is not None:
+            current.close()
+        raise
+    if current is not None:
+        finish(current)
+    return exports
@@ -0,0 +1,111 @@
+"""
+Question Fragments
+==================
+
+Cache of each question's delivery serialization (QuestionDeliverySerializer:
+id, text and options), pre-rendered to JSON bytes. API responses are
+assembled by joining cached fragments instead of running the serializer
+for every question on every request.
+
+Fragments live in the default cache under the question id and are only
+used while the stored ``updated_at`` stamp matches the question's current
+one; signals also drop them when a question is saved or deleted.
+Reading fragments for a list of ids costs one query for the stamps, plus
+one query to render the misses, or none with a question bank snapshot
+(see snapshot.py), which holds the fragments of every question.
+
+The same stamps give HTTP validators: questions_etag() changes whenever
+one of a response's questions is edited or deleted.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from .models import Question
+from .serializers import QuestionDeliverySerializer
+from .snapshot import snapshots
+
+FRAGMENT_KEY = 'quiz:fragment:{}'
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+renderer = JSONRenderer()
+
+
+def fragment_key(question_id):
+    return FRAGMENT_KEY.format(question_id)
+
+
+def render_question(question):
+    """Serialized JSON bytes of one question"""
+    return renderer.render(QuestionDeliverySerializer(question).data)
+
+
+def question_fragments(question_ids):
+    """
+    Return JSON fragments for question_ids, in order.
+
+    Unknown ids are left out. Missing or outdated fragments are rendered
+    and stored.
+    """
+    question_ids = list(question_ids)
+    fragments = fragment_map(question_ids)
+    return [fragments[question_id] for question_id in question_ids if question_id in fragments]
+
+
+def fragment_map(question_ids):
+    """Return {question_id: JSON fragment} for the known question_ids"""
+    snapshot = snapshots.get()
+    if snapshot is not None:
+        return snapshot.fragments(question_ids)
+    stamps = dict(
+        Question.objects.filter(id__in=question_ids)
+        .order_by()
+        .values_list('id', 'updated_at')
+    )
+    cached = cache.get_many([fragment_key(question_id) for question_id in stamps])
+
+    fragments = {}
+    for question_id, updated_at in stamps.items():
+        entry = cached.get(fragment_key(question_id))
+        if entry and entry[0] == updated_at:
+            fragments[question_id] = entry[1]
+
+    misses = [question_id for question_id in stamps if question_id not in fragments]
+    if misses:
+        rendered = {}
+        for question in Question.objects.filter(id__in=misses).order_by():
+            fragments[question.id] = render_question(question)
+            rendered[fragment_key(question.id)] = (question.updated_at, fragments[question.id])
+        cache.set_many(rendered, timeout=FRAGMENT_TIMEOUT)
+
+    return fragments
+
+
+def render_with_questions(envelope, fragments):
+    """JSON bytes of the ``envelope`` dict plus a 'questions' list made of fragments"""
+    head = renderer.render(envelope)[:-1]
+    separator = b',' if envelope else b''
+    return head + separator + b'"questions":[' + b','.join(fragments) + b']}'
+
+
+def questions_etag(question_ids, *key):
+    """
+    Weak ETag of a response showing question_ids, built from key values.
+
+    Weak because quiz tokens in otherwise identical bodies differ.
+    """
+    question_ids = list(question_ids)
+    stamp = (
+        Question.objects.filter(id__in=question_ids)
+        .order_by()
+        .aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    )
+    state = repr((key, question_ids, stamp['count'], stamp['updated_at']))
+    return f'W/"{hashlib.sha1(state.encode()).hexdigest()}"'
+
+
+def invalidate(*question_ids):
+    cache.delete_many([fragment_key(question_id) for question_id in question_ids])
@@ -0,0 +1,73 @@
+"""
+Quiz Grading
+============
+
+Grades submitted answers in memory against the answer key cache (see
+answer_keys.py). A cold cache costs one lookup query plus one query per
+subject loaded; a warm cache costs none, so the number of queries per
+submission never grows with the number of answers.
+"""
+
+from .answer_keys import answer_keys
+from .models import Question
+
+
+class QuestionNotFound(Question.DoesNotExist):
+    """A submitted answer references a question that does not exist"""
+
+    def __init__(self, question_id):
+        super().__init__(f'Question with ID {question_id} not found')
+        self.question_id = question_id
+
+
+def grade_answers(answers):
+    """
+    Grade a list of (question_id, selected_answer) pairs.
+
+    Returns a dict with total_questions, correct_count, incorrect_count,
+    percentage and per-answer results. Raises QuestionNotFound for the
+    first unknown question id.
+    """
+    answers = list(answers)
+    return grade_with_keys(answers, answer_keys.lookup_many(question_id for question_id, _ in answers))
+
+
+async def agrade_answers(answers):
+    """Async grade_answers()"""
+    answers = list(answers)
+    return grade_with_keys(answers, await answer_keys.alookup_many(question_id for question_id, _ in answers))
+
+
+def grade_with_keys(answers, keys):
+    """Grade (question_id, selected_answer) pairs against answer_keys.lookup_many() output"""
+    results = []
+    correct_count = 0
+    for question_id, selected_answer in answers:
+        key = keys.get(question_id)
+        if key is None:
+            raise QuestionNotFound(question_id)
+        correct_answer, explanation, question_text = key
+
+        is_correct = selected_answer == correct_answer
+        if is_correct:
+            correct_count += 1
+
+        results.append({
+            'question_id': question_id,
+            'question_text': question_text,
+            'selected_answer': selected_answer,
+            'correct_answer': correct_answer,
+            'is_correct': is_correct,
+            'explanation': explanation if explanation else None
+        })
+
+    total_questions = len(results)
+    percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
+
+    return {
+        'total_questions': total_questions,
+        'correct_count': correct_count,
+        'incorrect_count': total_questions - correct_count,
+        'percentage': round(percentage, 2),
+        'results': results
+    }
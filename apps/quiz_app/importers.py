@@ -0,0 +1,422 @@
+"""
+Question Importers
+==================
+
+Streaming import pipeline for question banks:
+
+    parse rows (CSV or text format) -> validate -> BulkQuestionWriter
+
+Rows are read lazily, so memory use does not depend on the file size.
+Subjects are resolved from a map loaded once, and questions are written
+with ``bulk_create`` in batches, one transaction per batch. Rows are
+matched against the bank by content hash, so re-running an import only
+writes new or changed questions. Since bulk writes skip model signals,
+the writer updates QuestionStats and bumps the subject versions itself.
+"""
+
+import csv
+import os
+import re
+import time
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Question, Subject
+from .question_stats import apply_deltas
+from .search import index_questions
+from .versioning import bump_subject_version
+
+REQUIRED_FIELDS = (
+    'subject_code', 'level', 'question_text',
+    'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer',
+)
+OPTION_FIELDS = ('option_a', 'option_b', 'option_c', 'option_d')
+LEVELS = {level for level, _ in Question.LEVEL_CHOICES}
+ANSWERS = {'A', 'B', 'C', 'D'}
+OPTION_MAX_LENGTH = Question._meta.get_field('option_a').max_length
+
+# Keys of the text format and the fields they fill
+TEXT_KEYS = {
+    'SUBJECT': 'subject_code',
+    'LEVEL': 'level',
+    'QUESTION': 'question_text',
+    'A': 'option_a',
+    'B': 'option_b',
+    'C': 'option_c',
+    'D': 'option_d',
+    'CORRECT': 'correct_answer',
+    'EXPLANATION': 'explanation',
+}
+TEXT_SEPARATOR = '---'
+# A value line of backslashes followed by TEXT_SEPARATOR loses one backslash
+ESCAPED_SEPARATOR = re.compile(r'\\+---')
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_PROGRESS_EVERY = 10000
+
+
+class ImportRowError(ValueError):
+    """A row of an import file is invalid"""
+
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.line = line
+
+    def __str__(self):
+        message = super().__str__()
+        return f'Line {self.line}: {message}' if self.line else message
+
+
+def load_subject_map():
+    """Map of subject code -> subject id"""
+    return dict(Subject.objects.values_list('code', 'id'))
+
+
+def validate_row(data, subject_map, line=None):
+    """Return the Question field values for a parsed row or raise ImportRowError"""
+    data = {key: (value or '').strip() for key, value in data.items() if key}
+
+    missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+    if missing:
+        raise ImportRowError(f"Missing {', '.join(missing)}", line)
+
+    subject_id = subject_map.get(data['subject_code'])
+    if subject_id is None:
+        raise ImportRowError(f"Unknown subject: {data['subject_code']}", line)
+
+    level = data['level'].lower()
+    if level not in LEVELS:
+        raise ImportRowError(f"Invalid level: {data['level']}", line)
+
+    correct_answer = data['correct_answer'].upper()
+    if correct_answer not in ANSWERS:
+        raise ImportRowError(f"Invalid correct answer: {data['correct_answer']}", line)
+
+    for field in OPTION_FIELDS:
+        if len(data[field]) > OPTION_MAX_LENGTH:
+            raise ImportRowError(f'{field} is longer than {OPTION_MAX_LENGTH} characters', line)
+
+    return {
+        'subject_id': subject_id,
+        'level': level,
+        'question_text': data['question_text'],
+        'option_a': data['option_a'],
+        'option_b': data['option_b'],
+        'option_c': data['option_c'],
+        'option_d': data['option_d'],
+        'correct_answer': correct_answer,
+        'explanation': data.get('explanation', ''),
+    }
+
+
+def iter_csv_rows(f):
+    """Yield (line_number, row) pairs from a CSV file object"""
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_text_rows(f):
+    """
+    Yield (line_number, row) pairs from a text format file object.
+
+    Records are separated by lines containing only ``---`` and start at the
+    line number reported with them. A line that does not start with a known
+    ``KEY:`` continues the previous field, so values may span several lines
+    and contain colons or ``---`` within a line. A value line that is
+    exactly ``---`` is written ``\\---`` (and ``\\---`` as ``\\\\---``). A
+    repeated SUBJECT key also starts a new record.
+    """
+    row = {}
+    start = None
+    field = None
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if line == TEXT_SEPARATOR:
+            if row:
+                yield start, row
+            row, start, field = {}, None, None
+            continue
+        if not line:
+            continue
+
+        if ESCAPED_SEPARATOR.fullmatch(line):
+            line = line[1:]
+        key, sep, value = line.partition(':')
+        name = TEXT_KEYS.get(key.strip().upper()) if sep else None
+        if name:
+            if name == 'subject_code' and name in row:
+                yield start, row
+                row, start = {}, None
+            row[name] = value.strip()
+            field = name
+            if start is None:
+                start = line_number
+        elif field:
+            row[field] += '\n' + line
+    if row:
+        yield start, row
+
+
+def iter_file_rows(path, subject_map, errors):
+    """
+    Yield the valid Question field values of a .csv or .txt file, lazily.
+
+    Invalid rows and unreadable files are reported by appending messages
+    to ``errors``.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        open_kwargs, parser = {'newline': ''}, iter_csv_rows
+    elif extension == '.txt':
+        open_kwargs, parser = {}, iter_text_rows
+    else:
+        errors.append('Unsupported file format, use .csv or .txt')
+        return
+
+    try:
+        with open(path, 'r', encoding='utf-8', **open_kwargs) as f:
+            for line, row in parser(f):
+                try:
+                    yield validate_row(row, subject_map, line)
+                except ImportRowError as e:
+                    errors.append(str(e))
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        errors.append(str(e))
+
+
+def parse_file(path, subject_map):
+    """
+    Parse and validate a whole .csv or .txt file without touching the database.
+
+    Runs in import worker processes. Returns a dict with path, rows (valid
+    Question field values), errors (messages) and seconds.
+    """
+    started = time.perf_counter()
+    errors = []
+    rows = list(iter_file_rows(path, subject_map, errors))
+    return {
+        'path': path,
+        'rows': rows,
+        'errors': errors,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def stream_file(path, subject_map):
+    """
+    parse_file() without holding the file in memory, for the importing
+    process itself: rows is an iterator, and errors and seconds are only
+    complete once it is exhausted.
+    """
+    result = {'path': path, 'errors': [], 'seconds': 0}
+
+    def rows():
+        started = time.perf_counter()
+        yield from iter_file_rows(path, subject_map, result['errors'])
+        result['seconds'] = time.perf_counter() - started
+
+    result['rows'] = rows()
+    return result
+
+
+def parse_files(paths, subject_map, workers=1):
+    """
+    Yield parse_file() results in the order of ``paths``.
+
+    With one worker, files are streamed in this process (see
+    stream_file()), so importing a single large file uses constant memory.
+    With more, files are parsed in a process pool with at most two files
+    per worker in flight, so memory stays bounded while results are still
+    consumed in a deterministic order.
+    """
+    if workers <= 1:
+        for path in paths:
+            yield stream_file(path, subject_map)
+        return
+
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending = deque(pool.submit(parse_file, path, subject_map) for path in islice(paths, workers * 2))
+        while pending:
+            result = pending.popleft().result()
+            for path in islice(paths, 1):
+                pending.append(pool.submit(parse_file, path, subject_map))
+            yield result
+
+
+class BulkQuestionWriter:
+    """
+    Buffers validated questions and writes them in batches.
+
+    In ``upsert`` mode (the default) each batch is matched against existing
+    questions by content hash with one query: new questions are inserted
+    with bulk_create, questions whose answer or explanation changed are
+    updated with bulk_update and unchanged ones are not written at all, so
+    re-importing a bank only writes the delta. ``insert`` mode skips the
+    lookup and inserts every row; it is meant for loading an empty bank and
+    fails on duplicates.
+
+    Each batch is written in its own transaction together with its
+    QuestionStats deltas. Progress is logged every ``progress_every`` rows.
+    """
+
+    UPSERT = 'upsert'
+    INSERT = 'insert'
+    MODES = (UPSERT, INSERT)
+    UPDATE_FIELDS = ('correct_answer', 'explanation', 'updated_at')
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY, log=print, mode=UPSERT):
+        if mode not in self.MODES:
+            raise ValueError(f'Unknown import mode: {mode}')
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+        self.log = log
+        self.mode = mode
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        # Ids of the questions inserted, e.g. to look for near-duplicates
+        self.created_ids = array('q')
+        self.created_subject_ids = set()
+        self.started = time.perf_counter()
+        self._batch = []
+        self._next_progress = progress_every
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    @property
+    def imported(self):
+        """Rows written (created or updated)"""
+        return self.created + self.updated
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed > 0 else 0
+
+    def add(self, fields):
+        question = Question(**fields)
+        question.content_hash = question.compute_content_hash()
+        self._batch.append(question)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _split_batch(self, batch):
+        """Return (to_create, to_update, unchanged_count) for an upsert batch"""
+        # Later rows win over earlier duplicates within the batch
+        by_hash = {question.content_hash: question for question in batch}
+        now = timezone.now()
+        existing = {
+            content_hash: (pk, correct_answer, explanation)
+            for content_hash, pk, correct_answer, explanation in
+            Question.objects.filter(content_hash__in=list(by_hash)).order_by()
+            .values_list('content_hash', 'id', 'correct_answer', 'explanation')
+        }
+
+        to_create, to_update = [], []
+        for content_hash, question in by_hash.items():
+            if content_hash not in existing:
+                to_create.append(question)
+                continue
+            pk, correct_answer, explanation = existing[content_hash]
+            if (question.correct_answer, question.explanation) != (correct_answer, explanation):
+                question.pk = pk
+                # bulk_update() does not apply auto_now
+                question.updated_at = now
+                to_update.append(question)
+        return to_create, to_update, len(batch) - len(to_create) - len(to_update)
+
+    def flush(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+
+        with transaction.atomic():
+            if self.mode == self.UPSERT:
+                to_create, to_update, unchanged = self._split_batch(batch)
+            else:
+                to_create, to_update, unchanged = batch, [], 0
+            Question.objects.bulk_create(to_create)
+            if to_update:
+                Question.objects.bulk_update(to_update, self.UPDATE_FIELDS)
+            apply_deltas(Counter((question.subject_id, question.level) for question in to_create))
+            # Updates keep the same text and options (same content hash)
+            index_questions(to_create)
+
+        changed_subjects = {question.subject_id for question in to_create + to_update}
+        if changed_subjects:
+            bump_subject_version(*changed_subjects)
+
+        self.created_ids.extend(question.pk for question in to_create)
+        self.created_subject_ids.update(question.subject_id for question in to_create)
+        self.processed += len(batch)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        self.unchanged += unchanged
+        if self.progress_every and self.processed >= self._next_progress:
+            self.log(
+                f"  ... {self.processed} rows processed, {self.created} created, "
+                f"{self.updated} updated ({self.rows_per_second:.0f} rows/sec)"
+            )
+            while self._next_progress <= self.processed:
+                self._next_progress += self.progress_every
+
+
+def import_rows(rows, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY, log=print,
+                mode=BulkQuestionWriter.UPSERT):
+    """
+    Validate (line_number, row) pairs and write them in batches.
+
+    Returns a summary dict with imported (created + updated), created,
+    updated, unchanged, errors, seconds and rows_per_sec.
+    """
+    subject_map = load_subject_map()
+    errors = 0
+
+    with BulkQuestionWriter(batch_size, progress_every, log, mode) as writer:
+        for line, row in rows:
+            try:
+                writer.add(validate_row(row, subject_map, line))
+            except ImportRowError as e:
+                errors += 1
+                log(f"✗ {e}")
+
+    return {
+        'imported': writer.imported,
+        'created': writer.created,
+        'updated': writer.updated,
+        'unchanged': writer.unchanged,
+        'errors': errors,
+        'seconds': round(writer.elapsed, 3),
+        'rows_per_sec': round(writer.rows_per_second, 1),
+    }
+
+
+def import_csv(filepath, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY, log=print,
+               mode=BulkQuestionWriter.UPSERT):
+    """Stream a CSV file into the question bank"""
+    with open(filepath, 'r', encoding='utf-8', newline='') as f:
+        return import_rows(iter_csv_rows(f), batch_size, progress_every, log, mode)
+
+
+def import_text(filepath, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY, log=print,
+                mode=BulkQuestionWriter.UPSERT):
+    """Stream a text format file into the question bank"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return import_rows(iter_text_rows(f), batch_size, progress_every, log, mode)
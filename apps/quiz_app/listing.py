@@ -0,0 +1,122 @@
+"""
+Question Listing
+================
+
+Ordered listing of the question bank for ``/api/questions/``, for
+clients that page through or export a subject rather than draw a random
+sample.
+
+Questions are listed in (subject, level, id) order, the order of the
+``quiz_question_subj_level_idx`` index. Pages use keyset pagination: the
+opaque cursor returned with a page encodes the position of its last
+question, and the next page is read with ``WHERE (subject_id, level, id)
+> (...)`` straight from the index. Unlike OFFSET, this costs the same for
+the last page as for the first, and questions added or deleted between
+requests never shift pages.
+
+``stream_questions()`` returns every matching question as NDJSON lines,
+reading ids with a chunked iterator and rendering them from the fragment
+cache (see fragments.py) one chunk at a time, so exporting a whole bank
+uses constant memory.
+"""
+
+import base64
+import json
+from itertools import islice
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from rest_framework.renderers import JSONRenderer
+
+from .fragments import fragment_map
+from .models import Question
+
+# Ids read per query by the NDJSON stream
+CHUNK_SIZE = 500
+ORDERING = ('subject_id', 'level', 'id')
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor could not be decoded"""
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Lets DRF accept ``?format=ndjson``; streamed responses bypass it, and
+    errors are rendered as a single JSON line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context) + b'\n'
+
+
+def encode_cursor(subject_id, level, question_id):
+    data = json.dumps([subject_id, level, question_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """Return the (subject_id, level, question_id) position encoded in cursor"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        subject_id, level, question_id = json.loads(data)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(subject_id, int) or not isinstance(level, str) or not isinstance(question_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return subject_id, level, question_id
+
+
+def ordered_questions(subject_id=None, level=None, cursor=None):
+    """Questions in (subject, level, id) order, after cursor if given"""
+    questions = Question.objects.order_by(*ORDERING)
+    if subject_id is not None:
+        questions = questions.filter(subject_id=subject_id)
+    if level:
+        questions = questions.filter(level=level)
+    if cursor is None:
+        return questions
+
+    # Columns fixed by the filters are left out of the row comparison
+    position = dict(zip(ORDERING, decode_cursor(cursor)))
+    columns = [
+        column for column in ORDERING
+        if not (column == 'subject_id' and subject_id is not None) and not (column == 'level' and level)
+    ]
+    if columns == ['id']:
+        return questions.filter(id__gt=position['id'])
+    table = connection.ops.quote_name(Question._meta.db_table)
+    names = ', '.join(f'{table}.{connection.ops.quote_name(column)}' for column in columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    return questions.filter(RawSQL(
+        f'({names}) > ({placeholders})', [position[column] for column in columns], output_field=BooleanField()
+    ))
+
+
+def question_page(subject_id=None, level=None, page_size=100, cursor=None):
+    """Return (question ids of one page, cursor of the next page or None)"""
+    rows = list(ordered_questions(subject_id, level, cursor).values_list(*ORDERING)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*rows[-1])
+    return [row[-1] for row in rows], next_cursor
+
+
+def stream_questions(subject_id=None, level=None, cursor=None):
+    """Return an iterator of NDJSON lines (bytes), one question per line"""
+    ids = ordered_questions(subject_id, level, cursor).values_list('id', flat=True)
+    return _lines(ids.iterator(chunk_size=CHUNK_SIZE))
+
+
+def _lines(ids):
+    while True:
+        chunk = list(islice(ids, CHUNK_SIZE))
+        if not chunk:
+            return
+        fragments = fragment_map(chunk)
+        # Questions deleted since their id was read are left out
+        yield b''.join(fragments[question_id] + b'\n' for question_id in chunk if question_id in fragments)
@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz_app.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the question bank to a memory-mapped snapshot file used by all workers '
+        '(see QUIZ_SNAPSHOT_PATH). Rebuild it after changing questions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Snapshot file (default: QUIZ_SNAPSHOT_PATH)')
+
+    def handle(self, *args, **options):
+        path = options['path'] or getattr(settings, 'QUIZ_SNAPSHOT_PATH', None)
+        if not path:
+            raise CommandError('Give a snapshot path or set QUIZ_SNAPSHOT_PATH')
+
+        started = time.perf_counter()
+        try:
+            count = build_snapshot(path)
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} questions ({os.path.getsize(path) / 1024 / 1024:.1f} MB) to {path} '
+            f'in {elapsed:.2f}s ({rate:.0f} questions/sec)'
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz_app import decks
+from apps.quiz_app.catalog import get_level_counts
+from apps.quiz_app.models import Subject
+
+
+class Command(BaseCommand):
+    help = 'Fill the quiz deck pools for every subject and level (run before an exam or from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'subject_codes', nargs='*',
+            help='Only build decks for these subjects (default: all subjects)'
+        )
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10],
+            help='Quiz lengths (num_questions) to build decks for (default: 10)'
+        )
+        parser.add_argument(
+            '--pool-size', type=int, default=None,
+            help=f'Decks per pool (default: QUIZ_DECK_POOL_SIZE, {decks.DEFAULT_POOL_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        subjects = Subject.objects.all()
+        codes = options['subject_codes']
+        if codes:
+            subjects = subjects.filter(code__in=codes)
+            unknown = sorted(set(codes) - {subject.code for subject in subjects})
+            if unknown:
+                raise CommandError(f"Unknown subject code(s): {', '.join(unknown)}")
+
+        level_counts = get_level_counts()
+        built = 0
+        for subject in subjects:
+            for level in level_counts.get(subject.id, {}):
+                for size in options['sizes']:
+                    added = decks.fill_pool(subject, level, size, options['pool_size'])
+                    built += added
+                    self.stdout.write(f'  {subject.code} {level} x{size}: {added} deck(s) added')
+
+        self.stdout.write(self.style.SUCCESS(f'Built {built} quiz decks'))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz_app.exporters import WRITERS, export_questions
+from apps.quiz_app.models import Subject
+
+
+class Command(BaseCommand):
+    help = (
+        'Export questions to CSV (importable with import_questions), NDJSON or a compact columnar '
+        'binary format, streamed in (subject, level, id) order.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Output file, or directory with --shard-by-subject')
+        parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+        parser.add_argument('--subjects', nargs='+', metavar='CODE', help='Only these subjects (default: all)')
+        parser.add_argument(
+            '--shard-by-subject', action='store_true',
+            help='Write one file per subject into the output directory'
+        )
+        parser.add_argument(
+            '--gzip', type=int, default=0, choices=range(0, 10), metavar='LEVEL',
+            help='gzip compression level, 1 (fastest) to 9 (smallest); 0 disables (default)'
+        )
+
+    def handle(self, *args, **options):
+        subject_ids = None
+        if options['subjects']:
+            subjects = dict(Subject.objects.filter(code__in=options['subjects']).values_list('code', 'id'))
+            missing = set(options['subjects']) - set(subjects)
+            if missing:
+                raise CommandError(f"Unknown subject(s): {', '.join(sorted(missing))}")
+            subject_ids = list(subjects.values())
+
+        def report(export):
+            self.stdout.write(
+                f'{export.path}: {export.rows} rows in {export.seconds:.2f}s '
+                f'({export.rows_per_second:.0f} rows/sec)'
+            )
+
+        started = time.perf_counter()
+        try:
+            exports = export_questions(
+                options['output'], options['format'], subject_ids, options['shard_by_subject'],
+                options['gzip'], on_close=report
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        rows = sum(export.rows for export in exports)
+        rate = rows / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {rows} questions to {len(exports)} file(s) in {elapsed:.2f}s ({rate:.0f} rows/sec)'
+        ))
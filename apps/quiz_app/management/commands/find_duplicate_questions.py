@@ -0,0 +1,83 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz_app.duplicates import (
+    DEFAULT_BANDS, DEFAULT_NUM_PERM, DEFAULT_THRESHOLD, find_duplicates, merge_duplicates, plan_merges
+)
+from apps.quiz_app.models import Question, Subject
+
+
+class Command(BaseCommand):
+    help = (
+        'Find near-duplicate questions (paraphrases) with MinHash signatures and LSH banding, '
+        'and optionally merge them into the oldest question of each group.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('subject_codes', nargs='*', help='Only these subjects (default: all)')
+        parser.add_argument(
+            '--threshold', type=float, default=DEFAULT_THRESHOLD,
+            help='Minimum estimated Jaccard similarity of word bigrams (default: %(default)s)'
+        )
+        parser.add_argument('--num-perm', type=int, default=DEFAULT_NUM_PERM, help='Signature length')
+        parser.add_argument('--bands', type=int, default=DEFAULT_BANDS, help='LSH bands (must divide --num-perm)')
+        parser.add_argument(
+            '--across-subjects', action='store_true', help='Also compare questions of different subjects'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes computing signatures (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--merge', action='store_true',
+            help='Keep the oldest question of each group, move the recorded answers and analytics '
+                 'of the others to it and delete them. Only questions at least --threshold similar '
+                 'to the kept one, with the same subject, level and correct answer, are merged'
+        )
+
+    def handle(self, *args, **options):
+        subject_ids = None
+        if options['subject_codes']:
+            subjects = dict(Subject.objects.filter(code__in=options['subject_codes']).values_list('code', 'id'))
+            missing = set(options['subject_codes']) - set(subjects)
+            if missing:
+                raise CommandError(f"Unknown subject(s): {', '.join(sorted(missing))}")
+            subject_ids = list(subjects.values())
+        if options['num_perm'] % options['bands']:
+            raise CommandError('--bands must divide --num-perm')
+        if options['merge'] and options['across_subjects']:
+            raise CommandError('--merge cannot be combined with --across-subjects')
+
+        started = time.perf_counter()
+        clusters = find_duplicates(
+            subject_ids, options['threshold'], options['num_perm'], options['bands'],
+            options['across_subjects'], options['workers']
+        )
+        elapsed = time.perf_counter() - started
+        total = Question.objects.filter(subject_id__in=subject_ids).count() if subject_ids else Question.objects.count()
+
+        texts = dict(
+            Question.objects.filter(id__in=[question_id for cluster in clusters for question_id, _ in cluster])
+            .values_list('id', 'question_text')
+        )
+        for cluster in clusters:
+            self.stdout.write('')
+            for position, (question_id, similarity) in enumerate(cluster):
+                label = 'keep' if position == 0 else f'{similarity:.2f}'
+                self.stdout.write(f'  [{label:>4}] #{question_id}: {texts.get(question_id, "")[:70]}')
+
+        duplicates = sum(len(cluster) - 1 for cluster in clusters)
+        rate = total / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{len(clusters)} group(s), {duplicates} near-duplicate(s) among {total} questions '
+            f'in {elapsed:.2f}s ({rate:.0f} questions/sec)'
+        ))
+
+        if options['merge'] and clusters:
+            merges, skipped = plan_merges(clusters, options['threshold'])
+            for question_id, keeper, reason in skipped:
+                self.stdout.write(self.style.WARNING(f'Not merging #{question_id} into #{keeper}: {reason}'))
+            deleted = merge_duplicates(merges)
+            self.stdout.write(self.style.SUCCESS(f'Merged and deleted {deleted} question(s)'))
@@ -0,0 +1,99 @@
+import glob
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz_app.duplicates import find_duplicates
+from apps.quiz_app.importers import (
+    DEFAULT_BATCH_SIZE, DEFAULT_PROGRESS_EVERY, BulkQuestionWriter, load_subject_map, parse_files
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import questions from CSV/TXT files. Files are parsed in parallel worker '
+        'processes and written by a single batched writer, in file order.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Files or glob patterns (e.g. "drops/*.csv")')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Number of parser processes (default: number of CPUs)'
+        )
+        parser.add_argument(
+            '--mode', choices=BulkQuestionWriter.MODES, default=BulkQuestionWriter.UPSERT,
+            help='upsert: match rows by content hash and only write new or changed questions; '
+                 'insert: insert every row (empty banks only, fails on duplicates)'
+        )
+        parser.add_argument(
+            '--find-duplicates', action='store_true',
+            help='After importing, report imported questions that look like near-duplicates '
+                 'of other questions in their subject (see find_duplicate_questions)'
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--progress-every', type=int, default=DEFAULT_PROGRESS_EVERY)
+
+    def expand_paths(self, patterns):
+        paths = []
+        for pattern in patterns:
+            matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            if not matches:
+                raise CommandError(f'No files match {pattern}')
+            paths.extend(path for path in matches if path not in paths)
+        return paths
+
+    def handle(self, *args, **options):
+        paths = self.expand_paths(options['paths'])
+        workers = max(1, min(options['workers'], len(paths)))
+        subject_map = load_subject_map()
+
+        self.stdout.write(f'Importing {len(paths)} file(s) with {workers} worker(s)')
+        errors = 0
+        writer = BulkQuestionWriter(
+            options['batch_size'], options['progress_every'], self.stdout.write, options['mode']
+        )
+        with writer:
+            for result in parse_files(paths, subject_map, workers):
+                rows = 0
+                for fields in result['rows']:
+                    writer.add(fields)
+                    rows += 1
+                # Streamed files report errors once their rows are consumed
+                for error in result['errors']:
+                    self.stderr.write(f"✗ {result['path']}: {error}")
+
+                rate = rows / result['seconds'] if result['seconds'] > 0 else 0
+                self.stdout.write(
+                    f"{result['path']}: {rows} rows, {len(result['errors'])} errors, "
+                    f"read in {result['seconds']:.2f}s ({rate:.0f} rows/sec)"
+                )
+                errors += len(result['errors'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {writer.imported} questions from {len(paths)} file(s), {errors} errors '
+            f'in {writer.elapsed:.2f}s ({writer.rows_per_second:.0f} rows/sec)'
+        ))
+        self.stdout.write(
+            f'  created: {writer.created}, updated: {writer.updated}, unchanged: {writer.unchanged}'
+        )
+        if options['find_duplicates'] and writer.created_ids:
+            self.report_duplicates(writer, workers)
+
+    def report_duplicates(self, writer, workers):
+        created = set(writer.created_ids)
+        clusters = [
+            cluster for cluster in find_duplicates(writer.created_subject_ids, workers=workers)
+            if any(question_id in created for question_id, _ in cluster)
+        ]
+        if not clusters:
+            self.stdout.write('No near-duplicates among the imported questions')
+            return
+        self.stdout.write(self.style.WARNING(
+            f'{len(clusters)} group(s) of near-duplicates include imported questions '
+            f'(review with: python manage.py find_duplicate_questions):'
+        ))
+        for cluster in clusters:
+            self.stdout.write('  ' + ', '.join(
+                f'#{question_id}' + (' (new)' if question_id in created else '') for question_id, _ in cluster
+            ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.quiz_app.analytics import rebuild_question_analytics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the QuestionAnalytics table from recorded attempt answers'
+
+    def handle(self, *args, **options):
+        rows = rebuild_question_analytics()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt analytics of {rows} questions'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz_app.models import Subject
+from apps.quiz_app.question_stats import rebuild_question_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the QuestionStats table from the Question table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'subject_codes', nargs='*',
+            help='Only rebuild these subjects (default: all subjects)'
+        )
+
+    def handle(self, *args, **options):
+        subject_ids = None
+        codes = options['subject_codes']
+        if codes:
+            subjects = dict(Subject.objects.filter(code__in=codes).values_list('code', 'id'))
+            unknown = sorted(set(codes) - set(subjects))
+            if unknown:
+                raise CommandError(f"Unknown subject code(s): {', '.join(unknown)}")
+            subject_ids = list(subjects.values())
+
+        rows = rebuild_question_stats(subject_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} question stats rows'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from apps.quiz_app.search import rebuild_search_index, use_fts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text question search index'
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        backend = 'FTS5' if use_fts() else 'in-memory'
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} questions ({backend} index)'))
@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_question_stats(apps, schema_editor):
+    Question = apps.get_model('quiz_app', 'Question')
+    QuestionStats = apps.get_model('quiz_app', 'QuestionStats')
+    rows = Question.objects.order_by().values_list('subject_id', 'level').annotate(count=Count('id'))
+    QuestionStats.objects.bulk_create([
+        QuestionStats(subject_id=subject_id, level=level, question_count=count)
+        for subject_id, level, count in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')], max_length=10)),
+                ('question_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='quiz_app.subject')),
+            ],
+            options={
+                'ordering': ['subject', 'level'],
+                'constraints': [models.UniqueConstraint(fields=('subject', 'level'), name='unique_question_stats_subject_level')],
+            },
+        ),
+        migrations.RunPython(populate_question_stats, migrations.RunPython.noop),
+    ]
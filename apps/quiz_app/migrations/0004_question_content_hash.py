@@ -0,0 +1,71 @@
+import hashlib
+import sys
+
+from django.db import migrations, models
+
+
+def content_hash(question):
+    # Copy of models.question_content_hash at the time of this migration
+    parts = [str(question.subject_id), question.level] + [
+        ' '.join(value.split()).casefold()
+        for value in (
+            question.question_text, question.option_a, question.option_b,
+            question.option_c, question.option_d,
+        )
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def populate_content_hash(apps, schema_editor):
+    Question = apps.get_model('quiz_app', 'Question')
+    seen = {}
+    duplicates = []
+    batch = []
+    for question in Question.objects.order_by('id').iterator(chunk_size=2000):
+        value = content_hash(question)
+        # Existing duplicates keep a NULL hash so the unique index can be built
+        if value in seen:
+            duplicates.append((question.id, seen[value]))
+            continue
+        seen[value] = question.id
+        question.content_hash = value
+        batch.append(question)
+        if len(batch) >= 2000:
+            Question.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    Question.objects.bulk_update(batch, ['content_hash'])
+    report_duplicates(duplicates)
+
+
+def report_duplicates(duplicates, limit=50):
+    """Print the (id, id of the question it duplicates) pairs left without a hash"""
+    if not duplicates:
+        return
+    pairs = ', '.join(f'#{question_id} (same as #{kept_id})' for question_id, kept_id in duplicates[:limit])
+    if len(duplicates) > limit:
+        pairs += f', and {len(duplicates) - limit} more'
+    sys.stdout.write(
+        f'\n  {len(duplicates)} duplicate question(s) were left with a NULL content_hash: {pairs}. '
+        'Review them with "manage.py find_duplicate_questions" or in the admin.\n'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0003_question_subject_level_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(populate_content_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
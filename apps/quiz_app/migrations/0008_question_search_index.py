@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Kept in sync with search.FTS_TABLE and search.index_questions()
+CREATE_TABLE = """
+    CREATE VIRTUAL TABLE quiz_question_fts USING fts5(
+        question_text, options, subject_id UNINDEXED, level UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+POPULATE = """
+    INSERT INTO quiz_question_fts (rowid, question_text, options, subject_id, level)
+    SELECT id, question_text, option_a || ' ' || option_b || ' ' || option_c || ' ' || option_d, subject_id, level
+    FROM quiz_app_question
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 index on SQLite builds that have it; search.py falls back to Python otherwise"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_TABLE)
+        except OperationalError:
+            return
+        cursor.execute(POPULATE)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS quiz_question_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz_app', '0007_questionanalytics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
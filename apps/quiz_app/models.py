@@ -1,5 +1,17 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
 from django.db import models
-import random
+from django.utils import timezone
+
+
+def question_content_hash(subject_id, level, question_text, option_a, option_b, option_c, option_d):
+    """SHA-256 of a question's normalized content (case and whitespace insensitive)"""
+    parts = [str(subject_id), level] + [
+        ' '.join(value.split()).casefold()
+        for value in (question_text, option_a, option_b, option_c, option_d)
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
 
 
 class Subject(models.Model):
@@ -43,9 +55,18 @@ class Question(models.Model):
     level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='easy')
     explanation = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also set by bulk imports; keys the serialized question cache
+    updated_at = models.DateTimeField(auto_now=True)
+    # Identity of the question content, used to skip duplicates on import
+    content_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
 
     class Meta:
-        ordering = ['subject', 'level', 'id']
+        # Follows the (subject, level, id) index; ordering by 'subject'
+        # would join Subject and sort by its code
+        ordering = ['subject_id', 'level', 'id']
+        indexes = [
+            models.Index(fields=['subject', 'level', 'id'], name='quiz_question_subj_level_idx'),
+        ]
 
     def __str__(self):
         return f"{self.subject.code} [{self.level}] - {self.question_text[:50]}"
@@ -65,19 +86,168 @@ class Question(models.Model):
     
     def check_answer(self, selected_option):
         return selected_option.upper() == self.correct_answer
+    
+    def compute_content_hash(self):
+        return question_content_hash(
+            self.subject_id, self.level, self.question_text,
+            self.option_a, self.option_b, self.option_c, self.option_d
+        )
+    
+    def clean(self):
+        super().clean()
+        if self.subject_id is None:
+            return
+        duplicates = Question.objects.filter(content_hash=self.compute_content_hash()).exclude(pk=self.pk)
+        if duplicates.exists():
+            raise ValidationError('An identical question already exists in this subject and level.')
+    
+    def save(self, *args, **kwargs):
+        self.content_hash = self.compute_content_hash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'content_hash', 'updated_at'}
+        super().save(*args, **kwargs)
+
+
+class QuestionStats(models.Model):
+    """Denormalized question count per subject and level"""
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='question_stats')
+    level = models.CharField(max_length=10, choices=Question.LEVEL_CHOICES)
+    question_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['subject', 'level']
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'level'], name='unique_question_stats_subject_level'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject_id} [{self.level}] - {self.question_count}"
+
+
+class QuizAttempt(models.Model):
+    """A graded quiz submission"""
+    SOURCE_CHOICES = [
+        ('web', 'Web'),
+        ('api', 'API'),
+    ]
+
+    subject = models.ForeignKey(Subject, on_delete=models.SET_NULL, null=True, blank=True, related_name='attempts')
+    level = models.CharField(max_length=10, choices=Question.LEVEL_CHOICES, blank=True)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='api')
+    total_questions = models.PositiveIntegerField()
+    correct_count = models.PositiveIntegerField()
+    percentage = models.FloatField()
+    # Submission time; rows are written later by the attempt writer
+    submitted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-submitted_at']
+
+    def __str__(self):
+        return f"{self.subject_id} [{self.level}] - {self.correct_count}/{self.total_questions}"
+
+
+class AttemptAnswer(models.Model):
+    """One graded answer of a quiz attempt"""
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
+    question = models.ForeignKey(Question, on_delete=models.SET_NULL, null=True, related_name='attempt_answers')
+    # Blank when the question was issued but not answered
+    selected_answer = models.CharField(max_length=1, blank=True)
+    is_correct = models.BooleanField()
+
+    class Meta:
+        ordering = ['attempt', 'id']
+
+    def __str__(self):
+        return f"{self.attempt_id} - {self.question_id}: {self.selected_answer or '-'}"
+
+
+class QuestionAnalytics(models.Model):
+    """Running answer aggregates of one question, updated from recorded attempts"""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='analytics')
+    attempt_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    option_a_count = models.PositiveIntegerField(default=0)
+    option_b_count = models.PositiveIntegerField(default=0)
+    option_c_count = models.PositiveIntegerField(default=0)
+    option_d_count = models.PositiveIntegerField(default=0)
+    unanswered_count = models.PositiveIntegerField(default=0)
+    # Sums of attempt scores (0-1), for the point-biserial discrimination index
+    score_sum = models.FloatField(default=0)
+    score_squares_sum = models.FloatField(default=0)
+    correct_score_sum = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'question analytics'
+
+    def __str__(self):
+        return f"{self.question_id} - {self.correct_count}/{self.attempt_count}"
+
+    @property
+    def p_value(self):
+        """Share of attempts that answered correctly (item difficulty)"""
+        if not self.attempt_count:
+            return None
+        return self.correct_count / self.attempt_count
+
+    @property
+    def discrimination(self):
+        """Point-biserial correlation between answering correctly and the attempt score"""
+        n, n1 = self.attempt_count, self.correct_count
+        if n < 2 or n1 in (0, n):
+            return None
+        mean = self.score_sum / n
+        variance = self.score_squares_sum / n - mean * mean
+        if variance <= 1e-12:
+            return None
+        mean_correct = self.correct_score_sum / n1
+        mean_incorrect = (self.score_sum - self.correct_score_sum) / (n - n1)
+        p = n1 / n
+        return (mean_correct - mean_incorrect) / variance ** 0.5 * (p * (1 - p)) ** 0.5
+
+    def option_counts(self):
+        return {
+            'A': self.option_a_count,
+            'B': self.option_b_count,
+            'C': self.option_c_count,
+            'D': self.option_d_count,
+        }
+
+
+class BankVersion(models.Model):
+    """Durable copy of a question bank version counter (see versioning.py)"""
+    # 'bank' or 'subject:<id>'
+    key = models.CharField(max_length=40, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} - v{self.version}"
+
+
+class AdaptiveStep(models.Model):
+    """Unanswered step of an adaptive quiz API token (see adaptive.py)"""
+    nonce = models.CharField(max_length=32, primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.nonce
 
 
 # Utility functions
-def get_random_questions(subject_code, level='easy', num_questions=10):
+
+def get_random_questions(subject_code, level='easy', num_questions=10, seed=None):
+    import random
+    from .sampling import sample_questions
+
     try:
         subject = Subject.objects.get(code=subject_code)
-        all_questions = list(Question.objects.filter(subject=subject, level=level))
-        if not all_questions:
-            return []
-        random.shuffle(all_questions)
-        return all_questions[:num_questions]
     except Subject.DoesNotExist:
         return []
+    rng = random.Random(seed) if seed is not None else None
+    return sample_questions(subject.id, level, num_questions, rng)
 
 
 def get_all_subjects():
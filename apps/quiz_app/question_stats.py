@@ -0,0 +1,49 @@
+"""
+Question Statistics
+===================
+
+Maintenance of the QuestionStats table: per-(subject, level) question
+counts updated incrementally as questions are created, moved or deleted,
+and rebuilt from scratch on demand.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Question, QuestionStats
+
+
+def apply_deltas(deltas):
+    """Add {(subject_id, level): delta} to the stored question counts"""
+    with transaction.atomic():
+        for (subject_id, level), delta in deltas.items():
+            if not delta:
+                continue
+            bucket = QuestionStats.objects.filter(subject_id=subject_id, level=level)
+            if bucket.update(question_count=F('question_count') + delta):
+                continue
+            # Negative deltas without a row come from subjects being deleted
+            if delta > 0:
+                QuestionStats.objects.bulk_create(
+                    [QuestionStats(subject_id=subject_id, level=level)],
+                    ignore_conflicts=True
+                )
+                bucket.update(question_count=F('question_count') + delta)
+
+
+def rebuild_question_stats(subject_ids=None):
+    """Recompute stored counts from the Question table; returns rows written"""
+    questions = Question.objects.order_by()
+    stats = QuestionStats.objects.all()
+    if subject_ids is not None:
+        questions = questions.filter(subject_id__in=subject_ids)
+        stats = stats.filter(subject_id__in=subject_ids)
+
+    rows = questions.values_list('subject_id', 'level').annotate(count=Count('id'))
+    with transaction.atomic():
+        stats.delete()
+        created = QuestionStats.objects.bulk_create([
+            QuestionStats(subject_id=subject_id, level=level, question_count=count)
+            for subject_id, level, count in rows
+        ])
+    return len(created)
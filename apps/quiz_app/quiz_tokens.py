@@ -0,0 +1,60 @@
+"""
+Quiz Tokens
+===========
+
+Signed, timestamped tokens that record which questions a quiz was issued
+with. They are returned with generated quizzes and sent back on submit,
+so the server can check the submitted question ids without storing quiz
+sessions or querying the database. Tokens are signed with SECRET_KEY and
+expire after ``QUIZ_TOKEN_MAX_AGE`` seconds.
+"""
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'quiz_app.quiz_token'
+DEFAULT_MAX_AGE = 3 * 60 * 60
+
+
+class InvalidQuizToken(ValueError):
+    """A quiz token is malformed, tampered with or expired"""
+
+
+def issue_token(question_ids, subject_code=None, level=None):
+    """Return a token for a quiz made of question_ids"""
+    payload = {'q': list(question_ids)}
+    if subject_code:
+        payload['s'] = subject_code
+    if level:
+        payload['l'] = level
+    return signing.dumps(payload, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """Return {'question_ids', 'subject_code', 'level'} or raise InvalidQuizToken"""
+    max_age = getattr(settings, 'QUIZ_TOKEN_MAX_AGE', DEFAULT_MAX_AGE)
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise InvalidQuizToken('Quiz token has expired')
+    except signing.BadSignature:
+        raise InvalidQuizToken('Invalid quiz token')
+    return {
+        'question_ids': payload['q'],
+        'subject_code': payload.get('s'),
+        'level': payload.get('l'),
+    }
+
+
+def issued_answers(quiz, answers):
+    """
+    Pair every question issued with a quiz (see read_token()) with its
+    answer in (question_id, selected_answer) answers, None if unanswered.
+
+    Raises InvalidQuizToken if answers include questions not issued.
+    """
+    selected = dict(answers)
+    not_issued = sorted(set(selected) - set(quiz['question_ids']))
+    if not_issued:
+        raise InvalidQuizToken(f'Questions not issued with this quiz: {not_issued}')
+    return [(question_id, selected.get(question_id)) for question_id in quiz['question_ids']]
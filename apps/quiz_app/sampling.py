@@ -0,0 +1,179 @@
+"""
+Question Sampling
+=================
+
+Random question selection without scanning the question table.
+
+The sampler keeps a compact index of primary keys (an ``array`` of 64-bit
+ints) per (subject, level) pool, draws ``k`` positions without replacement
+and fetches only those rows with a single ``id__in`` query. Pools are
+rebuilt lazily when the question bank version changes. The ``a``-prefixed
+methods do the same with Django's async ORM, for async views.
+
+Pools are sorted by id, so drawing with a seeded ``random.Random`` picks
+the same questions for the same seed for as long as the pool's questions
+stay the same (see seeded_question_ids()).
+
+With a question bank snapshot (see snapshot.py), (subject, level) pools
+are slices of the snapshot and sampled questions are read from it.
+"""
+
+import random
+import threading
+from array import array
+
+from .models import Question
+from .snapshot import snapshots
+from .versioning import aget_subject_version, get_subject_version
+
+
+class QuestionSampler:
+    """Per-(subject, level) primary key index used to draw random questions"""
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _filters(self, subject_id, level):
+        filters = {}
+        if subject_id is not None:
+            filters['subject_id'] = subject_id
+        if level:
+            filters['level'] = level
+        return filters
+
+    def _ids_query(self, subject_id, level):
+        return (
+            Question.objects.filter(**self._filters(subject_id, level))
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+
+    def _rows_query(self, subject_id, level):
+        return Question.objects.filter(**self._filters(subject_id, level)).select_related('subject').order_by()
+
+    def _load(self, subject_id, level):
+        return array('q', self._ids_query(subject_id, level))
+
+    async def _aload(self, subject_id, level):
+        return array('q', [pk async for pk in self._ids_query(subject_id, level)])
+
+    def _cached_pool(self, subject_id, level):
+        """Return (version, pool or None if missing or stale)"""
+        # Read the version before loading so a concurrent change forces
+        # another rebuild on the next call
+        return self._pool_at(subject_id, level, get_subject_version(subject_id))
+
+    async def _acached_pool(self, subject_id, level):
+        """Async _cached_pool()"""
+        return self._pool_at(subject_id, level, await aget_subject_version(subject_id))
+
+    def _pool_at(self, subject_id, level, version):
+        entry = self._pools.get((subject_id, level or None))
+        if entry is None or entry[0] != version:
+            return version, None
+        return version, entry[1]
+
+    def _store_pool(self, subject_id, level, version, pool):
+        with self._lock:
+            self._pools[(subject_id, level or None)] = (version, pool)
+        return pool
+
+    def _snapshot_pool(self, snapshot, subject_id, level):
+        if snapshot is None or subject_id is None or not level:
+            return None
+        return snapshot.pool(subject_id, level)
+
+    def get_pool(self, subject_id=None, level=None):
+        """Return the sorted id array for a pool, rebuilding it if stale"""
+        pool = self._snapshot_pool(snapshots.get(), subject_id, level)
+        if pool is not None:
+            return pool
+        version, pool = self._cached_pool(subject_id, level)
+        if pool is None:
+            pool = self._store_pool(subject_id, level, version, self._load(subject_id, level))
+        return pool
+
+    async def aget_pool(self, subject_id=None, level=None):
+        """Async get_pool()"""
+        pool = self._snapshot_pool(await snapshots.aget(), subject_id, level)
+        if pool is not None:
+            return pool
+        version, pool = await self._acached_pool(subject_id, level)
+        if pool is None:
+            pool = self._store_pool(subject_id, level, version, await self._aload(subject_id, level))
+        return pool
+
+    def _draw(self, pool, k, rng):
+        k = min(k, len(pool))
+        if k <= 0:
+            return []
+        rng = rng or random
+        return [pool[i] for i in rng.sample(range(len(pool)), k)]
+
+    def sample_ids(self, subject_id=None, level=None, k=10, rng=None):
+        """Draw up to k distinct question ids from a pool in O(k)"""
+        return self._draw(self.get_pool(subject_id, level), k, rng)
+
+    async def asample_ids(self, subject_id=None, level=None, k=10, rng=None):
+        """Async sample_ids()"""
+        return self._draw(await self.aget_pool(subject_id, level), k, rng)
+
+    def sample(self, subject_id=None, level=None, k=10, rng=None):
+        """Draw up to k random Question objects from a pool"""
+        for attempt in range(2):
+            ids = self.sample_ids(subject_id, level, k, rng)
+            if not ids:
+                return []
+            snapshot = snapshots.get()
+            if snapshot is not None:
+                rows = snapshot.in_bulk(ids)
+            else:
+                rows = self._rows_query(subject_id, level).in_bulk(ids)
+            if len(rows) == len(ids) or attempt:
+                break
+            # Some ids were deleted or moved by another process: rebuild
+            self.invalidate(subject_id, level)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    async def asample(self, subject_id=None, level=None, k=10, rng=None):
+        """Async sample()"""
+        for attempt in range(2):
+            ids = await self.asample_ids(subject_id, level, k, rng)
+            if not ids:
+                return []
+            snapshot = await snapshots.aget()
+            if snapshot is not None:
+                rows = snapshot.in_bulk(ids)
+            else:
+                rows = await self._rows_query(subject_id, level).ain_bulk(ids)
+            if len(rows) == len(ids) or attempt:
+                break
+            self.invalidate(subject_id, level)
+        return [rows[pk] for pk in ids if pk in rows]
+
+    def invalidate(self, subject_id=None, level=None):
+        with self._lock:
+            self._pools.pop((subject_id, level or None), None)
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+
+sampler = QuestionSampler()
+
+
+def sample_questions(subject_id=None, level=None, num_questions=10, rng=None):
+    """Return up to num_questions random questions for a subject/level"""
+    return sampler.sample(subject_id, level, num_questions, rng)
+
+
+async def asample_questions(subject_id=None, level=None, num_questions=10, rng=None):
+    """Async sample_questions()"""
+    return await sampler.asample(subject_id, level, num_questions, rng)
+
+
+def seeded_question_ids(subject_id=None, level=None, num_questions=10, seed=0):
+    """Return the same up to num_questions question ids for the same pool and seed"""
+    return sampler.sample_ids(subject_id, level, num_questions, random.Random(seed))
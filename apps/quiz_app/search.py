@@ -0,0 +1,300 @@
+"""
+Question Search
+===============
+
+Full-text search over question text and options, for the search API and
+the admin changelist.
+
+On SQLite builds with FTS5 the index is the ``quiz_question_fts`` virtual
+table (created by migration 0008), ranked with bm25 and question text
+weighing twice as much as options. Elsewhere an in-memory inverted index
+is used, with the same query rules and a similar ranking: it is built
+once, and when the bank version changes (see versioning.py) only the
+questions updated since, and the ids of deleted ones, are read from the
+database. ``QUIZ_SEARCH_BACKEND`` ('auto', 'fts5' or 'python') picks one
+explicitly.
+
+A query matches questions containing all of its words, the last one as a
+prefix, so results follow a search box as the user types. Signals and the
+bulk importer keep the FTS5 table in sync with Question; rebuild it with
+``python manage.py rebuild_search_index``. search_filter() (the admin
+changelist search) selects at most ``FILTER_LIMIT`` best matches on the
+in-memory index, as their ids are sent to the database as parameters.
+"""
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Question
+from .versioning import get_bank_version
+
+FTS_TABLE = 'quiz_question_fts'
+# Relative weights of the question_text and options columns
+TEXT_WEIGHT = 2.0
+OPTIONS_WEIGHT = 1.0
+DELETE_CHUNK = 500
+# Most ids search_filter() passes to the database (SQLite allows 999
+# parameters per statement on older builds)
+FILTER_LIMIT = 500
+# Questions updated this long before the newest one seen are read again
+# when the in-memory index is synced, for transactions that committed late
+SYNC_MARGIN = timedelta(seconds=60)
+
+# Letters and digits, like FTS5's unicode61 tokenizer
+_WORD = re.compile(r'[^\W_]+')
+_fts_tables = {}
+
+
+def tokenize(text):
+    """Lowercase words of text, without diacritics"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return _WORD.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def options_text(question):
+    return ' '.join([question.option_a, question.option_b, question.option_c, question.option_d])
+
+
+def use_fts():
+    """Whether searches go to the FTS5 table"""
+    backend = getattr(settings, 'QUIZ_SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend == 'fts5'
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def fts_query(terms):
+    """FTS5 MATCH expression: every term, the last one as a prefix"""
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+class InvertedIndex:
+    """Postings {term: {question_id: weighted term frequency}} of a question bank"""
+
+    def __init__(self, rows=()):
+        self.postings = {}
+        # {question_id: (subject_id, level, terms)}
+        self.buckets = {}
+        self.terms = []
+        self.update(rows)
+
+    def update(self, rows):
+        """Add or replace (question_id, subject_id, level, question_text, options) rows"""
+        rows = list(rows)
+        self.remove(row[0] for row in rows if row[0] in self.buckets)
+        new_terms = []
+        for question_id, subject_id, level, question_text, options in rows:
+            frequencies = {}
+            for weight, text in ((TEXT_WEIGHT, question_text), (OPTIONS_WEIGHT, options)):
+                for term in tokenize(text):
+                    frequencies[term] = frequencies.get(term, 0) + weight
+            self.buckets[question_id] = (subject_id, level, tuple(frequencies))
+            for term, frequency in frequencies.items():
+                if term not in self.postings:
+                    self.postings[term] = {}
+                    new_terms.append(term)
+                self.postings[term][question_id] = frequency
+        if new_terms:
+            self.terms = list(heapq.merge(self.terms, sorted(new_terms)))
+
+    def remove(self, question_ids):
+        removed_terms = False
+        for question_id in list(question_ids):
+            bucket = self.buckets.pop(question_id, None)
+            for term in bucket[2] if bucket else ():
+                postings = self.postings[term]
+                del postings[question_id]
+                if not postings:
+                    del self.postings[term]
+                    removed_terms = True
+        if removed_terms:
+            self.terms = [term for term in self.terms if term in self.postings]
+
+    def _with_prefix(self, prefix):
+        for term in self.terms[bisect_left(self.terms, prefix):]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def _term_scores(self, words):
+        """bm25-style score of every question containing one of words"""
+        scores = {}
+        for word in words:
+            postings = self.postings.get(word, {})
+            idf = math.log(1 + (len(self.buckets) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for question_id, frequency in postings.items():
+                scores[question_id] = scores.get(question_id, 0) + idf * frequency / (frequency + 1.2)
+        return scores
+
+    def search(self, terms, subject_id=None, level=None):
+        """Return ids of questions containing every term (the last as a prefix), best first"""
+        scores = None
+        for position, term in enumerate(terms):
+            last = position == len(terms) - 1
+            term_scores = self._term_scores(self._with_prefix(term) if last else [term])
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    question_id: score + term_scores[question_id]
+                    for question_id, score in scores.items()
+                    if question_id in term_scores
+                }
+            if not scores:
+                return []
+        matches = [
+            question_id for question_id in scores
+            if (subject_id is None or self.buckets[question_id][0] == subject_id)
+            and (not level or self.buckets[question_id][1] == level)
+        ]
+        return sorted(matches, key=lambda question_id: (-scores[question_id], question_id))
+
+
+def _index_rows(questions):
+    rows = (
+        questions.order_by()
+        .values_list('id', 'subject_id', 'level', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d')
+        .iterator(chunk_size=2000)
+    )
+    for question_id, subject_id, level, question_text, *options in rows:
+        yield question_id, subject_id, level, question_text, ' '.join(options)
+
+
+class PythonSearchIndex:
+    """InvertedIndex of the whole bank, synced when the bank version changes"""
+
+    def __init__(self):
+        # (bank version, index, newest updated_at read)
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def _sync(self, version):
+        # Read before the rows, so rows saved meanwhile are read again next time
+        newest = Question.objects.aggregate(newest=Max('updated_at'))['newest']
+        if self._entry is None:
+            index = InvertedIndex(_index_rows(Question.objects.all()))
+        else:
+            _, index, synced = self._entry
+            changed = Question.objects.all()
+            if synced is not None:
+                changed = changed.filter(updated_at__gte=synced - SYNC_MARGIN)
+            index.update(_index_rows(changed))
+            index.remove(set(index.buckets) - set(Question.objects.order_by().values_list('id', flat=True)))
+        self._entry = (version, index, newest)
+
+    def search(self, terms, subject_id=None, level=None):
+        """InvertedIndex.search() of an index up to date with the bank version"""
+        version = get_bank_version()
+        # Updates and searches share the index: one at a time
+        with self._lock:
+            if self._entry is None or self._entry[0] != version:
+                self._sync(version)
+            return self._entry[1].search(terms, subject_id, level)
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+
+python_index = PythonSearchIndex()
+
+
+def _fts_search(terms, subject_id, level, limit, offset):
+    where = f'{FTS_TABLE} MATCH %s'
+    params = [fts_query(terms)]
+    if subject_id is not None:
+        where += ' AND subject_id = %s'
+        params.append(subject_id)
+    if level:
+        where += ' AND level = %s'
+        params.append(level)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {where}', params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {where} '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s), rowid LIMIT %s OFFSET %s',
+            [*params, TEXT_WEIGHT, OPTIONS_WEIGHT, limit, offset]
+        )
+        return total, [row[0] for row in cursor.fetchall()]
+
+
+def search_questions(query, subject_id=None, level=None, limit=20, offset=0):
+    """Return (total matches, ids of one page of matches), best match first"""
+    terms = tokenize(query)
+    if not terms:
+        return 0, []
+    if use_fts():
+        return _fts_search(terms, subject_id, level, limit, offset)
+    matches = python_index.search(terms, subject_id, level)
+    return len(matches), matches[offset:offset + limit]
+
+
+def search_filter(query):
+    """Q object selecting the questions that match query (at most FILTER_LIMIT on the Python index), unranked"""
+    terms = tokenize(query)
+    if not terms:
+        return Q(pk__in=[])
+    if use_fts():
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts_query(terms)]))
+    return Q(pk__in=python_index.search(terms)[:FILTER_LIMIT])
+
+
+def _delete(cursor, question_ids):
+    for start in range(0, len(question_ids), DELETE_CHUNK):
+        chunk = question_ids[start:start + DELETE_CHUNK]
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk)
+
+
+def index_questions(questions):
+    """Add or replace questions in the FTS5 table (the Python index follows bank versions)"""
+    if not questions or not use_fts():
+        return
+    rows = [
+        (question.pk, question.question_text, options_text(question), question.subject_id, question.level)
+        for question in questions
+    ]
+    with connection.cursor() as cursor:
+        _delete(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, question_text, options, subject_id, level) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            rows
+        )
+
+
+def remove_questions(*question_ids):
+    if question_ids and use_fts():
+        with connection.cursor() as cursor:
+            _delete(cursor, list(question_ids))
+
+
+def rebuild_search_index():
+    """Re-index every question; returns the number of questions indexed"""
+    python_index.clear()
+    if not use_fts():
+        return Question.objects.count()
+    table = Question._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, question_text, options, subject_id, level) '
+            f"SELECT id, question_text, option_a || ' ' || option_b || ' ' || option_c || ' ' || option_d, "
+            f'subject_id, level FROM {table}'
+        )
+        return cursor.rowcount
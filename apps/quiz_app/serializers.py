@@ -1,5 +1,10 @@
+from collections.abc import Mapping
+
 from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.settings import api_settings
 from .models import Subject, Question
+from .catalog import get_level_counts, levels_info
 
 
 class SubjectSerializer(serializers.ModelSerializer):
@@ -11,22 +16,20 @@ class SubjectSerializer(serializers.ModelSerializer):
         model = Subject
         fields = ['id', 'code', 'name', 'description', 'total_questions', 'levels_available']
     
+    def _level_counts(self, obj):
+        """Per-level counts, from the 'level_counts' context if the view provided it"""
+        level_counts = self.context.setdefault('level_counts', {})
+        if obj.id not in level_counts:
+            level_counts.update(get_level_counts([obj.id]))
+        return level_counts.get(obj.id, {})
+    
     def get_total_questions(self, obj):
         """Get total number of questions for this subject"""
-        return obj.total_questions()
+        return sum(self._level_counts(obj).values())
     
     def get_levels_available(self, obj):
         """Get available levels with question counts"""
-        levels = []
-        for level in ['easy', 'medium', 'hard']:
-            count = obj.questions_by_level(level).count()
-            if count > 0:
-                levels.append({
-                    'level': level,
-                    'count': count,
-                    'display': level.title()
-                })
-        return levels
+        return levels_info(self._level_counts(obj))
 
 
 class QuestionSerializer(serializers.ModelSerializer):
@@ -53,11 +56,68 @@ class QuestionSerializer(serializers.ModelSerializer):
         }
 
 
+class QuestionDeliverySerializer(serializers.ModelSerializer):
+    """Question as shown to students: no correct answer or explanation"""
+    options = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Question
+        fields = ['id', 'question_text', 'options']
+    
+    def get_options(self, obj):
+        return obj.get_options()
+
+
 class QuizRequestSerializer(serializers.Serializer):
     """Serializer for quiz request"""
     subject_code = serializers.CharField(max_length=50)
     level = serializers.ChoiceField(choices=['easy', 'medium', 'hard'])
     num_questions = serializers.IntegerField(default=10, min_value=1, max_value=30)
+    seed = serializers.IntegerField(required=False, min_value=0)
+
+
+class QuizBatchRequestSerializer(QuizRequestSerializer):
+    """Serializer for generating a batch of quizzes"""
+    count = serializers.IntegerField(min_value=1, max_value=1000)
+
+
+class QuestionListSerializer(serializers.Serializer):
+    """Serializer for question list query parameters"""
+    subject_code = serializers.CharField(max_length=50, required=False)
+    level = serializers.ChoiceField(choices=['easy', 'medium', 'hard'], required=False)
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=100)
+    seed = serializers.IntegerField(required=False, min_value=0)
+    cursor = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=500)
+    format = serializers.ChoiceField(choices=['json', 'ndjson'], default='json')
+
+    def validate(self, attrs):
+        paged = 'cursor' in attrs or 'page_size' in attrs or attrs['format'] == 'ndjson'
+        if paged and 'seed' in attrs:
+            raise serializers.ValidationError('seed cannot be combined with cursor, page_size or ndjson')
+        return attrs
+
+
+class QuestionSearchSerializer(serializers.Serializer):
+    """Serializer for question search query parameters"""
+    q = serializers.CharField(max_length=200)
+    subject_code = serializers.CharField(max_length=50, required=False)
+    level = serializers.ChoiceField(choices=['easy', 'medium', 'hard'], required=False)
+    page = serializers.IntegerField(default=1, min_value=1)
+    page_size = serializers.IntegerField(default=20, min_value=1, max_value=100)
+
+
+class AdaptiveStartSerializer(serializers.Serializer):
+    """Serializer for starting an adaptive quiz"""
+    subject_code = serializers.CharField(max_length=50)
+    level = serializers.ChoiceField(choices=['easy', 'medium', 'hard'], default='medium')
+    num_questions = serializers.IntegerField(default=10, min_value=1, max_value=30)
+
+
+class AdaptiveAnswerSerializer(serializers.Serializer):
+    """Serializer for answering the current question of an adaptive quiz"""
+    token = serializers.CharField()
+    selected_answer = serializers.ChoiceField(choices=['A', 'B', 'C', 'D'])
 
 
 class QuizAnswerSerializer(serializers.Serializer):
@@ -66,12 +126,29 @@ class QuizAnswerSerializer(serializers.Serializer):
     selected_answer = serializers.CharField(max_length=1)
 
 
+class CheckAnswersSerializer(serializers.Serializer):
+    """Serializer for the web quiz's check-answers request"""
+    answers = serializers.DictField(child=serializers.CharField(max_length=1))
+    subject_code = serializers.CharField(max_length=50, required=False, allow_null=True, allow_blank=True)
+    level = serializers.CharField(max_length=10, required=False, allow_null=True, allow_blank=True)
+
+    def validate_level(self, value):
+        """Levels are case-insensitive here (the page sends its display level)"""
+        if not value:
+            return None
+        level = value.lower()
+        if level not in ('easy', 'medium', 'hard'):
+            raise serializers.ValidationError(f'"{value}" is not a valid choice.')
+        return level
+
+
 class QuizSubmissionSerializer(serializers.Serializer):
     """Serializer for quiz submission"""
     answers = serializers.ListField(
         child=QuizAnswerSerializer(),
-        allow_empty=False
+        allow_empty=True
     )
+    token = serializers.CharField(required=False)
     
     def validate_answers(self, value):
         """Validate that answers are unique"""
@@ -79,6 +156,113 @@ class QuizSubmissionSerializer(serializers.Serializer):
         if len(question_ids) != len(set(question_ids)):
             raise serializers.ValidationError("Duplicate question IDs found")
         return value
+    
+    def validate(self, attrs):
+        """Without a quiz token there must be something to grade"""
+        if not attrs.get('answers') and not attrs.get('token'):
+            raise serializers.ValidationError({'answers': ['This list may not be empty.']})
+        return attrs
+
+
+def _error(field_class, key, **kwargs):
+    message = str(field_class.default_error_messages[key]).format(**kwargs)
+    return ErrorDetail(message, code=key)
+
+
+# Bound fields of the submission serializers, shared by validate_submission()
+_answer_fields = QuizAnswerSerializer().fields
+_token_field = QuizSubmissionSerializer().fields['token']
+# selected_answer values that pass CharField(max_length=1) unchanged
+_PLAIN_ANSWERS = ('A', 'B', 'C', 'D')
+
+
+def _run_field(field, data):
+    """Return (value, errors) of a bound field's own validation of its value in data"""
+    try:
+        return field.run_validation(field.get_value(data)), None
+    except serializers.ValidationError as e:
+        return None, e.detail
+
+
+def _validate_answer(answer):
+    """Return (validated answer, errors) like QuizAnswerSerializer as a list item"""
+    if answer is None:
+        return None, [_error(serializers.Field, 'null')]
+    if not isinstance(answer, Mapping):
+        return None, {api_settings.NON_FIELD_ERRORS_KEY: [
+            _error(serializers.Serializer, 'invalid', datatype=type(answer).__name__)
+        ]}
+    errors = {}
+    # Plain ints and letters are what the fields would return; anything
+    # else goes through the fields themselves
+    question_id = answer.get('question_id')
+    if type(question_id) is not int:
+        question_id, errors['question_id'] = _run_field(_answer_fields['question_id'], answer)
+    selected_answer = answer.get('selected_answer')
+    if selected_answer not in _PLAIN_ANSWERS:
+        selected_answer, errors['selected_answer'] = _run_field(_answer_fields['selected_answer'], answer)
+    errors = {name: detail for name, detail in errors.items() if detail}
+    if errors:
+        return None, errors
+    return {'question_id': question_id, 'selected_answer': selected_answer}, None
+
+
+def validate_submission(data):
+    """
+    Apply QuizSubmissionSerializer's rules to one submission without
+    building serializers, for endpoints that validate many at once.
+
+    Values are checked by the serializers' own (bound) fields unless they
+    are plain ints and answer letters, so validated data, error messages
+    and error codes are the same as serializer.errors would give; raises
+    serializers.ValidationError.
+    """
+    if data is None:
+        raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+            ErrorDetail('No data provided', code='null')
+        ]})
+    if not isinstance(data, Mapping):
+        raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+            _error(serializers.Serializer, 'invalid', datatype=type(data).__name__)
+        ]})
+    errors = {}
+    validated = {}
+
+    answers = data.get('answers')
+    if 'answers' not in data:
+        errors['answers'] = [_error(serializers.Field, 'required')]
+    elif answers is None:
+        errors['answers'] = [_error(serializers.Field, 'null')]
+    elif isinstance(answers, (str, Mapping)) or not hasattr(answers, '__iter__'):
+        errors['answers'] = [_error(serializers.ListField, 'not_a_list', input_type=type(answers).__name__)]
+    else:
+        answer_errors = {}
+        validated['answers'] = []
+        for index, answer in enumerate(answers):
+            answer, item_errors = _validate_answer(answer)
+            if item_errors:
+                answer_errors[index] = item_errors
+            else:
+                validated['answers'].append(answer)
+        if answer_errors:
+            errors['answers'] = answer_errors
+        else:
+            question_ids = [answer['question_id'] for answer in validated['answers']]
+            if len(question_ids) != len(set(question_ids)):
+                errors['answers'] = ['Duplicate question IDs found']
+
+    if 'token' in data:
+        token, token_errors = _run_field(_token_field, data)
+        if token_errors:
+            errors['token'] = token_errors
+        else:
+            validated['token'] = token
+
+    if errors:
+        raise serializers.ValidationError(errors)
+    if not validated['answers'] and not validated.get('token'):
+        raise serializers.ValidationError({'answers': ['This list may not be empty.']})
+    return validated
 
 
 class QuizResultSerializer(serializers.Serializer):
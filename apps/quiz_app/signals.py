@@ -0,0 +1,54 @@
+"""
+Question Signals
+================
+
+Keep derived data (sampling index, caches, QuestionStats, serialized
+question fragments, search index) in sync with Question changes.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import fragments, search
+from .models import Question
+from .question_stats import apply_deltas
+from .versioning import bump_subject_version
+
+
+@receiver(pre_save, sender=Question)
+def question_saving(sender, instance, raw=False, **kwargs):
+    """Remember which subject/level an existing question is moving out of"""
+    instance._original_bucket = None
+    if instance.pk and not raw:
+        instance._original_bucket = (
+            Question.objects.filter(pk=instance.pk)
+            .values_list('subject_id', 'level')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    """Update stored counts and invalidate caches of the old and new subject"""
+    original = getattr(instance, '_original_bucket', None)
+    bucket = (instance.subject_id, instance.level)
+
+    if created:
+        apply_deltas({bucket: 1})
+    elif original and original != bucket:
+        apply_deltas({original: -1, bucket: 1})
+
+    old_subject_id = original[0] if original else None
+    bump_subject_version(instance.subject_id, old_subject_id)
+    fragments.invalidate(instance.pk)
+    search.index_questions([instance])
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    """Update stored counts and invalidate caches of the question's subject"""
+    apply_deltas({(instance.subject_id, instance.level): -1})
+    bump_subject_version(instance.subject_id)
+    fragments.invalidate(instance.pk)
+    search.remove_questions(instance.pk)
+
@@ -0,0 +1,296 @@
+"""
+Question Bank Snapshot
+======================
+
+A read-only image of the whole question bank in one file, for fast cold
+starts. Each worker process maps the file with ``mmap``, so all workers
+share one copy in the OS page cache. They read questions from it instead
+of loading id pools, answer keys and fragments from the database on their
+first requests.
+
+Build it with ``python manage.py build_question_snapshot`` and set
+``QUIZ_SNAPSHOT_PATH`` to its path. While a snapshot is in use:
+
+* (subject, level) sampling pools are slices of the snapshot (sampling.py)
+* sampled questions are built from it without a query (sampling.py)
+* grading reads answer keys from it (answer_keys.py)
+* delivery fragments come pre-rendered from it (fragments.py)
+
+Layout: an 8-byte magic, a uint32 length and a JSON header, then
+8-byte aligned sections that are read as typed ``memoryview`` casts of
+the map, without copying. Rows are sorted by id: ids, subject ids, level
+codes and answer letters, then each text column (question text, options,
+explanation and the delivery fragment) as an array of n + 1 offsets into
+its UTF-8 blob. ``pool_ids`` lists the ids again in (subject, level, id)
+order, and the header maps each (subject, level) to its range there.
+Integers use the byte order of the machine that built the file.
+
+The database stays the source of truth. The header records the bank
+version of the BankVersion table (see versioning.py) read at build time.
+A process compares it with that row, one primary key lookup, when it
+opens the file and again whenever the cached bank version moves, so a
+worker that starts after an edit never serves the stale file. Once the
+versions differ the snapshot is dropped for good, and every lookup goes
+back to the database until the snapshot is rebuilt. The build
+replaces the file atomically, and each process opens the new file on its
+next request.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .models import Question
+from .versioning import get_bank_version, get_database_version
+
+MAGIC = b'QSNAP01\n'
+ALIGN = 8
+LEVEL_CODES = [level for level, _ in Question.LEVEL_CHOICES]
+TEXT_FIELDS = ('question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'explanation', 'fragment')
+
+renderer = JSONRenderer()
+
+
+class SnapshotError(ValueError):
+    """A snapshot file cannot be read"""
+
+
+def _offsets(lengths):
+    """Array of len(lengths) + 1 running offsets, in the smallest type that fits"""
+    offsets = [0]
+    for length in lengths:
+        offsets.append(offsets[-1] + length)
+    return array('I' if offsets[-1] < 1 << 32 else 'Q', offsets)
+
+
+def _fragment(question_id, question_text, options):
+    """Delivery JSON of a question, as rendered by fragments.render_question()"""
+    return renderer.render({
+        'id': question_id,
+        'question_text': question_text,
+        'options': dict(zip('ABCD', options)),
+    })
+
+
+def build_snapshot(path):
+    """Write a snapshot of the question bank to path; returns the number of questions"""
+    # Stamped before reading: a change made during the build makes it stale
+    bank_version = get_database_version()
+    ids, subject_ids, levels, answers = array('q'), array('q'), bytearray(), bytearray()
+    texts = {field: [] for field in TEXT_FIELDS}
+    rows = (
+        Question.objects.order_by('id')
+        .values_list('id', 'subject_id', 'level', 'correct_answer', *TEXT_FIELDS[:-1])
+        .iterator(chunk_size=2000)
+    )
+    level_codes = {level: code for code, level in enumerate(LEVEL_CODES)}
+    for question_id, subject_id, level, correct_answer, *values in rows:
+        ids.append(question_id)
+        subject_ids.append(subject_id)
+        levels.append(level_codes[level])
+        answers += correct_answer.encode('ascii')
+        values.append(_fragment(question_id, values[0], values[1:5]).decode())
+        for field, value in zip(TEXT_FIELDS, values):
+            texts[field].append(value.encode())
+
+    order = sorted(range(len(ids)), key=lambda i: (subject_ids[i], levels[i], ids[i]))
+    pool_ids = array('q', [ids[i] for i in order])
+    pools = {}
+    for position, i in enumerate(order):
+        key = f'{subject_ids[i]}:{LEVEL_CODES[levels[i]]}'
+        pools.setdefault(key, [position, position])[1] = position + 1
+
+    sections = [('ids', ids), ('subject_ids', subject_ids), ('levels', bytes(levels)),
+                ('answers', bytes(answers)), ('pool_ids', pool_ids)]
+    for field in TEXT_FIELDS:
+        sections.append((f'{field}_offsets', _offsets(len(text) for text in texts[field])))
+        sections.append((field, b''.join(texts[field])))
+
+    layout = {}
+    offset = 0
+    for name, data in sections:
+        typecode = data.typecode if isinstance(data, array) else 'B'
+        nbytes = len(data) * (data.itemsize if isinstance(data, array) else 1)
+        layout[name] = [offset, nbytes, typecode]
+        offset += nbytes + -nbytes % ALIGN
+    header = json.dumps({
+        'count': len(ids),
+        'byteorder': sys.byteorder,
+        'levels': LEVEL_CODES,
+        'pools': pools,
+        'sections': layout,
+        'bank_version': bank_version,
+    }).encode()
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        head = MAGIC + struct.pack('<I', len(header)) + header
+        f.write(head + b'\0' * (-len(head) % ALIGN))
+        for name, data in sections:
+            nbytes = layout[name][1]
+            f.write(data)
+            f.write(b'\0' * (-nbytes % ALIGN))
+    # Processes that have the old file mapped keep reading it
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+class Snapshot:
+    """A snapshot file mapped into memory"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f'Empty snapshot file: {path}')
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise SnapshotError(f'Not a question bank snapshot: {path}')
+            size = struct.unpack_from('<I', self._map, len(MAGIC))[0]
+            start = len(MAGIC) + 4
+            header = json.loads(self._map[start:start + size])
+        except (struct.error, ValueError) as e:
+            raise SnapshotError(f'Invalid snapshot file {path}: {e}')
+        if 'bank_version' not in header:
+            raise SnapshotError(f'Snapshot {path} has no question bank version; rebuild it')
+        if header['byteorder'] != sys.byteorder:
+            raise SnapshotError(f'Snapshot {path} was built on a {header["byteorder"]}-endian machine')
+
+        base = start + size + -(start + size) % ALIGN
+        view = memoryview(self._map)
+        sections = {}
+        for name, (offset, nbytes, typecode) in header['sections'].items():
+            if base + offset + nbytes > len(self._map):
+                raise SnapshotError(f'Truncated snapshot file: {path}')
+            sections[name] = view[base + offset:base + offset + nbytes].cast(typecode)
+
+        self.path = path
+        self.bank_version = header['bank_version']
+        self.levels = header['levels']
+        self.ids = sections['ids']
+        self.subject_ids = sections['subject_ids']
+        self.level_codes = sections['levels']
+        self.answers = sections['answers']
+        self.pool_ids = sections['pool_ids']
+        self.texts = {field: (sections[f'{field}_offsets'], sections[field]) for field in TEXT_FIELDS}
+        self.pools = {}
+        for key, (first, stop) in header['pools'].items():
+            subject_id, level = key.split(':')
+            self.pools[(int(subject_id), level)] = (first, stop)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def is_current(self):
+        """True if the database still holds the questions the snapshot was built from"""
+        return self.bank_version == get_database_version()
+
+    def index(self, question_id):
+        """Row of a question, or None"""
+        i = bisect_left(self.ids, question_id)
+        if i == len(self.ids) or self.ids[i] != question_id:
+            return None
+        return i
+
+    def text(self, field, i):
+        offsets, blob = self.texts[field]
+        return str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+
+    def pool(self, subject_id, level):
+        """Ids of a (subject, level) pool, sorted, as a zero-copy view"""
+        first, stop = self.pools.get((subject_id, level), (0, 0))
+        return self.pool_ids[first:stop]
+
+    def question(self, i):
+        """Unsaved Question with the fields of row i"""
+        return Question(
+            id=self.ids[i],
+            subject_id=self.subject_ids[i],
+            level=self.levels[self.level_codes[i]],
+            correct_answer=chr(self.answers[i]),
+            **{field: self.text(field, i) for field in TEXT_FIELDS[:-1]}
+        )
+
+    def _rows(self, question_ids):
+        for question_id in question_ids:
+            i = self.index(question_id)
+            if i is not None:
+                yield question_id, i
+
+    def in_bulk(self, question_ids):
+        """{question_id: Question} of the known question_ids"""
+        return {question_id: self.question(i) for question_id, i in self._rows(question_ids)}
+
+    def answer_keys(self, question_ids):
+        """{question_id: (correct_answer, explanation, question_text)} like answer_keys.lookup_many()"""
+        return {
+            question_id: (chr(self.answers[i]), self.text('explanation', i), self.text('question_text', i))
+            for question_id, i in self._rows(question_ids)
+        }
+
+    def fragments(self, question_ids):
+        """{question_id: delivery JSON fragment} like fragments.fragment_map()"""
+        offsets, blob = self.texts['fragment']
+        return {question_id: bytes(blob[offsets[i]:offsets[i + 1]]) for question_id, i in self._rows(question_ids)}
+
+
+class SnapshotStore:
+    """The snapshot at QUIZ_SNAPSHOT_PATH, reopened when the file is replaced"""
+
+    def __init__(self):
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The snapshot, or None if none is configured, readable and current"""
+        path = getattr(settings, 'QUIZ_SNAPSHOT_PATH', None)
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        # Entries are (file key, bank version last checked, snapshot or None)
+        entry = self._entry
+        if entry is None or entry[0] != key:
+            try:
+                snapshot = Snapshot(path)
+            except (OSError, SnapshotError):
+                snapshot = None
+            with self._lock:
+                self._entry = entry = (key, None, snapshot)
+        if entry[2] is None:
+            return None
+        version = get_bank_version()
+        if entry[1] != version:
+            # Read the version first: a change during the check moves it again.
+            # A stale file stays stale, so it is dropped until the file changes
+            snapshot = entry[2] if entry[2].is_current() else None
+            with self._lock:
+                self._entry = entry = (key, version, snapshot)
+        return entry[2]
+
+    async def aget(self):
+        """Async get(); stays on the event loop when no snapshot is configured"""
+        if not getattr(settings, 'QUIZ_SNAPSHOT_PATH', None):
+            return None
+        return await sync_to_async(self.get)()
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+
+snapshots = SnapshotStore()
+
@@ -1,3 +1,1729 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from collections import Counter
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection
+from django.db.models import Count
+from django.contrib import admin
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError as DRFValidationError
+
+from .admin import QuestionAdmin, SubjectAdmin
+from . import api_urls, decks, exporters, listing, search, versioning
+from .adaptive import AdaptiveQuiz, AdaptiveQuizError, permuted_index, purge_expired_steps, start_quiz
+from .duplicates import (
+    DuplicateFinder, find_duplicates, merge_duplicates, permutations, plan_merges, shingle_hashes, sign_rows, signature
+)
+from .fragments import question_fragments
+from .answer_keys import answer_keys
+from .analytics import rebuild_question_analytics
+from .attempts import AttemptWriter, _attempt, attempt_writer, record_attempt
+from .grading import QuestionNotFound, grade_answers
+from .importers import ImportRowError, import_csv, import_rows, import_text, iter_text_rows, validate_row
+from .models import (
+    AdaptiveStep, AttemptAnswer, QuizAttempt, Subject, Question, QuestionAnalytics, QuestionStats, get_random_questions
+)
+from .quiz_tokens import issue_token
+from .serializers import QuestionDeliverySerializer, QuizSubmissionSerializer, validate_submission
+from .sampling import sampler, sample_questions
+from .snapshot import Snapshot, SnapshotError, snapshots
+
+
+def make_question(subject, level='easy', number=1, correct_answer='A'):
+    return Question.objects.create(
+        subject=subject,
+        question_text=f'[{subject.code}] [{level}] Question {number}',
+        option_a='Option A',
+        option_b='Option B',
+        option_c='Option C',
+        option_d='Option D',
+        correct_answer=correct_answer,
+        level=level,
+        explanation=f'Explanation {number}',
+    )
+
+
+@override_settings(QUIZ_DECK_ASYNC_REFILL=False, QUIZ_ATTEMPT_WRITE_BEHIND=False, QUIZ_VERSION_CHECK_SECONDS=None)
+class QuizTestCase(TestCase):
+    """Base test case with a clean cache and two small subjects"""
+
+    def setUp(self):
+        cache.clear()
+        sampler.clear()
+        answer_keys.clear()
+        search.python_index.clear()
+        snapshots.clear()
+        self.ai = Subject.objects.create(code='CSW351-AI', name='Artificial Intelligence')
+        self.web = Subject.objects.create(code='INT341-WEB', name='Web Technology')
+        for i in range(1, 16):
+            make_question(self.ai, 'easy', i)
+        for i in range(1, 6):
+            make_question(self.ai, 'hard', i, correct_answer='B')
+        for i in range(1, 4):
+            make_question(self.web, 'medium', i, correct_answer='C')
+
+    def deferred_attempts(self):
+        """Attempts are written after the response (write-behind); keep them out of query counts"""
+        return mock.patch.object(attempt_writer, 'record')
+
+
+class QuestionSamplerTests(QuizTestCase):
+
+    def test_sample_is_distinct_and_filtered(self):
+        questions = sample_questions(self.ai.id, 'easy', 10)
+        self.assertEqual(len(questions), 10)
+        self.assertEqual(len({q.id for q in questions}), 10)
+        self.assertTrue(all(q.subject_id == self.ai.id and q.level == 'easy' for q in questions))
+
+    def test_sample_caps_at_pool_size(self):
+        self.assertEqual(len(sample_questions(self.ai.id, 'hard', 10)), 5)
+        self.assertEqual(sample_questions(self.web.id, 'easy', 10), [])
+
+    def test_warm_pool_costs_one_query(self):
+        sample_questions(self.ai.id, 'easy', 10)
+        with self.assertNumQueries(1):
+            sample_questions(self.ai.id, 'easy', 10)
+
+    def test_pool_rebuilt_after_changes(self):
+        self.assertEqual(len(sample_questions(self.web.id, 'medium', 10)), 3)
+        make_question(self.web, 'medium', 4)
+        self.assertEqual(len(sample_questions(self.web.id, 'medium', 10)), 4)
+        Question.objects.filter(subject=self.web).first().delete()
+        self.assertEqual(len(sample_questions(self.web.id, 'medium', 10)), 3)
+
+    def test_stale_pool_is_refreshed(self):
+        sample_questions(self.web.id, 'medium', 10)
+        # Bypass signals, as another process would
+        Question.objects.filter(subject=self.web).update(level='hard')
+        self.assertEqual(sample_questions(self.web.id, 'medium', 10), [])
+
+    def test_get_random_questions_by_code(self):
+        self.assertEqual(len(get_random_questions('CSW351-AI', 'easy', 10)), 10)
+        self.assertEqual(get_random_questions('UNKNOWN', 'easy', 10), [])
+
+    def test_take_quiz_and_api_use_sampler(self):
+        response = self.client.get(reverse('quiz:take_quiz', args=['CSW351-AI', 'hard']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['questions']), 5)
+
+        response = self.client.get('/api/questions/', {'subject_code': 'CSW351-AI', 'level': 'easy', 'limit': 4})
+        self.assertEqual(response.json()['count'], 4)
+        response = self.client.get('/api/questions/', {'subject_code': 'UNKNOWN'})
+        self.assertEqual(response.json()['count'], 0)
+
+
+class GradingTests(QuizTestCase):
+
+    def answers_for(self, count):
+        questions = Question.objects.order_by('id')[:count]
+        return [{'question_id': q.id, 'selected_answer': 'A'} for q in questions]
+
+    def test_api_submit_grades_answers(self):
+        answers = self.answers_for(20)
+        response = self.client.post('/api/quiz/submit/', {'answers': answers}, content_type='application/json')
+        result = response.json()['quiz_result']
+        self.assertEqual(result['total_questions'], 20)
+        # 15 easy AI questions have A as the correct answer, the 5 hard ones B
+        self.assertEqual(result['correct_count'], 15)
+        self.assertEqual(result['results'][0]['explanation'], 'Explanation 1')
+
+    def test_unknown_question_is_404(self):
+        answers = self.answers_for(2) + [{'question_id': 999999, 'selected_answer': 'A'}]
+        response = self.client.post('/api/quiz/submit/', {'answers': answers}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(reverse('quiz:check_answers'), {'answers': {'999999': 'A'}}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_check_answers(self):
+        answers = {str(a['question_id']): 'B' for a in self.answers_for(20)}
+        response = self.client.post(reverse('quiz:check_answers'), {'answers': answers}, content_type='application/json')
+        data = response.json()
+        self.assertEqual(data['correct_count'], 5)
+        self.assertEqual(data['incorrect_count'], 15)
+        self.assertEqual(set(data['results'][0]), {'question_id', 'selected', 'correct_answer', 'is_correct'})
+
+    def test_queries_per_submission_constant(self):
+        # Cold: one id -> subject lookup plus one load per subject.
+        # Warm: no queries, however many answers are submitted
+        with self.deferred_attempts():
+            for count in (1, 10, 23):
+                answer_keys.clear()
+                answers = self.answers_for(count)
+                subjects = Question.objects.filter(id__in=[a['question_id'] for a in answers]).values('subject').distinct().count()
+                with self.assertNumQueries(1 + subjects):
+                    self.client.post('/api/quiz/submit/', {'answers': answers}, content_type='application/json')
+                with self.assertNumQueries(0):
+                    self.client.post('/api/quiz/submit/', {'answers': answers}, content_type='application/json')
+                with self.assertNumQueries(0):
+                    self.client.post(
+                        reverse('quiz:check_answers'),
+                        {'answers': {str(a['question_id']): 'A' for a in answers}},
+                        content_type='application/json'
+                    )
+
+
+class AnswerKeyCacheTests(QuizTestCase):
+
+    def test_cache_invalidated_on_save_and_delete(self):
+        question = Question.objects.filter(subject=self.web).first()
+        self.assertTrue(grade_answers([(question.id, 'C')])['results'][0]['is_correct'])
+
+        question.correct_answer = 'D'
+        question.save()
+        self.assertFalse(grade_answers([(question.id, 'C')])['results'][0]['is_correct'])
+
+        question.delete()
+        with self.assertRaises(QuestionNotFound):
+            grade_answers([(question.id, 'C')])
+
+    def test_question_moved_between_subjects(self):
+        question = Question.objects.filter(subject=self.web).first()
+        grade_answers([(question.id, 'C')])
+        question.subject = self.ai
+        question.correct_answer = 'A'
+        question.save()
+        self.assertTrue(grade_answers([(question.id, 'A')])['results'][0]['is_correct'])
+
+    @override_settings(QUIZ_ANSWER_KEY_CACHE_BYTES=1)
+    def test_lru_eviction_keeps_latest_subject(self):
+        ai_question = Question.objects.filter(subject=self.ai).first()
+        web_question = Question.objects.filter(subject=self.web).first()
+        grade_answers([(ai_question.id, 'A')])
+        grade_answers([(web_question.id, 'C')])
+        self.assertEqual(list(answer_keys._subjects), [self.web.id])
+        with self.assertNumQueries(0):
+            grade_answers([(web_question.id, 'C')])
+
+    def test_version_check_catches_changes_of_other_processes(self):
+        question = Question.objects.filter(subject=self.web).first()
+        with override_settings(QUIZ_VERSION_CHECK_SECONDS=0):
+            self.assertTrue(grade_answers([(question.id, 'C')])['results'][0]['is_correct'])
+            # Another process with its own cache: only the BankVersion rows show its edit
+            with mock.patch.object(versioning, '_bump_cached'):
+                question.correct_answer = 'A'
+                question.save()
+            self.assertTrue(grade_answers([(question.id, 'A')])['results'][0]['is_correct'])
+            # Nothing changed since: the check is one primary key lookup
+            with self.assertNumQueries(1):
+                self.assertEqual(versioning.check_versions(), [])
+
+
+class CatalogTests(QuizTestCase):
+
+    def test_api_root_lists_every_route(self):
+        endpoints = self.client.get('/api/').json()['endpoints']
+        self.assertEqual(set(endpoints), {pattern.name for pattern in api_urls.urlpatterns} - {'api_root'})
+        for name, url in endpoints.items():
+            self.assertEqual(resolve(url.format(code='CSW351-AI', id=1)).url_name, name)
+
+    def add_subjects(self, count):
+        for i in range(count):
+            subject = Subject.objects.create(code=f'EXTRA-{i}', name=f'Extra {i}')
+            make_question(subject, 'easy', 1)
+            make_question(subject, 'hard', 2)
+
+    def assertQueriesIndependentOfSubjects(self, url, **params):
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(url, params)
+        self.add_subjects(5)
+        with self.assertNumQueries(len(before.captured_queries)):
+            self.client.get(url, params)
+
+    def test_subjects_api(self):
+        response = self.client.get('/api/subjects/')
+        ai = response.json()['subjects'][0]
+        self.assertEqual(ai['total_questions'], 20)
+        self.assertEqual(ai['levels_available'], [
+            {'level': 'easy', 'display': 'Easy', 'count': 15},
+            {'level': 'hard', 'display': 'Hard', 'count': 5},
+        ])
+        self.assertQueriesIndependentOfSubjects('/api/subjects/')
+
+    def test_stats_api(self):
+        stats = self.client.get('/api/stats/').json()['stats']
+        self.assertEqual(stats['total_subjects'], 2)
+        self.assertEqual(stats['total_questions'], 23)
+        self.assertEqual(stats['questions_by_level'], {'easy': 15, 'medium': 3, 'hard': 5})
+        self.assertEqual(stats['subjects'][1]['medium'], 3)
+        self.assertQueriesIndependentOfSubjects('/api/stats/')
+
+    def test_quiz_list(self):
+        response = self.client.get(reverse('quiz:quiz_list'))
+        self.assertEqual(response.context['subjects_data'][0]['total_questions'], 20)
+        self.assertQueriesIndependentOfSubjects(reverse('quiz:quiz_list'))
+
+    def test_chatbot_select_difficulty(self):
+        response = self.client.get(reverse('quiz:chatbot_select_difficulty'), {'subject': 'CSW351-AI'})
+        self.assertEqual([level['level'] for level in response.context['levels']], ['easy', 'hard'])
+        self.assertQueriesIndependentOfSubjects(reverse('quiz:chatbot_select_difficulty'), subject='CSW351-AI')
+
+    def test_subject_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/subjects/INT341-WEB/')
+        self.assertEqual(response.json()['subject']['total_questions'], 3)
+
+
+class QuestionStatsTests(QuizTestCase):
+
+    def stored_counts(self):
+        return {
+            (stats.subject_id, stats.level): stats.question_count
+            for stats in QuestionStats.objects.filter(question_count__gt=0)
+        }
+
+    def expected_counts(self):
+        rows = Question.objects.order_by().values_list('subject_id', 'level').annotate(count=Count('id'))
+        return {(subject_id, level): count for subject_id, level, count in rows}
+
+    def test_counts_follow_create_update_delete(self):
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+        question = Question.objects.filter(subject=self.web).first()
+        question.subject = self.ai
+        question.level = 'hard'
+        question.save()
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+        question.delete()
+        self.web.delete()
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+    def test_rebuild_command(self):
+        # Bulk updates bypass signals, leaving the stored counts stale
+        Question.objects.filter(subject=self.ai, level='hard').update(level='medium')
+        call_command('rebuild_question_stats', stdout=StringIO())
+        self.assertEqual(self.stored_counts(), self.expected_counts())
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_question_stats', 'UNKNOWN', stdout=StringIO())
+
+    def test_admin_total_questions(self):
+        model_admin = SubjectAdmin(Subject, admin.site)
+        request = RequestFactory().get('/admin/quiz_app/subject/')
+        with self.assertNumQueries(1):
+            totals = {
+                subject.code: model_admin.total_questions(subject)
+                for subject in model_admin.get_queryset(request)
+            }
+        self.assertEqual(totals, {'CSW351-AI': 20, 'INT341-WEB': 3})
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked with SQLite EXPLAIN QUERY PLAN')
+class QueryPlanTests(QuizTestCase):
+    """Hot paths must not fall back to full scans of Question or temp sorts"""
+
+    def query_plans(self, fn):
+        with CaptureQueriesContext(connection) as ctx:
+            fn()
+        selects = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        with connection.cursor() as cursor:
+            for sql in selects:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def assertIndexedPlans(self, fn):
+        for sql, plan in self.query_plans(fn):
+            self.assertNotRegex(plan, r'SCAN quiz_app_question\b', sql)
+            self.assertNotIn('TEMP B-TREE', plan, sql)
+
+    def test_generate(self):
+        self.assertIndexedPlans(lambda: self.client.post(
+            '/api/quiz/generate/',
+            {'subject_code': 'CSW351-AI', 'level': 'easy', 'num_questions': 10},
+            content_type='application/json'
+        ))
+
+    def test_take_quiz(self):
+        self.assertIndexedPlans(lambda: self.client.get(reverse('quiz:take_quiz', args=['CSW351-AI', 'easy'])))
+
+    def test_submit(self):
+        answers = [{'question_id': pk, 'selected_answer': 'A'} for pk in Question.objects.values_list('id', flat=True)]
+        self.assertIndexedPlans(lambda: self.client.post(
+            '/api/quiz/submit/', {'answers': answers}, content_type='application/json'
+        ))
+
+    def test_stats(self):
+        self.assertIndexedPlans(lambda: self.client.get('/api/stats/'))
+        self.assertIndexedPlans(lambda: self.client.get('/api/subjects/'))
+
+    def test_question_pages(self):
+        cursor = listing.encode_cursor(self.ai.id, 'easy', Question.objects.order_by('id').values_list('id', flat=True)[3])
+        for params in ({}, {'subject_code': 'CSW351-AI'}, {'subject_code': 'CSW351-AI', 'level': 'easy'}):
+            self.assertIndexedPlans(lambda: self.client.get('/api/questions/', {**params, 'cursor': cursor}))
+
+    def test_subject_code_lookup(self):
+        for sql, plan in self.query_plans(lambda: Subject.objects.get(code='CSW351-AI')):
+            self.assertIn('SEARCH quiz_app_subject USING INDEX', plan)
+
+
+CSV_HEADER = 'subject_code,level,question_text,option_a,option_b,option_c,option_d,correct_answer,explanation\n'
+
+
+class CsvImportTests(QuizTestCase):
+
+    def write_csv(self, rows):
+        f = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        with f:
+            f.write(CSV_HEADER)
+            f.writelines(rows)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_import_csv_in_batches(self):
+        rows = [f'INT341-WEB,Medium,Imported {i},a,b,c,d,b,why\n' for i in range(25)]
+        rows.insert(3, 'UNKNOWN,easy,Bad subject,a,b,c,d,A,\n')
+        rows.insert(5, 'INT341-WEB,expert,Bad level,a,b,c,d,A,\n')
+        rows.insert(7, 'INT341-WEB,easy,Bad answer,a,b,c,d,E,\n')
+        path = self.write_csv(rows)
+        log = []
+
+        with CaptureQueriesContext(connection) as ctx:
+            summary = import_csv(path, batch_size=10, progress_every=20, log=log.append)
+        # subject map + 3 batches of (hash lookup + bulk insert + stats update + bank and subject versions)
+        statements = Counter(query['sql'].split()[0] for query in ctx.captured_queries)
+        self.assertEqual((statements['SELECT'], statements['INSERT'], statements['UPDATE']), (1 + 3, 3, 3 * 3))
+
+        self.assertEqual(summary['imported'], 25)
+        self.assertEqual(summary['errors'], 3)
+        self.assertIn('✗ Line 5: Unknown subject: UNKNOWN', log)
+        self.assertTrue(any('20 rows processed' in line for line in log))
+
+        imported = Question.objects.filter(question_text__startswith='Imported')
+        self.assertEqual(imported.count(), 25)
+        self.assertEqual(set(imported.values_list('level', 'correct_answer')), {('medium', 'B')})
+        self.assertEqual(QuestionStats.objects.get(subject=self.web, level='medium').question_count, 28)
+        self.assertEqual(len(sample_questions(self.web.id, 'medium', 30)), 28)
+
+    def test_validate_row(self):
+        subject_map = {'CSW351-AI': self.ai.id}
+        row = {
+            'subject_code': 'CSW351-AI', 'level': ' EASY ', 'question_text': 'What is AI?',
+            'option_a': 'a', 'option_b': 'b', 'option_c': 'c', 'option_d': 'd', 'correct_answer': 'a',
+        }
+        fields = validate_row(row, subject_map)
+        self.assertEqual((fields['level'], fields['correct_answer'], fields['explanation']), ('easy', 'A', ''))
+        with self.assertRaisesMessage(ImportRowError, 'Line 9: Missing option_d'):
+            validate_row(dict(row, option_d=''), subject_map, line=9)
+
+
+class TextImportTests(QuizTestCase):
+
+    TEXT = """---
+SUBJECT: CSW351-AI
+LEVEL: easy
+QUESTION: Which separator is used here?
+It is --- (three dashes): see below
+\\---
+\\\\---
+A: ---
+B: ===
+C: ***
+D: ###
+CORRECT: a
+EXPLANATION: Records are separated by --- lines
+---
+
+SUBJECT: CSW351-AI
+LEVEL: hard
+QUESTION: Missing options
+A: one
+CORRECT: A
+SUBJECT: INT341-WEB
+LEVEL: medium
+QUESTION: No separator before this record
+A: a
+B: b
+C: c
+D: d
+CORRECT: D
+"""
+
+    def test_iter_text_rows(self):
+        rows = list(iter_text_rows(StringIO(self.TEXT)))
+        self.assertEqual([line for line, _ in rows], [2, 16, 21])
+        first = rows[0][1]
+        self.assertEqual(
+            first['question_text'], 'Which separator is used here?\nIt is --- (three dashes): see below\n---\n\\---'
+        )
+        self.assertEqual(first['option_a'], '---')
+        self.assertEqual(rows[2][1]['subject_code'], 'INT341-WEB')
+
+    def test_import_text(self):
+        f = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8')
+        with f:
+            f.write(self.TEXT)
+        self.addCleanup(os.remove, f.name)
+        log = []
+
+        summary = import_text(f.name, log=log.append)
+        self.assertEqual((summary['imported'], summary['errors']), (2, 1))
+        self.assertEqual(log, ['✗ Line 16: Missing option_b, option_c, option_d'])
+        self.assertTrue(Question.objects.filter(question_text__startswith='Which separator', correct_answer='A').exists())
+        self.assertEqual(QuestionStats.objects.get(subject=self.web, level='medium').question_count, 4)
+
+
+class ImportCommandTests(QuizTestCase):
+
+    def write_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for n in range(3):
+            with open(os.path.join(directory, f'bank{n}.csv'), 'w', encoding='utf-8') as f:
+                f.write(CSV_HEADER)
+                f.writelines(f'CSW351-AI,medium,File {n} question {i},a,b,c,d,C,\n' for i in range(7))
+                f.write('CSW351-AI,medium,Broken,a,b,c,d,,\n')
+        with open(os.path.join(directory, 'bank3.txt'), 'w', encoding='utf-8') as f:
+            f.write(TextImportTests.TEXT)
+        return directory
+
+    def imported_texts(self):
+        return list(
+            Question.objects.filter(id__gt=self.last_id).order_by('id').values_list('question_text', 'level', 'subject_id')
+        )
+
+    def test_import_is_deterministic_across_worker_counts(self):
+        directory = self.write_files()
+        self.last_id = Question.objects.order_by('-id').values_list('id', flat=True).first()
+        results = []
+        for workers in (1, 3):
+            stdout, stderr = StringIO(), StringIO()
+            call_command(
+                'import_questions', os.path.join(directory, '*.csv'), os.path.join(directory, 'bank3.txt'),
+                workers=workers, batch_size=5, stdout=stdout, stderr=stderr
+            )
+            self.assertIn('Imported 23 questions from 4 file(s), 4 errors', stdout.getvalue())
+            self.assertIn('bank0.csv: Line 9: Missing correct_answer', stderr.getvalue())
+            results.append(self.imported_texts())
+            Question.objects.filter(id__gt=self.last_id).delete()
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0][0][0], 'File 0 question 0')
+        self.assertEqual(QuestionStats.objects.get(subject=self.ai, level='medium').question_count, 0)
+
+    def test_single_file_is_streamed(self):
+        directory = self.write_files()
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('apps.quiz_app.importers.parse_file') as parse_file:
+            call_command(
+                'import_questions', os.path.join(directory, 'bank0.csv'), workers=4, batch_size=5,
+                stdout=stdout, stderr=stderr
+            )
+        parse_file.assert_not_called()
+        self.assertIn('Importing 1 file(s) with 1 worker(s)', stdout.getvalue())
+        self.assertIn('Imported 7 questions from 1 file(s), 1 errors', stdout.getvalue())
+        self.assertIn('bank0.csv: Line 9: Missing correct_answer', stderr.getvalue())
+
+    def test_unmatched_glob(self):
+        with self.assertRaises(CommandError):
+            call_command('import_questions', '/nonexistent/*.csv', stdout=StringIO())
+
+
+class UpsertImportTests(QuizTestCase):
+
+    write_csv = CsvImportTests.write_csv
+
+    def test_reimport_writes_only_the_delta(self):
+        rows = [f'CSW351-AI,hard,Upsert {i},a,b,c,d,D,\n' for i in range(12)]
+        path = self.write_csv(rows)
+        summary = import_csv(path, batch_size=5, log=lambda line: None)
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (12, 0, 0))
+
+        # Same content with different case/whitespace, one changed answer
+        rows = [f'CSW351-AI,HARD,  upsert   {i},A,B,C,D,D,\n' for i in range(12)]
+        rows[4] = 'CSW351-AI,hard,Upsert 4,a,b,c,d,B,fixed\n'
+        rows.append('CSW351-AI,hard,Upsert 12,a,b,c,d,D,\n')
+        path = self.write_csv(rows)
+        with CaptureQueriesContext(connection) as ctx:
+            summary = import_csv(path, batch_size=5, log=lambda line: None)
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (1, 1, 11))
+        statements = Counter(query['sql'].split()[0] for query in ctx.captured_queries)
+        self.assertEqual(statements['INSERT'], 1)
+
+        self.assertEqual(Question.objects.filter(question_text__istartswith='upsert').count(), 13)
+        self.assertEqual(Question.objects.get(question_text='Upsert 4').explanation, 'fixed')
+        self.assertEqual(QuestionStats.objects.get(subject=self.ai, level='hard').question_count, 18)
+
+    def test_insert_mode_fails_on_duplicates(self):
+        path = self.write_csv(['CSW351-AI,easy,[CSW351-AI] [easy] Question 1,Option A,Option B,Option C,Option D,A,\n'])
+        with self.assertRaises(IntegrityError):
+            import_csv(path, mode='insert', log=lambda line: None)
+
+    def test_duplicate_question_fails_validation(self):
+        question = Question(
+            subject=self.ai, level='easy', question_text='[CSW351-AI] [EASY]  question 1',
+            option_a='Option A', option_b='Option B', option_c='Option C', option_d='Option D',
+            correct_answer='B'
+        )
+        with self.assertRaises(ValidationError):
+            question.full_clean()
+
+    def test_hash_migration_reports_existing_duplicates(self):
+        from django.apps import apps
+        migration = importlib.import_module('apps.quiz_app.migrations.0004_question_content_hash')
+
+        # A bank from before content hashes, with one question entered twice
+        Question.objects.update(content_hash=None)
+        original = Question.objects.filter(subject=self.web).first()
+        copy = Question.objects.get(pk=original.pk)
+        copy.pk = None
+        Question.objects.bulk_create([copy])
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            migration.populate_content_hash(apps, None)
+        self.assertIn(
+            f'1 duplicate question(s) were left with a NULL content_hash: #{copy.pk} (same as #{original.pk})',
+            stdout.getvalue()
+        )
+        self.assertEqual(list(Question.objects.filter(content_hash=None).values_list('pk', flat=True)), [copy.pk])
+
+
+@override_settings(QUIZ_DECK_POOL_SIZE=4)
+class QuizDeckTests(QuizTestCase):
+
+    def test_pool_pops_distinct_decks_without_queries(self):
+        self.assertEqual(decks.fill_pool(self.ai, 'easy', 10), 4)
+        self.assertEqual(decks.available(self.ai, 'easy', 10), 4)
+        with self.assertNumQueries(0):
+            first = decks.pop_deck(self.ai, 'easy', 10)
+        self.assertEqual(first['num_questions'], 10)
+        self.assertEqual(first['subject_code'], 'CSW351-AI')
+        self.assertEqual(decks.available(self.ai, 'easy', 10), 3)
+        self.assertNotEqual(first, decks.pop_deck(self.ai, 'easy', 10))
+
+    def test_pool_is_refilled_when_low(self):
+        decks.fill_pool(self.ai, 'hard', 5)
+        for _ in range(3):
+            self.assertIsNotNone(decks.pop_deck(self.ai, 'hard', 5))
+        self.assertEqual(decks.available(self.ai, 'hard', 5), 4)
+
+    def test_empty_pool(self):
+        self.assertIsNone(decks.pop_deck(self.web, 'medium', 3))
+        # The pop refilled the pool, and new decks are reachable
+        self.assertEqual(decks.available(self.web, 'medium', 3), 4)
+        self.assertIsNotNone(decks.pop_deck(self.web, 'medium', 3))
+        self.assertIsNone(decks.pop_deck(self.web, 'easy', 3))
+
+    def test_unwritten_slot_is_a_miss_that_keeps_later_decks(self):
+        key = decks._pool_key(self.ai.id, 'easy', 5)
+        decks.fill_pool(self.ai, 'easy', 5, size=1)
+        # A push that has published its slot but not written its deck yet
+        decks._incr(f'{key}:tail')
+        decks.fill_pool(self.ai, 'easy', 5, size=3)
+
+        # _take(): pop_deck() would refill the pool
+        self.assertIsNotNone(decks._take(self.ai, 'easy', 5))
+        self.assertIsNone(decks._take(self.ai, 'easy', 5))
+        self.assertIsNotNone(decks._take(self.ai, 'easy', 5))
+        self.assertIsNone(decks._take(self.ai, 'easy', 5))
+        # Pops of an empty pool claim no slot
+        self.assertEqual(cache.get(f'{key}:head'), 3)
+
+    def test_decks_are_dropped_when_questions_change(self):
+        decks.fill_pool(self.web, 'medium', 3)
+        make_question(self.web, 'medium', 4)
+        self.assertEqual(decks.available(self.web, 'medium', 3), 0)
+
+    def test_generate_quiz_pops_deck(self):
+        decks.fill_pool(self.ai, 'easy', 10)
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                '/api/quiz/generate/',
+                {'subject_code': 'CSW351-AI', 'level': 'easy', 'num_questions': 10},
+                content_type='application/json'
+            )
+        quiz = response.json()['quiz']
+        self.assertEqual(quiz['num_questions'], 10)
+        self.assertEqual(set(quiz['questions'][0]['options']), {'A', 'B', 'C', 'D'})
+
+        response = self.client.post(
+            '/api/quiz/generate/', {'subject_code': 'UNKNOWN', 'level': 'easy'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_take_quiz_uses_deck_order(self):
+        decks.fill_pool(self.ai, 'easy', 10)
+        key = decks._pool_key(self.ai.id, 'easy', 10)
+        ids = [question['id'] for question in cache.get(f'{key}:1')['questions']]
+        response = self.client.get(reverse('quiz:take_quiz', args=['CSW351-AI', 'easy']))
+        self.assertEqual([question.id for question in response.context['questions']], ids)
+
+    def test_build_quiz_decks_command(self):
+        out = StringIO()
+        call_command('build_quiz_decks', '--sizes', '5', '10', stdout=out)
+        self.assertIn('Built 24 quiz decks', out.getvalue())
+        self.assertEqual(decks.available(self.web, 'medium', 10), 4)
+        with self.assertRaises(CommandError):
+            call_command('build_quiz_decks', 'UNKNOWN', stdout=StringIO())
+
+
+class FragmentCacheTests(QuizTestCase):
+
+    def serialized(self, question_id):
+        question = Question.objects.get(pk=question_id)
+        return json.loads(json.dumps(QuestionDeliverySerializer(question).data))
+
+    def test_fragments_match_serializer(self):
+        ids = list(Question.objects.filter(subject=self.ai).values_list('id', flat=True)[:5])
+        fragments = question_fragments(ids + [0])
+        self.assertEqual([json.loads(fragment) for fragment in fragments], [self.serialized(pk) for pk in ids])
+
+    def test_api_questions_served_from_fragments(self):
+        params = {'subject_code': 'CSW351-AI', 'level': 'easy', 'limit': 15}
+        with self.assertNumQueries(4):
+            self.client.get('/api/questions/', params)
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/questions/', params).json()
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['count'], 15)
+        self.assertEqual(data['questions'][0], self.serialized(data['questions'][0]['id']))
+
+    def test_fragment_refreshed_after_changes(self):
+        question = Question.objects.filter(subject=self.web).first()
+        question_fragments([question.id])
+
+        question.question_text = 'Changed'
+        question.save()
+        self.assertEqual(json.loads(question_fragments([question.id])[0])['question_text'], 'Changed')
+
+        # Bypass signals; the updated_at stamp no longer matches
+        Question.objects.filter(pk=question.pk).update(option_a='Updated', updated_at=timezone.now())
+        self.assertEqual(json.loads(question_fragments([question.id])[0])['options']['A'], 'Updated')
+
+
+class QuizTokenTests(QuizTestCase):
+
+    def generate(self, **data):
+        data = {'subject_code': 'CSW351-AI', 'level': 'hard', **data}
+        return self.client.post('/api/quiz/generate/', data, content_type='application/json').json()['quiz']
+
+    def submit(self, **data):
+        return self.client.post('/api/quiz/submit/', data, content_type='application/json')
+
+    def test_delivered_questions_have_no_answers(self):
+        quiz = self.generate()
+        self.assertEqual(set(quiz['questions'][0]), {'id', 'question_text', 'options'})
+        data = self.client.get('/api/questions/', {'subject_code': 'CSW351-AI'}).json()
+        self.assertEqual(set(data['questions'][0]), {'id', 'question_text', 'options'})
+        self.assertIn('token', data)
+
+    def test_submit_with_token_grades_issued_questions(self):
+        quiz = self.generate()
+        first, second = [question['id'] for question in quiz['questions'][:2]]
+        answers = [
+            {'question_id': first, 'selected_answer': 'B'},
+            {'question_id': second, 'selected_answer': 'A'},
+        ]
+        answer_keys.lookup_many([first])
+        with self.deferred_attempts(), self.assertNumQueries(0):
+            response = self.submit(token=quiz['token'], answers=answers)
+        result = response.json()['quiz_result']
+        self.assertEqual(result['total_questions'], 5)
+        self.assertEqual(result['correct_count'], 1)
+        unanswered = [r for r in result['results'] if r['selected_answer'] is None]
+        self.assertEqual(len(unanswered), 3)
+
+        response = self.submit(token=quiz['token'], answers=[])
+        self.assertEqual(response.json()['quiz_result']['correct_count'], 0)
+
+    def test_submit_rejects_questions_not_issued(self):
+        quiz = self.generate(num_questions=2)
+        issued = {question['id'] for question in quiz['questions']}
+        other = Question.objects.filter(subject=self.ai, level='hard').exclude(id__in=issued).first()
+        response = self.submit(token=quiz['token'], answers=[{'question_id': other.id, 'selected_answer': 'B'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(other.id), response.json()['error'])
+
+    def test_submit_rejects_bad_tokens(self):
+        token = issue_token([1, 2])
+        response = self.submit(token=token[:-2] + 'xx', answers=[])
+        self.assertEqual(response.json()['error'], 'Invalid quiz token')
+        with override_settings(QUIZ_TOKEN_MAX_AGE=-1):
+            response = self.submit(token=token, answers=[])
+        self.assertEqual(response.json()['error'], 'Quiz token has expired')
+        self.assertEqual(self.submit(answers=[]).status_code, 400)
+
+
+class QuizAttemptTests(QuizTestCase):
+
+    def test_api_submit_records_attempt(self):
+        quiz = self.client.post(
+            '/api/quiz/generate/', {'subject_code': 'INT341-WEB', 'level': 'medium'}, content_type='application/json'
+        ).json()['quiz']
+        first = quiz['questions'][0]['id']
+        self.client.post(
+            '/api/quiz/submit/',
+            {'token': quiz['token'], 'answers': [{'question_id': first, 'selected_answer': 'C'}]},
+            content_type='application/json'
+        )
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual((attempt.subject, attempt.level, attempt.source), (self.web, 'medium', 'api'))
+        self.assertEqual((attempt.correct_count, attempt.total_questions), (1, 3))
+        answers = {answer.question_id: answer for answer in attempt.answers.all()}
+        self.assertTrue(answers[first].is_correct)
+        self.assertEqual(sum(answer.selected_answer == '' for answer in answers.values()), 2)
+
+    def test_check_answers_records_attempt(self):
+        question = Question.objects.filter(subject=self.ai, level='hard').first()
+        self.client.post(
+            reverse('quiz:check_answers'),
+            {'subject_code': 'CSW351-AI', 'level': 'Hard', 'answers': {str(question.id): 'A'}},
+            content_type='application/json'
+        )
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual((attempt.subject, attempt.level, attempt.source), (self.ai, 'hard', 'web'))
+        self.assertFalse(attempt.answers.get().is_correct)
+
+    def test_check_answers_validates_fields(self):
+        question = Question.objects.filter(subject=self.ai, level='hard').first()
+        for data in (
+            {'answers': {str(question.id): 'AB'}},
+            {'answers': {str(question.id): None}},
+            {'answers': [question.id]},
+            {'answers': {str(question.id): 'A'}, 'level': 'expert'},
+            {'answers': {str(question.id): 'A'}, 'level': ['hard']},
+            {'answers': {str(question.id): 'A'}, 'subject_code': 'X' * 51},
+            [],
+        ):
+            response = self.client.post(reverse('quiz:check_answers'), data, content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+    def test_bad_attempt_does_not_lose_its_batch(self):
+        graded = grade_answers([(Question.objects.filter(subject=self.web).first().id, 'C')])
+        good = _attempt(graded, 'INT341-WEB', 'medium', 'api')
+        bad = dict(good, total_questions=None)
+        writer = AttemptWriter()
+        with self.assertLogs('apps.quiz_app.attempts', 'ERROR'):
+            writer._write_logged([good, bad, good])
+        self.assertEqual(QuizAttempt.objects.count(), 2)
+        self.assertEqual((writer.metrics['written'], writer.metrics['failed']), (2, 1))
+
+
+@override_settings(QUIZ_ATTEMPT_WRITE_BEHIND=True, QUIZ_ATTEMPT_FLUSH_MS=10, QUIZ_ATTEMPT_QUEUE_SIZE=3)
+class AttemptWriteBehindTests(TransactionTestCase):
+
+    def attempt(self, question):
+        return {
+            'subject_code': 'CSW351-AI', 'level': 'easy', 'source': 'api',
+            'total_questions': 1, 'correct_count': 1, 'percentage': 100.0,
+            'submitted_at': timezone.now(), 'answers': [(question.id, 'A', True)],
+        }
+
+    def test_attempts_written_in_background(self):
+        subject = Subject.objects.create(code='CSW351-AI', name='Artificial Intelligence')
+        question = make_question(subject)
+        writer = AttemptWriter()
+        for _ in range(3):
+            writer.record(self.attempt(question))
+        writer.shutdown()
+
+        self.assertEqual(QuizAttempt.objects.count(), 3)
+        self.assertEqual(AttemptAnswer.objects.filter(question=question).count(), 3)
+        stats = writer.stats()
+        self.assertEqual(stats['written'], 3)
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['queued'] + stats['sync_writes'], 3)
+
+
+class QuestionAnalyticsTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.q1, self.q2, self.q3 = Question.objects.filter(subject=self.web).order_by('id')
+        for selected in ('CCC', 'CAC', 'AAB', 'BCA'):
+            graded = grade_answers(zip([self.q1.id, self.q2.id, self.q3.id], selected))
+            record_attempt(graded, 'INT341-WEB', 'medium')
+
+    def test_aggregates_updated_from_attempts(self):
+        analytics = QuestionAnalytics.objects.get(question=self.q1)
+        self.assertEqual((analytics.attempt_count, analytics.correct_count), (4, 2))
+        self.assertEqual(analytics.option_counts(), {'A': 1, 'B': 1, 'C': 2, 'D': 0})
+        self.assertEqual(analytics.p_value, 0.5)
+        self.assertGreater(analytics.discrimination, 0.5)
+
+        before = list(QuestionAnalytics.objects.order_by('pk').values())
+        self.assertEqual(rebuild_question_analytics(), 3)
+        after = list(QuestionAnalytics.objects.order_by('pk').values())
+        for old, new in zip(before, after):
+            for field in ('attempt_count', 'correct_count', 'option_a_count', 'unanswered_count'):
+                self.assertEqual(old[field], new[field])
+            self.assertAlmostEqual(old['score_squares_sum'], new['score_squares_sum'])
+            self.assertAlmostEqual(old['correct_score_sum'], new['correct_score_sum'])
+
+    def test_stats_endpoint(self):
+        with self.assertNumQueries(1):
+            stats = self.client.get(f'/api/questions/{self.q1.id}/stats/').json()['stats']
+        self.assertEqual(stats['p_value'], 0.5)
+        self.assertEqual(stats['option_shares']['C'], 0.5)
+        self.assertEqual(stats['flags'], [])
+
+        untouched = Question.objects.filter(subject=self.ai).first()
+        stats = self.client.get(f'/api/questions/{untouched.id}/stats/').json()['stats']
+        self.assertEqual((stats['attempt_count'], stats['p_value']), (0, None))
+        self.assertEqual(self.client.get('/api/questions/0/stats/').status_code, 404)
+
+    def test_admin_columns(self):
+        model_admin = QuestionAdmin(Question, admin.site)
+        request = RequestFactory().get('/admin/quiz_app/question/')
+        queryset = model_admin.get_queryset(request).select_related(*model_admin.list_select_related)
+        with self.assertNumQueries(1):
+            rows = {question.id: question for question in queryset}
+        self.assertEqual(model_admin.p_value(rows[self.q1.id]), '0.50')
+        self.assertEqual(model_admin.attempt_count(rows[self.q2.id]), 4)
+        untouched = Question.objects.filter(subject=self.ai).first()
+        self.assertEqual(model_admin.discrimination(rows[untouched.id]), '-')
+
+
+class AdaptiveQuizTests(QuizTestCase):
+
+    def answer_key(self):
+        return dict(Question.objects.values_list('id', 'correct_answer'))
+
+    def test_permutation_visits_every_index_once(self):
+        for n in range(1, 40):
+            for level_index in range(3):
+                indexes = [permuted_index(12345, level_index, position, n) for position in range(n)]
+                self.assertEqual(sorted(indexes), list(range(n)))
+
+    def test_difficulty_follows_answers(self):
+        keys = self.answer_key()
+        # No medium questions in this subject: starts at the nearest level
+        quiz = start_quiz(self.ai.id, 'medium', num_questions=12, seed=7)
+        self.assertEqual(quiz.level, 'easy')
+
+        levels = []
+        asked = set()
+        for _ in range(3):
+            asked.add(quiz.question_id)
+            levels.append(quiz.answer(keys[quiz.question_id])['level'])
+        self.assertEqual(levels, ['easy', 'easy', 'hard'])
+        self.assertEqual(quiz.points, 1 + 1 + 3)
+
+        asked.add(quiz.question_id)
+        self.assertFalse(quiz.answer('X')['is_correct'])
+        while not quiz.finished:
+            self.assertNotIn(quiz.question_id, asked)
+            asked.add(quiz.question_id)
+            quiz.answer('X')
+        self.assertEqual(quiz.progress()['asked'], 12)
+        self.assertEqual(quiz.progress()['correct'], 3)
+
+    def test_state_round_trip(self):
+        quiz = start_quiz(self.web.id, 'easy', num_questions=2)
+        restored = AdaptiveQuiz.unpack(quiz.pack())
+        self.assertEqual(restored.pack(), quiz.pack())
+        self.assertEqual(len(quiz.pack()), 12)
+        self.assertEqual(AdaptiveQuiz.loads(quiz.dumps()).pack(), quiz.pack())
+
+    def test_tokens_are_single_use_and_expire(self):
+        keys = self.answer_key()
+        start = self.client.post(
+            '/api/quiz/adaptive/start/', {'subject_code': 'CSW351-AI', 'level': 'hard', 'num_questions': 4},
+            content_type='application/json'
+        ).json()
+
+        def answer(token, selected_answer):
+            return self.client.post(
+                '/api/quiz/adaptive/answer/', {'token': token, 'selected_answer': selected_answer},
+                content_type='application/json'
+            )
+
+        wrong = 'A' if keys[start['question']['id']] != 'A' else 'B'
+        data = answer(start['token'], wrong).json()
+        self.assertFalse(data['result']['is_correct'])
+        # Replaying the first token with the revealed answer is refused
+        response = answer(start['token'], data['result']['correct_answer'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'This adaptive quiz step was already answered')
+
+        with override_settings(QUIZ_TOKEN_MAX_AGE=-1):
+            response = answer(data['token'], 'A')
+            self.assertEqual(response.json()['error'], 'Adaptive quiz token has expired')
+            self.assertEqual(purge_expired_steps(), 1)
+        self.assertFalse(AdaptiveStep.objects.exists())
+
+    def test_failed_answers_keep_the_token(self):
+        keys = self.answer_key()
+        start = self.client.post(
+            '/api/quiz/adaptive/start/', {'subject_code': 'INT341-WEB', 'num_questions': 2},
+            content_type='application/json'
+        ).json()
+
+        def answer(selected_answer):
+            return self.client.post(
+                '/api/quiz/adaptive/answer/', {'token': start['token'], 'selected_answer': selected_answer},
+                content_type='application/json'
+            )
+
+        self.assertEqual(answer('x').status_code, 400)
+        with mock.patch.object(AdaptiveQuiz, 'answer', side_effect=AdaptiveQuizError('Question 1 no longer exists')):
+            self.assertEqual(answer('C').status_code, 400)
+        data = answer(keys[start['question']['id']]).json()
+        self.assertTrue(data['result']['is_correct'])
+        self.assertEqual(answer('C').json()['error'], 'This adaptive quiz step was already answered')
+
+    def test_api_steps(self):
+        keys = self.answer_key()
+        question_fragments(keys)
+        data = self.client.post(
+            '/api/quiz/adaptive/start/', {'subject_code': 'CSW351-AI', 'level': 'hard', 'num_questions': 4},
+            content_type='application/json'
+        ).json()
+        self.assertEqual(set(data['question']), {'id', 'question_text', 'options'})
+        self.assertEqual(data['progress']['level'], 'hard')
+
+        # Every step deletes its token's row and, until the quiz is finished,
+        # stores the next one; a cold answer key adds the subject lookup + load
+        # and each new question its stamp
+        for queries in (5, 3, 3, 1):
+            question_id = data['question']['id']
+            with self.assertNumQueries(queries):
+                data = self.client.post(
+                    '/api/quiz/adaptive/answer/', {'token': data['token'], 'selected_answer': keys[question_id]},
+                    content_type='application/json'
+                ).json()
+            self.assertTrue(data['result']['is_correct'])
+        self.assertTrue(data['progress']['finished'])
+        self.assertEqual(data['progress']['points'], 12)
+        self.assertNotIn('question', data)
+
+        response = self.client.post(
+            '/api/quiz/adaptive/answer/', {'token': data['token'] + 'x', 'selected_answer': 'A'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/quiz/adaptive/start/', {'subject_code': 'UNKNOWN'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_chatbot_flow(self):
+        self.client.get(reverse('quiz:chatbot_select_difficulty'), {'subject': 'INT341-WEB'})
+        response = self.client.get(reverse('quiz:chatbot_adaptive_quiz'), {'level': 'medium'})
+        question = response.context['question']
+        self.assertEqual(question.subject_id, self.web.id)
+        self.assertEqual(len(self.client.session['adaptive_quiz']), 12)
+
+        response = self.client.post(reverse('quiz:chatbot_adaptive_quiz'), {'answer': 'C'})
+        self.assertTrue(response.context['result']['is_correct'])
+        self.assertNotEqual(response.context['question'].id, question.id)
+
+
+class QuizBatchTests(QuizTestCase):
+
+    def generate_batch(self, **data):
+        data = {'subject_code': 'CSW351-AI', 'level': 'easy', 'num_questions': 3, **data}
+        return self.client.post('/api/quiz/generate/batch/', data, content_type='application/json')
+
+    def read(self, response):
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_batch_of_distinct_quizzes(self):
+        sampler.get_pool(self.ai.id, 'easy')
+        # Subject, fragment stamps and fragment rows, whatever the count
+        with self.assertNumQueries(3):
+            quizzes = self.read(self.generate_batch(count=50))
+        self.assertEqual([quiz['index'] for quiz in quizzes], list(range(50)))
+        question_sets = {frozenset(question['id'] for question in quiz['questions']) for quiz in quizzes}
+        self.assertEqual(len(question_sets), 50)
+        self.assertEqual(set(quizzes[0]['questions'][0]), {'id', 'question_text', 'options'})
+
+        # Each quiz can be submitted with its own token
+        quiz = quizzes[7]
+        response = self.client.post('/api/quiz/submit/', {'token': quiz['token'], 'answers': []},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['quiz_result']['total_questions'], 3)
+
+    def test_seed_makes_batches_reproducible(self):
+        def question_ids(response):
+            return [[question['id'] for question in quiz['questions']] for quiz in self.read(response)]
+        first = question_ids(self.generate_batch(count=10, seed=7))
+        self.assertEqual(question_ids(self.generate_batch(count=10, seed=7)), first)
+        self.assertNotEqual(question_ids(self.generate_batch(count=10, seed=8)), first)
+
+    def test_errors(self):
+        # comb(5, 5) == 1 distinct quiz
+        response = self.generate_batch(level='hard', num_questions=5, count=2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Only 1 distinct', response.json()['error'])
+        self.assertEqual(self.generate_batch(level='medium', count=1).status_code, 400)
+        self.assertEqual(self.generate_batch(subject_code='UNKNOWN', count=1).status_code, 404)
+        self.assertEqual(self.generate_batch(count=0).status_code, 400)
+
+
+class SubmissionBatchTests(QuizTestCase):
+
+    def submit_batch(self, body, content_type='application/json'):
+        response = self.client.post('/api/quiz/submit/batch/', body, content_type=content_type)
+        if response.streaming:
+            return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return response
+
+    def test_validation_matches_serializer(self):
+        def answers(*items):
+            return {'answers': [dict(zip(('question_id', 'selected_answer'), item)) for item in items]}
+
+        cases = [
+            {}, None, [1], 'x', {'answers': 'x'}, {'answers': {}}, {'answers': None}, {'answers': []},
+            {'answers': [], 'token': 't'}, {'answers': [], 'token': None}, {'answers': [], 'token': ' '},
+            {'answers': [], 'token': True}, {'answers': [], 'token': 'a\x00'},
+            {'answers': [1, {}]}, {'answers': [None]}, {'answers': [{'question_id': 1, 'selected_answer': 'A'}, None]},
+            {'answers': [{'question_id': 1}, {'selected_answer': 'A'}]},
+            {'answers': [{'question_id': 'a', 'selected_answer': ''}]},
+            {'answers': [{'question_id': True, 'selected_answer': 'AB'}], 'token': ''},
+            {'answers': [{'question_id': '5.0', 'selected_answer': ' b '}], 'token': 5},
+            {'answers': [{'question_id': 2.5, 'selected_answer': [1]}]},
+            answers((None, None), (1.0, 1), (' 7 ', 1.5), ('1e3', False), (1e20, {}), ('9' * 1001, 'A' * 1000)),
+            answers((1, ' '), (2, '\x00'), (3, '\ud800'), (4, 'e\u0301'), (5, 'x'), (6, '\u00e9')),
+            answers((10 ** 30, 'A'), (float('nan'), 'B'), (float('inf'), 'C'), ([], 'D'), ({}, 'A')),
+            answers((1, 'A'), (1, 'B')), answers((1, 'A'), ('1', 'B')), answers((1, 'A'), (1, 'AB')),
+            {'answers': [{'question_id': 1, 'selected_answer': 'A', 'extra': 1}], 'token': 't', 'extra': 1},
+        ]
+
+        def details(value):
+            # Error messages with their codes
+            if isinstance(value, dict):
+                return {str(key): details(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [details(item) for item in value]
+            if hasattr(value, 'code'):
+                return [str(value), value.code]
+            return value
+
+        for data in cases:
+            serializer = QuizSubmissionSerializer(data=data)
+            expected = serializer.validated_data if serializer.is_valid() else serializer.errors
+            try:
+                actual = validate_submission(data)
+            except DRFValidationError as e:
+                actual = e.detail
+            self.assertEqual(details(actual), details(expected), data)
+
+    def test_batch_grading(self):
+        hard = list(Question.objects.filter(subject=self.ai, level='hard').values_list('id', flat=True))
+        web = list(Question.objects.filter(subject=self.web).values_list('id', flat=True))
+        token = issue_token(hard[:2], 'CSW351-AI', 'hard')
+        submissions = [
+            {'token': token, 'answers': [{'question_id': hard[0], 'selected_answer': 'B'}]},
+            {'answers': [{'question_id': question_id, 'selected_answer': 'C'} for question_id in web]},
+            {'answers': [{'question_id': 0, 'selected_answer': 'A'}]},
+            {'answers': []},
+            {'token': token, 'answers': [{'question_id': web[0], 'selected_answer': 'C'}]},
+        ]
+        # Subjects of the referenced questions, then one key load per subject
+        with self.deferred_attempts(), self.assertNumQueries(3):
+            results = self.submit_batch(submissions)
+        self.assertEqual([result['index'] for result in results], list(range(5)))
+        self.assertEqual([result['success'] for result in results], [True, True, False, False, False])
+        self.assertEqual(results[0]['quiz_result']['total_questions'], 2)
+        self.assertEqual(results[0]['quiz_result']['correct_count'], 1)
+        self.assertEqual(results[1]['quiz_result']['percentage'], 100.0)
+        self.assertIn('not found', results[2]['error'])
+        self.assertEqual(results[3]['errors'], {'answers': ['This list may not be empty.']})
+        self.assertIn('not issued', results[4]['error'])
+        self.assertEqual(QuizAttempt.objects.filter(subject=self.ai, level='hard').count(), 0)
+
+        self.submit_batch(submissions)
+        self.assertEqual(QuizAttempt.objects.count(), 2)
+
+    def test_attempts_are_recorded_before_streaming(self):
+        web = list(Question.objects.filter(subject=self.web).values_list('id', flat=True))
+        submissions = [{'answers': [{'question_id': question_id, 'selected_answer': 'C'}]} for question_id in web]
+        response = self.client.post('/api/quiz/submit/batch/', submissions, content_type='application/json')
+        # The client goes away without reading any result line
+        response.close()
+        self.assertEqual(QuizAttempt.objects.count(), 3)
+
+    def test_ndjson_body(self):
+        question = Question.objects.filter(subject=self.web).first()
+        body = '\n'.join([
+            json.dumps({'answers': [{'question_id': question.id, 'selected_answer': 'C'}]}),
+            '',
+            '{not json',
+        ])
+        results = self.submit_batch(body, content_type='application/x-ndjson')
+        self.assertEqual(len(results), 2)
+        self.assertTrue(results[0]['success'])
+        self.assertIn('Invalid JSON', results[1]['error'])
+
+    def test_rejects_non_array_bodies(self):
+        self.assertEqual(self.submit_batch({'answers': []}).status_code, 400)
+        with mock.patch('apps.quiz_app.api_views.MAX_SUBMISSIONS', 1):
+            self.assertEqual(self.submit_batch([{}, {}]).status_code, 400)
+
+    def test_ndjson_body_read_up_to_limit(self):
+        parsed = []
+
+        def parse_ndjson(lines):
+            for line in lines:
+                parsed.append(line)
+                yield {}
+
+        with mock.patch('apps.quiz_app.api_views.MAX_SUBMISSIONS', 2):
+            with mock.patch('apps.quiz_app.api_views.parse_ndjson', parse_ndjson):
+                response = self.submit_batch('{}\n' * 100, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(parsed), 3)
+
+
+class SeededQuizTests(QuizTestCase):
+
+    def generate(self, **data):
+        data = {'subject_code': 'CSW351-AI', 'level': 'easy', 'num_questions': 5, **data}
+        return self.client.post('/api/quiz/generate/', data, content_type='application/json')
+
+    def question_ids(self, response):
+        return [question['id'] for question in response.json()['quiz']['questions']]
+
+    def test_same_seed_same_quiz(self):
+        first = self.generate(seed=42)
+        second = self.generate(seed=42)
+        self.assertEqual(self.question_ids(first), self.question_ids(second))
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertTrue(first['ETag'].startswith('W/'))
+        self.assertEqual(first.json()['quiz']['seed'], 42)
+        self.assertNotEqual(self.question_ids(self.generate(seed=43)), self.question_ids(first))
+        self.assertNotIn('ETag', self.generate())
+
+        ids = self.question_ids(first)
+        self.assertEqual([q.id for q in get_random_questions('CSW351-AI', 'easy', 5, seed=42)],
+                         [q.id for q in get_random_questions('CSW351-AI', 'easy', 5, seed=42)])
+
+        # Editing one of the questions changes the ETag, not the questions
+        question = Question.objects.get(id=ids[0])
+        question.explanation = 'Updated'
+        question.save()
+        third = self.generate(seed=42)
+        self.assertEqual(self.question_ids(third), ids)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+    def test_questions_api_conditional_get(self):
+        params = {'subject_code': 'CSW351-AI', 'level': 'hard', 'limit': 3, 'seed': 7}
+        response = self.client.get('/api/questions/', params)
+        etag = response['ETag']
+        response = self.client.get('/api/questions/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get('/api/questions/', {**params, 'seed': 'x'}).status_code, 400)
+
+    def test_take_quiz_with_seed(self):
+        url = reverse('quiz:take_quiz', args=['CSW351-AI', 'easy'])
+        response = self.client.get(url, {'seed': 5})
+        questions = [question.id for question in response.context['questions']]
+        response = self.client.get(url, {'seed': 5})
+        self.assertEqual([question.id for question in response.context['questions']], questions)
+        response = self.client.get(url, {'seed': 5}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {'seed': '-1'}).status_code, 400)
+
+
+class QuestionSearchTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.neural = make_question(self.ai, 'hard', 90)
+        self.neural.question_text = 'Which layer of a neural network comes first?'
+        self.neural.option_c = 'Input layer'
+        self.neural.save()
+        self.other = make_question(self.web, 'medium', 91)
+        self.other.question_text = 'Which tag starts a network request form?'
+        self.other.save()
+
+    def find(self, **params):
+        return self.client.get('/api/questions/search/', params).json()
+
+    def check_search(self):
+        data = self.find(q='network')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(set(data['questions'][0]), {'id', 'question_text', 'options'})
+        # Last word matches as a prefix, all words must match
+        self.assertEqual([q['id'] for q in self.find(q='neural netw')['questions']], [self.neural.id])
+        self.assertEqual(self.find(q='input layer')['count'], 1)
+        self.assertEqual(self.find(q='network', subject_code='INT341-WEB')['count'], 1)
+        self.assertEqual(self.find(q='network', level='hard')['questions'][0]['id'], self.neural.id)
+        self.assertEqual(self.find(q='network', subject_code='UNKNOWN')['count'], 0)
+        self.assertEqual(self.find(q='"(*')['count'], 0)
+
+        # Ranking and paging over questions 1-15 of AI easy plus two more
+        data = self.find(q='question', page_size=10, page=2)
+        self.assertEqual((data['count'], data['num_pages'], len(data['questions'])), (23, 3, 10))
+
+        # Kept in sync with edits and deletes
+        self.neural.question_text = 'Which layer of a perceptron comes first?'
+        self.neural.save()
+        self.assertEqual(self.find(q='neural')['count'], 0)
+        self.assertEqual(self.find(q='perceptron')['count'], 1)
+        self.neural.delete()
+        self.assertEqual(self.find(q='perceptron')['count'], 0)
+
+    def test_fts5_search(self):
+        if not search.use_fts():
+            self.skipTest('SQLite without FTS5')
+        self.check_search()
+
+    @override_settings(QUIZ_SEARCH_BACKEND='python')
+    def test_python_search(self):
+        self.check_search()
+
+    @override_settings(QUIZ_SEARCH_BACKEND='python')
+    def test_python_index_is_synced_incrementally(self):
+        self.assertEqual(self.find(q='network')['count'], 2)
+        index = search.python_index._entry[1]
+        # Edits that bypass signals, as seen by another process
+        Question.objects.filter(pk=self.other.pk).update(
+            question_text='Which tag starts a perceptron form?', updated_at=timezone.now()
+        )
+        Question.objects.filter(pk=self.neural.pk).delete()
+        versioning.bump_subject_version(self.web.id, self.ai.id)
+        # Newest stamp, rows updated since, ids
+        with self.assertNumQueries(3):
+            self.assertEqual(search.search_questions('perceptron'), (1, [self.other.pk]))
+        self.assertIs(search.python_index._entry[1], index)
+        self.assertEqual(search.search_questions('network'), (0, []))
+        self.assertNotIn('neural', index.terms)
+        rebuilt = search.InvertedIndex(search._index_rows(Question.objects.all()))
+        self.assertEqual((index.postings, index.terms), (rebuilt.postings, rebuilt.terms))
+
+    @override_settings(QUIZ_SEARCH_BACKEND='python')
+    def test_python_filter_is_capped(self):
+        with mock.patch.object(search, 'FILTER_LIMIT', 3):
+            self.assertEqual(Question.objects.filter(search.search_filter('question')).count(), 3)
+
+    def test_validation(self):
+        self.assertEqual(self.client.get('/api/questions/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/questions/search/', {'q': 'x', 'page_size': 500}).status_code, 400)
+
+    def test_imported_questions_are_indexed(self):
+        import_rows([(1, {
+            'subject_code': 'CSW351-AI', 'level': 'easy', 'question_text': 'What does a transformer attend to?',
+            'option_a': 'Tokens', 'option_b': 'Pixels', 'option_c': 'Rows', 'option_d': 'Files',
+            'correct_answer': 'A', 'explanation': '',
+        })], log=lambda message: None)
+        self.assertEqual(self.find(q='transformer')['count'], 1)
+        self.assertEqual(call_command('rebuild_search_index', stdout=StringIO()), None)
+        self.assertEqual(self.find(q='transformer')['count'], 1)
+
+    def test_admin_search(self):
+        model_admin = QuestionAdmin(Question, admin.site)
+        request = RequestFactory().get('/')
+        queryset, _ = model_admin.get_search_results(request, Question.objects.all(), 'neural')
+        self.assertEqual(list(queryset), [self.neural])
+        queryset, _ = model_admin.get_search_results(request, Question.objects.all(), 'INT341')
+        self.assertEqual(queryset.count(), 4)
+
+
+class QuestionListingTests(QuizTestCase):
+
+    def ordered_ids(self, **filters):
+        return list(Question.objects.filter(**filters).order_by('subject_id', 'level', 'id').values_list('id', flat=True))
+
+    def pages(self, **params):
+        ids, cursor, pages = [], '', 0
+        while cursor is not None:
+            data = self.client.get('/api/questions/', {**params, 'cursor': cursor, 'page_size': 4}).json()
+            self.assertTrue(data['success'])
+            ids += [question['id'] for question in data['questions']]
+            cursor = data['next_cursor']
+            pages += 1
+        return ids, pages
+
+    def test_cursor_pages_follow_index_order(self):
+        self.assertEqual(self.pages(), (self.ordered_ids(), 6))
+        self.assertEqual(self.pages(subject_code='CSW351-AI')[0], self.ordered_ids(subject=self.ai))
+        self.assertEqual(self.pages(level='hard')[0], self.ordered_ids(level='hard'))
+        self.assertEqual(self.pages(subject_code='CSW351-AI', level='easy')[0],
+                         self.ordered_ids(subject=self.ai, level='easy'))
+        self.assertEqual(self.pages(subject_code='UNKNOWN'), ([], 1))
+
+    def test_pages_are_stable_across_changes(self):
+        first = self.client.get('/api/questions/', {'page_size': 4}).json()
+        Question.objects.filter(id=first['questions'][0]['id']).delete()
+        data = self.client.get('/api/questions/', {'page_size': 4, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([question['id'] for question in data['questions']], self.ordered_ids()[3:7])
+
+    def test_ndjson_streams_every_question(self):
+        with mock.patch.object(listing, 'CHUNK_SIZE', 5):
+            response = self.client.get('/api/questions/', {'format': 'ndjson', 'subject_code': 'CSW351-AI'})
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.ordered_ids(subject=self.ai))
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'question_text', 'options'})
+
+        cursor = listing.encode_cursor(self.ai.id, 'hard', self.ordered_ids(subject=self.ai)[-2])
+        response = self.client.get('/api/questions/', {'format': 'ndjson', 'cursor': cursor})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 4)
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'cursor': 'nope'}, {'format': 'ndjson', 'cursor': 'bm9wZQ'}, {'limit': 101},
+                       {'page_size': 501}, {'cursor': '', 'seed': 1}, {'level': 'expert'}):
+            response = self.client.get('/api/questions/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertFalse(json.loads(response.content)['success'])
+
+
+class ExportTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for i, question in enumerate(Question.objects.filter(subject=self.web).order_by('id')):
+            question.question_text = f'Ünïcode, "quoted"\nline {i}'
+            question.save()
+
+    def export(self, name, *args, **options):
+        stdout = StringIO()
+        path = os.path.join(self.directory, name)
+        call_command('export_questions', path, *args, stdout=stdout, **options)
+        return path, stdout.getvalue()
+
+    def expected(self):
+        return [
+            {'id': question.id, **{field: getattr(question, field) for field in exporters.FIELDS[1:]},
+             'subject_code': question.subject.code}
+            for question in Question.objects.select_related('subject').order_by('subject_id', 'level', 'id')
+        ]
+
+    def test_csv_round_trips_through_import(self):
+        with self.assertNumQueries(2):
+            path, output = self.export('bank.csv')
+        self.assertIn('Exported 23 questions to 1 file(s)', output)
+        self.assertIn('rows/sec', output)
+
+        stdout = StringIO()
+        call_command('import_questions', path, workers=1, stdout=stdout)
+        self.assertIn('created: 0, updated: 0, unchanged: 23', stdout.getvalue())
+
+    def test_ndjson_gzip(self):
+        path, _ = self.export('bank.ndjson.gz', format='ndjson', gzip=6)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], self.expected())
+
+    def test_columnar_round_trip(self):
+        with mock.patch.object(exporters, 'ROW_GROUP_SIZE', 7):
+            path, _ = self.export('bank.qcol', format='columnar')
+        with open(path, 'rb') as f:
+            self.assertEqual(list(exporters.read_columnar(f)), self.expected())
+        with open(path, 'rb') as f, self.assertRaises(ValueError):
+            list(exporters.read_columnar(io.BytesIO(f.read()[:-3])))
+
+    def test_shard_by_subject(self):
+        path, output = self.export('shards', '--shard-by-subject', '--gzip', '1', subjects=['INT341-WEB', 'CSW351-AI'])
+        self.assertEqual(sorted(os.listdir(path)), ['CSW351-AI.csv.gz', 'INT341-WEB.csv.gz'])
+        self.assertIn('Exported 23 questions to 2 file(s)', output)
+        with gzip.open(os.path.join(path, 'INT341-WEB.csv.gz'), 'rt', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['question_text'] for row in rows], [f'Ünïcode, "quoted"\nline {i}' for i in range(3)])
+
+        with self.assertRaises(CommandError):
+            self.export('missing.csv', subjects=['NOPE'])
+
+    def test_shard_names_are_unique(self):
+        # Same file name as INT341-WEB on case-insensitive file systems
+        clash = Subject.objects.create(code='int341-web', name='Clash')
+        make_question(clash, 'easy', 1)
+        path, output = self.export('shards', '--shard-by-subject')
+        self.assertEqual(
+            sorted(os.listdir(path)), ['CSW351-AI.csv', f'INT341-WEB-{self.web.id}.csv', f'int341-web-{clash.id}.csv']
+        )
+        self.assertIn('Exported 24 questions to 3 file(s)', output)
+        self.assertEqual(
+            exporters.shard_names({1: 'ab', 2: 'AB', 3: 'c/d'}), {'ab': 'ab-1', 'AB': 'AB-2', 'c/d': 'c_d'}
+        )
+
+    def test_subject_created_during_export(self):
+        late = Subject.objects.create(code='LATE', name='Late')
+        make_question(late, 'easy', 1)
+        # The subject map was loaded before the subject existed
+        subject_codes = {self.ai.id: self.ai.code, self.web.id: self.web.code}
+        rows = list(exporters.export_rows(subject_codes=subject_codes))
+        self.assertEqual(rows[-1][1][0], 'LATE')
+        self.assertEqual(subject_codes[late.id], 'LATE')
+
+
+class SnapshotTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'bank.snapshot')
+        question = Question.objects.filter(subject=self.web).first()
+        question.question_text = 'Ünïcode "text"'
+        question.explanation = 'Because'
+        question.save()
+        stdout = StringIO()
+        call_command('build_question_snapshot', self.path, stdout=stdout)
+        self.assertIn('Wrote 23 questions', stdout.getvalue())
+
+    def test_snapshot_matches_database(self):
+        snapshot = Snapshot(self.path)
+        ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(list(snapshot.ids), ids)
+        self.assertEqual(list(snapshot.pool(self.ai.id, 'hard')), ids[15:20])
+        self.assertEqual(list(snapshot.pool(self.web.id, 'hard')), [])
+        self.assertEqual(snapshot.answer_keys(ids + [0]), answer_keys.lookup_many(ids + [0]))
+        self.assertEqual(snapshot.fragments(ids + [0]), dict(zip(ids, question_fragments(ids))))
+        question = snapshot.in_bulk([ids[-1]])[ids[-1]]
+        self.assertEqual(
+            QuestionDeliverySerializer(question).data, QuestionDeliverySerializer(Question.objects.get(id=ids[-1])).data
+        )
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(200)
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.path)
+
+    def test_generate_and_grade_without_queries(self):
+        with self.settings(QUIZ_SNAPSHOT_PATH=self.path), self.deferred_attempts():
+            # Opening checks the snapshot against the database once
+            with self.assertNumQueries(1):
+                self.assertIsNotNone(snapshots.get())
+            with self.assertNumQueries(0):
+                self.assertEqual(len(decks.build_deck(self.ai, 'easy', 10)['questions']), 10)
+                quiz = decks.build_seeded_deck(self.ai, 'hard', 3, seed=7)
+                result = grade_answers([(question['id'], 'B') for question in quiz['questions']])
+            self.assertEqual(result['correct_count'], 3)
+
+            # Any change to the bank falls back to the database until a rebuild
+            Question.objects.filter(subject=self.ai, level='hard').first().delete()
+            self.assertEqual(len(sampler.get_pool(self.ai.id, 'hard')), 4)
+            call_command('build_question_snapshot', stdout=StringIO())
+            self.assertIsNotNone(snapshots.get())
+            with self.assertNumQueries(0):
+                self.assertEqual(len(sampler.get_pool(self.ai.id, 'hard')), 4)
+
+    def test_edit_before_worker_start_falls_back_to_database(self):
+        question = Question.objects.filter(subject=self.ai, level='easy').first()
+        question.correct_answer = 'B'
+        question.save()
+        # A new worker with its own cache sees the first bank version
+        cache.clear()
+        snapshots.clear()
+        with self.settings(QUIZ_SNAPSHOT_PATH=self.path):
+            self.assertIsNone(snapshots.get())
+            self.assertTrue(grade_answers([(question.id, 'B')])['results'][0]['is_correct'])
+            # A stale file is not checked again on later version changes
+            versioning.bump_subject_version(self.ai.id)
+            with self.assertNumQueries(0):
+                self.assertIsNone(snapshots.get())
+
+            call_command('build_question_snapshot', stdout=StringIO())
+            self.assertIsNotNone(snapshots.get())
+            self.assertTrue(grade_answers([(question.id, 'B')])['results'][0]['is_correct'])
+
+    def test_snapshot_survives_version_changes_without_edits(self):
+        with self.settings(QUIZ_SNAPSHOT_PATH=self.path):
+            snapshot = snapshots.get()
+            # e.g. another process's check re-announcing a change already built in
+            versioning._bump_cached([self.ai.id])
+            with self.assertNumQueries(1):
+                self.assertIs(snapshots.get(), snapshot)
+            with self.assertNumQueries(0):
+                self.assertIs(snapshots.get(), snapshot)
+
+    def test_seeded_quizzes_match_database(self):
+        without = decks.build_seeded_deck(self.ai, 'easy', 5, seed=3)
+        with self.settings(QUIZ_SNAPSHOT_PATH=self.path):
+            self.assertEqual(decks.build_seeded_deck(self.ai, 'easy', 5, seed=3), without)
+        with self.settings(QUIZ_SNAPSHOT_PATH=self.path + '.missing'):
+            self.assertIsNone(snapshots.get())
+
+
+class DuplicateQuestionTests(QuizTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.subject = Subject.objects.create(code='DUP101', name='Duplicates')
+        texts = [
+            ('What is the time complexity of binary search on a sorted array?',
+             ['O(log n)', 'O(n)', 'O(n log n)', 'O(1)']),
+            ('What is the time complexity of a binary search on a sorted array?',
+             ['O(n)', 'O(log n)', 'O(1)', 'O(n log n)']),
+            ('Which HTTP status code means that the requested resource was not found?',
+             ['200', '301', '404', '500']),
+            ('Which protocol is used to send email between mail servers?',
+             ['SMTP', 'FTP', 'SSH', 'DNS']),
+        ]
+        self.questions = []
+        for text, options in texts:
+            self.questions.append(Question.objects.create(
+                subject=self.subject, question_text=text, option_a=options[0], option_b=options[1],
+                option_c=options[2], option_d=options[3], correct_answer='A', level='medium'
+            ))
+
+    def test_finds_paraphrases_only(self):
+        first, second = self.questions[:2]
+        clusters = find_duplicates([self.subject.id])
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual([question_id for question_id, _ in clusters[0]], [first.id, second.id])
+        self.assertGreaterEqual(clusters[0][1][1], 0.6)
+        self.assertEqual(clusters[0][0][1], 1.0)
+
+        # Other subjects are only compared with --across-subjects
+        copy = Question.objects.create(
+            subject=self.web, question_text=first.question_text, option_a='O(log n)', option_b='O(n)',
+            option_c='O(n log n)', option_d='O(1)', correct_answer='A', level='medium'
+        )
+        for across_subjects, expected in ((False, [first.id, second.id]), (True, [first.id, second.id, copy.id])):
+            clusters = find_duplicates([self.subject.id, self.web.id], across_subjects=across_subjects)
+            cluster = next(cluster for cluster in clusters if cluster[0][0] == first.id)
+            self.assertEqual([question_id for question_id, _ in cluster], expected)
+
+        # ...and never merged across them
+        merges, skipped = plan_merges([cluster])
+        self.assertEqual(merges, [(first.id, [second.id])])
+        self.assertEqual(skipped, [(copy.id, first.id, 'it belongs to another subject')])
+        with self.assertRaises(CommandError):
+            call_command('find_duplicate_questions', '--across-subjects', '--merge', stdout=StringIO())
+
+    def test_signatures_estimate_jaccard(self):
+        perms = permutations(256)
+        a = shingle_hashes('one two three four five six seven eight')
+        b = shingle_hashes('one two three four five six seven nine')
+        finder = DuplicateFinder(num_perm=256, bands=64)
+        finder.add(*sign_rows([(1, 0, 'x', '', '', '', ''), (2, 0, 'y', '', '', '', '')], 256))
+        self.assertEqual(len(signature(a, perms)), 256)
+        # 6 shared bigrams out of 8
+        estimate = sum(x == y for x, y in zip(signature(a, perms), signature(b, perms))) / 256
+        self.assertAlmostEqual(estimate, 0.75, delta=0.1)
+        self.assertEqual(finder.similarity(0, 1), 0.0)
+
+    def test_merge_moves_history(self):
+        first, second = self.questions[:2]
+        record_attempt(grade_answers([(first.id, 'A'), (second.id, 'B')]), 'DUP101', 'medium')
+        stdout = StringIO()
+        call_command('find_duplicate_questions', 'DUP101', '--merge', workers=1, stdout=stdout)
+        self.assertIn('1 group(s), 1 near-duplicate(s) among 4 questions', stdout.getvalue())
+        self.assertFalse(Question.objects.filter(id=second.id).exists())
+        self.assertEqual(AttemptAnswer.objects.filter(question=first).count(), 2)
+        self.assertEqual(QuestionAnalytics.objects.get(question=first).attempt_count, 2)
+        self.assertEqual(QuestionStats.objects.get(subject=self.subject, level='medium').question_count, 3)
+
+        with self.assertRaises(CommandError):
+            call_command('find_duplicate_questions', 'NOPE', stdout=StringIO())
+
+    def test_merge_skips_chained_and_conflicting_members(self):
+        # B is similar to A and C, but A and C are not similar; D copies A with another answer
+        a, b, c, d = self.questions
+        d.correct_answer = 'B'
+        d.save()
+        signature_a = list(range(16))
+        signature_b = signature_a[:12] + [100, 101, 102, 103]
+        signature_c = [200, 201, 202, 203] + signature_b[4:]
+        finder = DuplicateFinder(num_perm=16, bands=4)
+        finder.add(
+            [a.id, b.id, c.id, d.id], [self.subject.id] * 4, signature_a + signature_b + signature_c + signature_a
+        )
+        clusters = finder.clusters()
+        self.assertEqual(clusters, [[(a.id, 1.0), (b.id, 0.75), (c.id, 0.5), (d.id, 1.0)]])
+
+        merges, skipped = plan_merges(clusters)
+        self.assertEqual(merges, [(a.id, [b.id])])
+        self.assertEqual([(question_id, keeper) for question_id, keeper, _ in skipped], [(c.id, a.id), (d.id, a.id)])
+        self.assertEqual(merge_duplicates(merges), 1)
+        remaining = set(Question.objects.filter(subject=self.subject).values_list('id', flat=True))
+        self.assertEqual(remaining, {a.id, c.id, d.id})
+
+    def test_import_reports_duplicates(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'bank.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(CSV_HEADER)
+            f.write('DUP101,hard,Which protocol is used for sending email between mail servers?,'
+                    'SMTP,FTP,SSH,DNS,A,\n')
+        stdout = StringIO()
+        call_command('import_questions', path, '--find-duplicates', workers=1, stdout=stdout)
+        self.assertIn('1 group(s) of near-duplicates include imported questions', stdout.getvalue())
+        self.assertIn(f'#{self.questions[3].id}, #', stdout.getvalue())
+        self.assertIn('(new)', stdout.getvalue())
+
+
+class AsyncApiTests(QuizTestCase):
+
+    async def test_subjects_match_sync_view(self):
+        response = await self.async_client.get('/api/async/subjects/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), (await self.async_client.get('/api/subjects/')).json())
+
+    async def test_generate_and_submit(self):
+        response = await self.async_client.post(
+            '/api/async/quiz/generate/', {'subject_code': 'CSW351-AI', 'level': 'hard', 'num_questions': 3},
+            content_type='application/json'
+        )
+        quiz = response.json()['quiz']
+        self.assertEqual(quiz['num_questions'], 3)
+        self.assertEqual(set(quiz['questions'][0]), {'id', 'question_text', 'options'})
+
+        answers = [{'question_id': question['id'], 'selected_answer': 'B'} for question in quiz['questions'][:2]]
+        response = await self.async_client.post(
+            '/api/async/quiz/submit/', {'token': quiz['token'], 'answers': answers}, content_type='application/json'
+        )
+        result = response.json()['quiz_result']
+        self.assertEqual((result['total_questions'], result['correct_count']), (3, 2))
+        attempt = await QuizAttempt.objects.select_related('subject').aget()
+        self.assertEqual((attempt.subject.code, attempt.level, attempt.correct_count), ('CSW351-AI', 'hard', 2))
+
+    async def test_errors(self):
+        post = self.async_client.post
+        response = await post('/api/async/quiz/generate/', {'subject_code': 'UNKNOWN', 'level': 'easy'},
+                              content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = await post('/api/async/quiz/generate/', {'subject_code': 'CSW351-AI', 'level': 'medium'},
+                              content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = await post('/api/async/quiz/generate/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = await post('/api/async/quiz/submit/', {'answers': [{'question_id': 0, 'selected_answer': 'A'}]},
+                              content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual((await self.async_client.get('/api/async/quiz/submit/')).status_code, 405)
+
+    async def test_health(self):
+        data = (await self.async_client.get('/api/async/health/')).json()
+        self.assertEqual(data['status'], 'healthy')
+        self.assertIn('depth', data['attempt_writer'])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'quiz_test_cache'}
+})
+class AsyncDatabaseCacheTests(QuizTestCase):
+    """Async views must not call a synchronous cache backend from the event loop"""
+
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        super().setUp()
+
+    async def test_generate_and_submit(self):
+        for _ in range(2):
+            response = await self.async_client.post(
+                '/api/async/quiz/generate/', {'subject_code': 'CSW351-AI', 'level': 'hard', 'num_questions': 3},
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        quiz = response.json()['quiz']
+        answers = [{'question_id': question['id'], 'selected_answer': 'B'} for question in quiz['questions']]
+        for _ in range(2):
+            response = await self.async_client.post(
+                '/api/async/quiz/submit/', {'token': quiz['token'], 'answers': answers}, content_type='application/json'
+            )
+            self.assertEqual(response.json()['quiz_result']['correct_count'], 3)
@@ -24,4 +24,5 @@ urlpatterns = [
     path('chatbot/select-subject/', chatbot_views.chatbot_select_subject, name='chatbot_select_subject'),
     path('chatbot/select-difficulty/', chatbot_views.chatbot_select_difficulty, name='chatbot_select_difficulty'),
     path('chatbot/start-quiz/', chatbot_views.chatbot_start_quiz, name='chatbot_start_quiz'),
+    path('chatbot/adaptive/', chatbot_views.chatbot_adaptive_quiz, name='chatbot_adaptive_quiz'),
 ]
@@ -0,0 +1,183 @@
+"""
+Question Bank Versions
+======================
+
+Monotonic version counters for the question bank.
+
+In-process caches (sampling index, answer keys, deck pools, the snapshot)
+remember the version they were built from and rebuild themselves when it
+changes. The counters live in Django's cache framework, so processes that
+share a cache backend see each other's changes at once. Grading reads
+answer keys through these caches: with several worker processes, use a
+shared backend (database, memcached, redis), or a worker may keep grading
+against answers that were edited in another process.
+
+Every bump is also written to the BankVersion table (one row for the bank
+and one per subject). As a bound on staleness without a shared cache,
+each process reads the bank row, a single primary key lookup, at most
+every ``QUIZ_VERSION_CHECK_SECONDS`` seconds; when it moved, the subject
+rows are read and the cached counters of the subjects that changed are
+bumped. Code that writes questions without the model signals or the
+importer must call bump_subject_version() itself.
+
+Async code reads versions with the ``a``-prefixed functions, which use
+the cache's async API so that no synchronous cache call (a query with the
+database backend) runs on the event loop.
+"""
+
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import BankVersion
+
+BANK_VERSION_KEY = 'quiz:version:bank'
+SUBJECT_VERSION_KEY = 'quiz:version:subject:{}'
+# BankVersion rows, and the cache keys of the row versions last seen
+BANK_ROW = 'bank'
+SUBJECT_ROW = 'subject:{}'
+SEEN_ROW_KEY = 'quiz:version:seen:{}'
+DEFAULT_CHECK_SECONDS = 30
+
+_check_lock = threading.Lock()
+_last_check = None
+
+
+def _get(key):
+    return cache.get(key, 0)
+
+
+async def _aget(key):
+    return await cache.aget(key, 0)
+
+
+def _bump(key):
+    # add() is a no-op if the counter already exists; incr() is atomic on
+    # backends that support it (locmem, memcached, redis)
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Counter was evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def _record(subject_ids):
+    """Increment the BankVersion rows of the bank and the given subjects"""
+    keys = [BANK_ROW] + [SUBJECT_ROW.format(subject_id) for subject_id in subject_ids]
+    with transaction.atomic():
+        for key in keys:
+            row = BankVersion.objects.filter(key=key)
+            if not row.update(version=F('version') + 1):
+                BankVersion.objects.bulk_create([BankVersion(key=key)], ignore_conflicts=True)
+                row.update(version=F('version') + 1)
+
+
+def _bump_cached(subject_ids):
+    for subject_id in subject_ids:
+        _bump(SUBJECT_VERSION_KEY.format(subject_id))
+    return _bump(BANK_VERSION_KEY)
+
+
+def check_versions():
+    """
+    Bump the cached versions of subjects whose BankVersion row moved since
+    this cache last saw it; returns their ids.
+    """
+    seen_bank = cache.get(SEEN_ROW_KEY.format(BANK_ROW))
+    bank = BankVersion.objects.filter(key=BANK_ROW).values_list('version', flat=True).first()
+    if bank is None or bank == seen_bank:
+        return []
+    rows = dict(BankVersion.objects.values_list('key', 'version'))
+    seen = cache.get_many([SEEN_ROW_KEY.format(key) for key in rows])
+    changed = [key for key, version in rows.items() if seen.get(SEEN_ROW_KEY.format(key)) != version]
+    subject_ids = [int(key.split(':')[1]) for key in changed if key != BANK_ROW]
+    _bump_cached(subject_ids)
+    cache.set_many({SEEN_ROW_KEY.format(key): rows[key] for key in changed}, timeout=None)
+    return subject_ids
+
+
+def get_database_version():
+    """Version of the whole question bank in the BankVersion table"""
+    return BankVersion.objects.filter(key=BANK_ROW).values_list('version', flat=True).first() or 0
+
+
+def _check_due():
+    """True at most once every QUIZ_VERSION_CHECK_SECONDS in this process"""
+    global _last_check
+    seconds = getattr(settings, 'QUIZ_VERSION_CHECK_SECONDS', DEFAULT_CHECK_SECONDS)
+    if seconds is None:
+        return False
+    now = time.monotonic()
+    with _check_lock:
+        if _last_check is not None and now - _last_check < seconds:
+            return False
+        _last_check = now
+    return True
+
+
+def _maybe_check():
+    if _check_due():
+        check_versions()
+
+
+async def _amaybe_check():
+    if _check_due():
+        await sync_to_async(check_versions)()
+
+
+def get_bank_version():
+    """Version of the whole question bank"""
+    _maybe_check()
+    return _get(BANK_VERSION_KEY)
+
+
+def get_subject_version(subject_id):
+    """Version of one subject's questions (bank version if subject_id is None)"""
+    if subject_id is None:
+        return get_bank_version()
+    _maybe_check()
+    return _get(SUBJECT_VERSION_KEY.format(subject_id))
+
+
+def get_subject_versions(subject_ids):
+    """Versions of several subjects with a single cache round trip"""
+    _maybe_check()
+    keys = {subject_id: SUBJECT_VERSION_KEY.format(subject_id) for subject_id in subject_ids}
+    values = cache.get_many(keys.values())
+    return {subject_id: values.get(key, 0) for subject_id, key in keys.items()}
+
+
+async def aget_bank_version():
+    """Async get_bank_version()"""
+    await _amaybe_check()
+    return await _aget(BANK_VERSION_KEY)
+
+
+async def aget_subject_version(subject_id):
+    """Async get_subject_version()"""
+    if subject_id is None:
+        return await aget_bank_version()
+    await _amaybe_check()
+    return await _aget(SUBJECT_VERSION_KEY.format(subject_id))
+
+
+async def aget_subject_versions(subject_ids):
+    """Async get_subject_versions()"""
+    await _amaybe_check()
+    keys = {subject_id: SUBJECT_VERSION_KEY.format(subject_id) for subject_id in subject_ids}
+    values = await cache.aget_many(keys.values())
+    return {subject_id: values.get(key, 0) for subject_id, key in keys.items()}
+
+
+def bump_subject_version(*subject_ids):
+    """Mark questions of the given subjects (and the whole bank) as changed"""
+    subject_ids = {subject_id for subject_id in subject_ids if subject_id is not None}
+    _record(subject_ids)
+    return _bump_cached(subject_ids)
@@ -1,7 +1,15 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.utils.cache import get_conditional_response
 import json
-from .models import Subject, Question, get_random_questions, get_all_subjects, get_subject_levels
+from .models import Subject, Question, get_all_subjects
+from .attempts import record_attempt
+from .catalog import build_catalog, get_level_counts, levels_info
+from .decks import pop_deck
+from .grading import QuestionNotFound, grade_answers
+from .fragments import questions_etag
+from .sampling import sample_questions, seeded_question_ids
+from .serializers import CheckAnswersSerializer
 
 
 def home(request):
@@ -18,18 +26,9 @@ def home(request):
 def select_difficulty(request, subject_code):
     """Select difficulty level for the chosen subject"""
     subject = get_object_or_404(Subject, code=subject_code)
-    available_levels = get_subject_levels(subject_code)
     
     # Count questions per level
-    levels_data = []
-    for level in ['easy', 'medium', 'hard']:
-        count = subject.questions_by_level(level).count()
-        if count > 0:
-            levels_data.append({
-                'level': level,
-                'display': level.title(),
-                'count': count
-            })
+    levels_data = levels_info(get_level_counts([subject.id]).get(subject.id, {}))
     
     context = {
         'subject': subject,
@@ -45,8 +44,28 @@ def take_quiz(request, subject_code, level):
     """
     subject = get_object_or_404(Subject, code=subject_code)
     
-    # Get 10 random questions
-    questions = get_random_questions(subject_code, level, num_questions=10)
+    # ?seed=N always shows the same questions while they are unchanged
+    seed = request.GET.get('seed')
+    etag = None
+    if seed is not None:
+        if not seed.isdigit():
+            return HttpResponseBadRequest('seed must be a non-negative integer')
+        seed = int(seed)
+        ids = seeded_question_ids(subject.id, level, 10, seed)
+        etag = questions_etag(ids, subject_code, level, seed)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+    else:
+        # Get 10 random questions, in the order of a pre-built deck if one is available
+        deck = pop_deck(subject, level, num_questions=10)
+        ids = [question['id'] for question in deck['questions']] if deck else None
+    
+    if ids is not None:
+        rows = Question.objects.filter(subject=subject).select_related('subject').order_by().in_bulk(ids)
+        questions = [rows[question_id] for question_id in ids if question_id in rows]
+    else:
+        questions = sample_questions(subject.id, level, num_questions=10)
     
     if not questions:
         context = {
@@ -61,56 +80,10 @@ def take_quiz(request, subject_code, level):
         'questions': questions,
         'total_questions': len(questions),
     }
-    return render(request, 'quiz.html', context)
-
-
-def check_answers(request):
-    """
-    Check answers via AJAX
-    Returns immediate feedback without saving to database
-    """
-    if request.method != 'POST':
-        return JsonResponse({'error': 'Invalid request method'}, status=400)
-    
-    # Get submitted answers
-    import json
-    data = json.loads(request.body)
-    answers = data.get('answers', {})
-    
-    # Check each answer
-    results = []
-    correct_count = 0
-    
-    for question_id, selected_option in answers.items():
-        try:
-            question = Question.objects.get(id=question_id)
-            is_correct = question.check_answer(selected_option)
-            
-            if is_correct:
-                correct_count += 1
-            
-            results.append({
-                'question_id': question_id,
-                'selected': selected_option,
-                'correct_answer': question.correct_answer,
-                'is_correct': is_correct,
-                'explanation': question.explanation,
-            })
-        except Question.DoesNotExist:
-            continue
-    
-    total_questions = len(answers)
-    percentage = (correct_count / total_questions * 100) if total_questions > 0 else 0
-    
-    response_data = {
-        'success': True,
-        'correct_count': correct_count,
-        'total_questions': total_questions,
-        'percentage': round(percentage, 2),
-        'results': results,
-    }
-    
-    return JsonResponse(response_data)
+    response = render(request, 'quiz.html', context)
+    if etag:
+        response['ETag'] = etag
+    return response
 
 
 def check_answers(request):
@@ -119,38 +92,40 @@ def check_answers(request):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        data = json.loads(request.body)
-        answers = data.get('answers', {})
+        serializer = CheckAnswersSerializer(data=json.loads(request.body))
+        if not serializer.is_valid():
+            return JsonResponse({'error': 'Invalid request', 'errors': serializer.errors}, status=400)
+        data = serializer.validated_data
+        answers = data['answers']
         
-        results = []
-        correct_count = 0
+        try:
+            graded = grade_answers(
+                (int(question_id), selected_answer)
+                for question_id, selected_answer in answers.items()
+            )
+        except QuestionNotFound as e:
+            return JsonResponse({'error': f'Question {e.question_id} not found'}, status=404)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid question ID'}, status=400)
         
-        for question_id, selected_answer in answers.items():
-            try:
-                question = Question.objects.get(id=int(question_id))
-                is_correct = selected_answer == question.correct_answer
-                
-                if is_correct:
-                    correct_count += 1
-                
-                results.append({
-                    'question_id': question_id,
-                    'selected': selected_answer,
-                    'correct_answer': question.correct_answer,
-                    'is_correct': is_correct
-                })
-                
-            except Question.DoesNotExist:
-                return JsonResponse({'error': f'Question {question_id} not found'}, status=404)
+        # Saved in the background, after the response
+        record_attempt(graded, data.get('subject_code') or None, data.get('level'), source='web')
         
-        total_questions = len(results)
-        percentage = (correct_count / total_questions) * 100 if total_questions > 0 else 0
+        results = [
+            {
+                'question_id': question_id,
+                'selected': result['selected_answer'],
+                'correct_answer': result['correct_answer'],
+                'is_correct': result['is_correct']
+            }
+            for question_id, result in zip(answers, graded['results'])
+        ]
         
         response_data = {
-            'total_questions': total_questions,
-            'correct_count': correct_count,
-            'incorrect_count': total_questions - correct_count,
-            'percentage': round(percentage, 2),
+            'total_questions': graded['total_questions'],
+            'correct_count': graded['correct_count'],
+            'incorrect_count': graded['incorrect_count'],
+            'percentage': graded['percentage'],
             'results': results
         }
         
@@ -164,24 +139,7 @@ def check_answers(request):
 
 def quiz_list(request):
     """List all subjects with their available levels"""
-    subjects = get_all_subjects()
-    
-    subjects_data = []
-    for subject in subjects:
-        levels_info = []
-        for level in ['easy', 'medium', 'hard']:
-            count = subject.questions_by_level(level).count()
-            if count > 0:
-                levels_info.append({
-                    'level': level,
-                    'count': count
-                })
-        
-        subjects_data.append({
-            'subject': subject,
-            'levels': levels_info,
-            'total_questions': subject.total_questions()
-        })
+    subjects_data = build_catalog(get_all_subjects())
     
     context = {
         'subjects_data': subjects_data,
@@ -132,4 +132,51 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Quiz engine
+
+# Memory budget of the in-process answer key cache used for grading
+QUIZ_ANSWER_KEY_CACHE_BYTES = 64 * 1024 * 1024
+
+# Quiz decks (pre-built quiz payloads, see apps/quiz_app/decks.py) and the
+# question bank version counters (apps/quiz_app/versioning.py) live in the
+# default cache. In-process answer keys and sampling pools are only rebuilt
+# when a version changes, so correct grading after a question is edited
+# depends on every worker seeing the same counters. Locmem is per process;
+# with several workers use a shared backend such as DatabaseCache or Redis.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+QUIZ_DECK_POOL_SIZE = 20
+QUIZ_DECK_TIMEOUT = 60 * 60
+QUIZ_DECK_ASYNC_REFILL = True
+# Each process reads the bank version row of the database (one primary key
+# lookup) at most this often and, when it moved, bumps the cached versions
+# of the subjects that changed, bounding staleness without a shared cache;
+# None disables
+QUIZ_VERSION_CHECK_SECONDS = 30
+
+# Lifetime in seconds of the signed quiz tokens returned with generated quizzes
+QUIZ_TOKEN_MAX_AGE = 3 * 60 * 60
+
+# Quiz attempts are saved by a background writer (apps/quiz_app/attempts.py):
+# batches of up to QUIZ_ATTEMPT_BATCH_SIZE attempts every QUIZ_ATTEMPT_FLUSH_MS
+# milliseconds, from a queue of at most QUIZ_ATTEMPT_QUEUE_SIZE attempts.
+# Set QUIZ_ATTEMPT_WRITE_BEHIND = False to save attempts during the request.
+QUIZ_ATTEMPT_WRITE_BEHIND = True
+QUIZ_ATTEMPT_BATCH_SIZE = 500
+QUIZ_ATTEMPT_FLUSH_MS = 200
+QUIZ_ATTEMPT_QUEUE_SIZE = 10000
+
+# Question search backend (apps/quiz_app/search.py): 'fts5' uses SQLite's
+# FTS5 index table, 'python' an in-memory index, 'auto' FTS5 when available.
+QUIZ_SEARCH_BACKEND = 'auto'
+
+# Question bank snapshot (apps/quiz_app/snapshot.py): a file built with
+# `python manage.py build_question_snapshot` and memory-mapped by every
+# worker, which then samples, renders and grades questions without
+# querying the database. None disables it.
+QUIZ_SNAPSHOT_PATH = None
@@ -0,0 +1,54 @@
+"""
+Benchmark quiz grading
+Shows that the number of queries per submission stays constant as the
+number of answers grows.
+
+Run with: python scripts/benchmark_grading.py
+"""
+
+import os
+import sys
+import time
+import django
+
+# Setup Django
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_quiz_project.settings')
+django.setup()
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.quiz_app.grading import grade_answers
+from apps.quiz_app.models import Question
+
+SIZES = [1, 10, 30, 100, 300]
+REPEAT = 50
+
+
+def main():
+    question_ids = list(Question.objects.order_by('id').values_list('id', flat=True)[:max(SIZES)])
+    if not question_ids:
+        print("No questions found. Run scripts/seed_database.py first.")
+        return
+
+    print(f"{'Answers':>8} | {'Queries':>7} | {'ms/submission':>13}")
+    print("-" * 36)
+    for size in SIZES:
+        answers = [(question_id, 'A') for question_id in question_ids[:size]]
+        if len(answers) < size:
+            break
+
+        with CaptureQueriesContext(connection) as ctx:
+            grade_answers(answers)
+
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            grade_answers(answers)
+        elapsed = (time.perf_counter() - start) / REPEAT * 1000
+
+        print(f"{size:>8} | {len(ctx.captured_queries):>7} | {elapsed:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
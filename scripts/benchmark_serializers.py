@@ -0,0 +1,98 @@
+"""
+Benchmark question serialization
+Compares responses assembled from the pre-rendered fragment cache of
+delivery payloads with QuestionSerializer (as api_questions used it) and
+with QuestionDeliverySerializer (the same fields as the fragments), for
+10/30/100-question payloads.
+
+Run with: python scripts/benchmark_serializers.py
+"""
+
+import os
+import sys
+import time
+import django
+
+# Setup Django
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_quiz_project.settings')
+django.setup()
+
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from apps.quiz_app.fragments import question_fragments, render_with_questions
+from apps.quiz_app.models import Question
+from apps.quiz_app.serializers import QuestionDeliverySerializer, QuestionSerializer
+
+SIZES = [10, 30, 100]
+SECONDS = 2
+
+
+def render_with_serializer(question_ids):
+    questions = list(Question.objects.filter(id__in=question_ids))
+    data = QuestionSerializer(questions, many=True).data
+    return JSONRenderer().render({'success': True, 'count': len(questions), 'questions': data})
+
+
+def render_with_delivery_serializer(question_ids):
+    questions = list(Question.objects.filter(id__in=question_ids).only(
+        'id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d'
+    ))
+    data = QuestionDeliverySerializer(questions, many=True).data
+    return JSONRenderer().render({'success': True, 'count': len(questions), 'questions': data})
+
+
+def render_from_fragments(question_ids):
+    fragments = question_fragments(question_ids)
+    return render_with_questions({'success': True, 'count': len(fragments)}, fragments)
+
+
+def measure(render, question_ids):
+    """Return (queries per payload, payloads per second)"""
+    render(question_ids)
+    # DEBUG keeps a bounded query log; start from an empty one
+    reset_queries()
+    with CaptureQueriesContext(connection) as ctx:
+        render(question_ids)
+    queries = len(ctx.captured_queries)
+
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SECONDS:
+        render(question_ids)
+        count += 1
+    reset_queries()
+    return queries, count / (time.perf_counter() - start)
+
+
+def main():
+    question_ids = list(Question.objects.order_by('id').values_list('id', flat=True)[:max(SIZES)])
+    if not question_ids:
+        print("No questions found. Run scripts/seed_database.py first.")
+        return
+
+    # Speedups of the fragments over each serializer
+    print(
+        f"{'Questions':>9} | {'Full serializer':>20} | {'Delivery serializer':>20} | {'Fragments':>20} | "
+        f"{'vs full':>7} | {'vs delivery':>11}"
+    )
+    print("-" * 112)
+    for size in SIZES:
+        if len(question_ids) < size:
+            break
+        ids = question_ids[:size]
+        serializer_queries, serializer_rate = measure(render_with_serializer, ids)
+        delivery_queries, delivery_rate = measure(render_with_delivery_serializer, ids)
+        fragment_queries, fragment_rate = measure(render_from_fragments, ids)
+        print(
+            f"{size:>9} | {serializer_rate:>8.0f} req/s {serializer_queries:>3} q | "
+            f"{delivery_rate:>8.0f} req/s {delivery_queries:>3} q | "
+            f"{fragment_rate:>8.0f} req/s {fragment_queries:>3} q | "
+            f"{fragment_rate / serializer_rate:>6.1f}x | {fragment_rate / delivery_rate:>10.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -17,10 +17,16 @@ CORRECT: A
 EXPLANATION: AI stands for Artificial Intelligence
 ---
 
+Values in the text format may span several lines; a line that does not
+start with one of the keys above continues the previous value.
+
 Usage:
     python scripts/import_questions.py questions.csv
     or
-    python scripts/import_questions.py questions.txt
+    python scripts/import_questions.py questions.txt "drops/*.csv" --workers 4
+
+File arguments are handed to the import_questions management command
+(python manage.py import_questions --help for all options).
 """
 
 import os
@@ -33,43 +39,21 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_quiz_project.settings')
 django.setup()
 
+from django.core.management import call_command
+
 from apps.quiz_app.models import Subject, Question
+from apps.quiz_app.importers import DEFAULT_BATCH_SIZE, DEFAULT_PROGRESS_EVERY, import_csv, import_text
 
 
-def import_from_csv(filepath):
+def import_from_csv(filepath, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY):
     """Import questions from CSV file"""
     print(f"\nImporting from CSV: {filepath}")
     
-    imported = 0
-    errors = 0
-    
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            
-            for row in reader:
-                try:
-                    subject = Subject.objects.get(code=row['subject_code'])
-                    
-                    Question.objects.create(
-                        subject=subject,
-                        question_text=row['question_text'],
-                        option_a=row['option_a'],
-                        option_b=row['option_b'],
-                        option_c=row['option_c'],
-                        option_d=row['option_d'],
-                        correct_answer=row['correct_answer'].upper(),
-                        level=row['level'].lower(),
-                        explanation=row.get('explanation', '')
-                    )
-                    imported += 1
-                    print(f"✓ Imported: {row['question_text'][:60]}...")
-                    
-                except Exception as e:
-                    errors += 1
-                    print(f"✗ Error: {e}")
-        
-        print(f"\n✅ Imported {imported} questions, {errors} errors")
+        summary = import_csv(filepath, batch_size, progress_every)
+        print(f"\n✅ Imported {summary['imported']} questions, {summary['errors']} errors")
+        print(f"   created: {summary['created']}, updated: {summary['updated']}, unchanged: {summary['unchanged']}")
+        print(f"   {summary['seconds']}s ({summary['rows_per_sec']} rows/sec)")
         
     except FileNotFoundError:
         print(f"❌ File not found: {filepath}")
@@ -77,75 +61,15 @@ def import_from_csv(filepath):
         print(f"❌ Error: {e}")
 
 
-def import_from_text(filepath):
+def import_from_text(filepath, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY):
     """Import questions from text file"""
     print(f"\nImporting from text file: {filepath}")
     
-    imported = 0
-    errors = 0
-    
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Split by separator
-        questions = content.split('---')
-        
-        for q_block in questions:
-            if not q_block.strip():
-                continue
-            
-            try:
-                lines = [line.strip() for line in q_block.strip().split('\n') if line.strip()]
-                
-                data = {}
-                for line in lines:
-                    if ':' in line:
-                        key, value = line.split(':', 1)
-                        key = key.strip().upper()
-                        value = value.strip()
-                        
-                        if key == 'SUBJECT':
-                            data['subject_code'] = value
-                        elif key == 'LEVEL':
-                            data['level'] = value.lower()
-                        elif key == 'QUESTION':
-                            data['question_text'] = value
-                        elif key == 'A':
-                            data['option_a'] = value
-                        elif key == 'B':
-                            data['option_b'] = value
-                        elif key == 'C':
-                            data['option_c'] = value
-                        elif key == 'D':
-                            data['option_d'] = value
-                        elif key == 'CORRECT':
-                            data['correct_answer'] = value.upper()
-                        elif key == 'EXPLANATION':
-                            data['explanation'] = value
-                
-                # Create question
-                subject = Subject.objects.get(code=data['subject_code'])
-                
-                Question.objects.create(
-                    subject=subject,
-                    question_text=data['question_text'],
-                    option_a=data['option_a'],
-                    option_b=data['option_b'],
-                    option_c=data['option_c'],
-                    option_d=data['option_d'],
-                    correct_answer=data['correct_answer'],
-                    level=data['level'],
-                    explanation=data.get('explanation', '')
-                )
-                imported += 1
-                print(f"✓ Imported: {data['question_text'][:60]}...")
-                
-            except Exception as e:
-                errors += 1
-                print(f"✗ Error: {e}")
-        
-        print(f"\n✅ Imported {imported} questions, {errors} errors")
+        summary = import_text(filepath, batch_size, progress_every)
+        print(f"\n✅ Imported {summary['imported']} questions, {summary['errors']} errors")
+        print(f"   created: {summary['created']}, updated: {summary['updated']}, unchanged: {summary['unchanged']}")
+        print(f"   {summary['seconds']}s ({summary['rows_per_sec']} rows/sec)")
         
     except FileNotFoundError:
         print(f"❌ File not found: {filepath}")
@@ -233,14 +157,8 @@ def main():
             else:
                 print("❌ Unsupported file format! Use .csv or .txt")
     else:
-        filepath = sys.argv[1]
-        
-        if filepath.endswith('.csv'):
-            import_from_csv(filepath)
-        elif filepath.endswith('.txt'):
-            import_from_text(filepath)
-        else:
-            print("❌ Unsupported file format! Use .csv or .txt")
+        # Same as: python manage.py import_questions <files/globs> [--workers N] [--batch-size N]
+        call_command('import_questions', *sys.argv[1:])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,167 @@
+"""
+Load test: WSGI vs ASGI API
+Fires concurrent clients at the synchronous DRF endpoints served by a WSGI
+server and at their async counterparts (/api/async/...) served by an ASGI
+server, and prints requests per second, p50/p95 latency and errors for
+each concurrency level. Uses only the standard library.
+
+Start both servers first, against the same database, for example:
+    gunicorn my_quiz_project.wsgi:application -w 4 -b 127.0.0.1:8000
+    uvicorn my_quiz_project.asgi:application --workers 4 --port 8001
+(pip install gunicorn 'uvicorn[standard]'; neither is a project
+requirement. Plain uvicorn's h11 parser adds ~40 ms to every keep-alive
+request, which hides the difference being measured.)
+
+Run with: python scripts/load_test.py --endpoint generate --concurrency 100 500 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+ENDPOINTS = {
+    # name: (method, WSGI path, ASGI path)
+    'subjects': ('GET', '/api/subjects/', '/api/async/subjects/'),
+    'generate': ('POST', '/api/quiz/generate/', '/api/async/quiz/generate/'),
+    'submit': ('POST', '/api/quiz/submit/', '/api/async/quiz/submit/'),
+    'health': ('GET', '/api/health/', '/api/async/health/'),
+}
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (
+            f'{method} {path} HTTP/1.1\r\n'
+            f'Host: {self.host}:{self.port}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            '\r\n'
+        )
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+        if headers.get('connection', '').lower() == 'close' or 'content-length' not in headers:
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def client(host, port, method, path, body, requests, latencies, errors):
+    connection = Connection(host, port)
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errors.append('connection')
+                connection.close()
+                continue
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(status)
+    finally:
+        connection.close()
+
+
+async def run(base_url, method, path, body, concurrency, requests):
+    url = urlsplit(base_url)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client(url.hostname, url.port or 80, method, path, body, requests, latencies, errors)
+        for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def request_body(args, base_url):
+    """JSON body for the endpoint; submit bodies answer a freshly generated quiz"""
+    quiz_request = {'subject_code': args.subject, 'level': args.level, 'num_questions': args.num_questions}
+    if args.endpoint == 'generate':
+        return json.dumps(quiz_request).encode()
+    if args.endpoint != 'submit':
+        return b''
+    url = urlsplit(base_url)
+    connection = Connection(url.hostname, url.port or 80)
+    status, data = await connection.request('POST', ENDPOINTS['generate'][1], json.dumps(quiz_request).encode())
+    connection.close()
+    if status != 200:
+        raise SystemExit(f'Could not generate a quiz to submit ({status}): {data[:200]!r}')
+    quiz = json.loads(data)['quiz']
+    answers = [{'question_id': question['id'], 'selected_answer': 'A'} for question in quiz['questions']]
+    return json.dumps({'token': quiz['token'], 'answers': answers}).encode()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--wsgi', default='http://127.0.0.1:8000', help='Base URL of the WSGI server')
+    parser.add_argument('--asgi', default='http://127.0.0.1:8001', help='Base URL of the ASGI server')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='generate')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--requests', type=int, default=10, help='Requests per client')
+    parser.add_argument('--subject', default='CSW351-AI')
+    parser.add_argument('--level', default='easy')
+    parser.add_argument('--num-questions', type=int, default=10)
+    args = parser.parse_args()
+
+    method, wsgi_path, asgi_path = ENDPOINTS[args.endpoint]
+    targets = [('WSGI', args.wsgi, wsgi_path), ('ASGI', args.asgi, asgi_path)]
+    bodies = {name: await request_body(args, base_url) for name, base_url, _ in targets}
+
+    print(f"Endpoint: {args.endpoint}, {args.requests} requests per client")
+    print(f"{'Server':>6} | {'Clients':>7} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | {'Errors':>6}")
+    print("-" * 58)
+    for concurrency in args.concurrency:
+        for name, base_url, path in targets:
+            latencies, errors, elapsed = await run(
+                base_url, method, path, bodies[name], concurrency, args.requests
+            )
+            print(
+                f"{name:>6} | {concurrency:>7} | {len(latencies) / elapsed:>8.1f} | "
+                f"{percentile(latencies, 0.5) * 1000:>8.1f} | {percentile(latencies, 0.95) * 1000:>8.1f} | "
+                f"{len(errors):>6}"
+            )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -13,6 +13,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_quiz_project.settings')  # s
 django.setup()  # initialize Django
 
 from apps.quiz_app.models import Subject, Question  # import Subject and Question models from app
+from apps.quiz_app.importers import BulkQuestionWriter  # batched, hash-keyed question writer
 
 
 def create_subjects():  # function to create the four main subjects
@@ -60,32 +61,30 @@ def create_subjects():  # function to create the four main subjects
 
 def create_placeholder_questions(subject, level, count=30):
     """Create placeholder questions for a subject and level (safe from duplicates)"""
-    questions_created = 0
-    existing_questions = Question.objects.filter(subject=subject, level=level)
-    existing_count = existing_questions.count()
+    existing_count = Question.objects.filter(subject=subject, level=level).count()
 
-    # skip creation if already have 30
+    # skip creation if already have 30 (placeholders edited by an admin no
+    # longer match their content hash, so they must not be re-added)
     if existing_count >= count:
         print(f"  [=] {level.upper():10} - Already has {existing_count} questions, skipping")
         return 0
 
-    start_index = existing_count + 1
-    for i in range(start_index, count + 1):
-        question_text = f"[{subject.code}] [{level.upper()}] Question {i}: Replace this with your actual question"
-        Question.objects.create(
-            subject=subject,
-            question_text=question_text,
-            level=level,
-            option_a='Option A - Replace with actual answer',
-            option_b='Option B - Replace with actual answer',
-            option_c='Option C - Replace with actual answer',
-            option_d='Option D - Replace with actual answer',
-            correct_answer='A',
-            explanation=f'Add explanation for question {i} here'
-        )
-        questions_created += 1
-
-    return questions_created
+    # Only the missing numbers are written; matching them by content hash
+    # keeps a re-run after an interrupted seed from adding them twice
+    with BulkQuestionWriter(batch_size=count, progress_every=0, mode=BulkQuestionWriter.UPSERT) as writer:
+        for i in range(existing_count + 1, count + 1):
+            writer.add({
+                'subject_id': subject.id,
+                'question_text': f"[{subject.code}] [{level.upper()}] Question {i}: Replace this with your actual question",
+                'level': level,
+                'option_a': 'Option A - Replace with actual answer',
+                'option_b': 'Option B - Replace with actual answer',
+                'option_c': 'Option C - Replace with actual answer',
+                'option_d': 'Option D - Replace with actual answer',
+                'correct_answer': 'A',
+                'explanation': f'Add explanation for question {i} here'
+            })
+    return writer.created
 
 
 def create_all_questions(subjects):
@@ -38,7 +38,7 @@ def view_subjects():
 
 def view_questions():
     print_separator("Questions")
-    questions = Question.objects.all().order_by('id')
+    questions = Question.objects.select_related('subject').order_by('id')
     if not questions.exists():
         print("No questions found.")
         return